@@ -62,6 +62,13 @@ setuptools.setup(
         "pylatexenc>=1.3",
     ],
     extras_require={
-        "dev": ["black", "pylint", "sphinx", "sphinxcontrib-svg2pdfconverter"]
+        "dev": [
+            "black",
+            "pylint",
+            "pytest",
+            "sphinx",
+            "sphinxcontrib-svg2pdfconverter",
+        ],
+        "highs": ["scipy>=1.9"],
     },
 )
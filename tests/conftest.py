@@ -0,0 +1,64 @@
+"""
+conftest.py
+
+Shared helpers for the untilperfect tests.
+"""
+
+import pytest
+
+from untilperfect.model import Buffers, Parameters, Vessels
+
+PARAMETERS = {
+    "cycle_time": 96.0,
+    "prep_pre_duration": 12.0,
+    "prep_post_duration": 1.5,
+    "transfer_duration": 2.0,
+    "hold_pre_duration": 8.0,
+    "hold_post_duration": 1.5,
+    "hold_duration_min": 12.0,
+    "hold_duration_max": 20.0,
+    "minimum_fill_ratio": 0.3,
+    "maximum_prep_utilization": 0.8,
+}
+
+VESSELS = {
+    "names": ["1000 L", "5000 L"],
+    "volumes": [1000.0, 5000.0],
+    "costs": [60.0, 160.0],
+}
+
+
+def make_instance(volumes, start_times, durations, **parameters):
+    """
+    Build a problem instance from lists of buffer data.
+
+    Parameters
+    ----------
+    volumes, start_times, durations: list of float
+        Volume, use start time and use duration of each buffer.
+    parameters: dict
+        Overrides to the default parameters.
+
+    Returns
+    -------
+    tuple
+        (Parameters, Buffers, Vessels)
+    """
+    return (
+        Parameters({**PARAMETERS, **parameters}),
+        Buffers(
+            {
+                "names": ["B{}".format(n) for n in range(len(volumes))],
+                "volumes": list(volumes),
+                "use_start_times": list(start_times),
+                "use_durations": list(durations),
+            }
+        ),
+        Vessels(dict(VESSELS)),
+    )
+
+
+@pytest.fixture(name="instance")
+def fixture_instance():
+    """Factory for problem instances; see `make_instance`."""
+    return make_instance
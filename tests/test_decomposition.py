@@ -0,0 +1,204 @@
+"""
+test_decomposition.py
+
+Tests for untilperfect.decomposition, against the complete problem
+restricted to a single prep slot and against dynamic programming over
+subsets of the buffers in a slot.
+"""
+
+import numpy
+import pulp
+import pytest
+
+from untilperfect.decomposition import schedule_slot, unschedulable_core
+from untilperfect.model import BufferPrepProblem
+from untilperfect.presolve import hold_time_bounds
+from untilperfect.validation import validate
+
+SEEDS = range(30)
+
+
+def random_slot(make_instance, seed):
+    """
+    Instance (built with the `instance` fixture) of two to five buffers
+    that fit one vessel, with no limit on prep utilization, so that
+    whether the buffers can share a single slot depends on scheduling
+    alone.
+    """
+    rng = numpy.random.default_rng(seed)
+    count = rng.integers(2, 6)
+    return make_instance(
+        [900.0] * count,
+        rng.uniform(0, 96, count).round(2),
+        rng.uniform(4, 60, count).round(2),
+        hold_duration_max=rng.choice([16.0, 24.0, 40.0]),
+        maximum_prep_utilization=1.0,
+    )
+
+
+def wide_slot(make_instance, seed):
+    """
+    Instance of two to eight buffers with short prep procedures and hold
+    time ranges up to several times the prep duration, so that ranges
+    may reach around a buffer's prep procedure on both sides.
+    """
+    rng = numpy.random.default_rng(seed)
+    count = rng.integers(2, 9)
+    return make_instance(
+        [900.0] * count,
+        rng.uniform(0, 96, count).round(2),
+        rng.uniform(4, 30, count).round(2),
+        prep_pre_duration=rng.choice([2.0, 5.0, 8.0]),
+        hold_duration_max=rng.choice([20.0, 40.0, 70.0]),
+        maximum_prep_utilization=1.0,
+    )
+
+
+def subsets_schedulable(parameters, buffers, members):
+    """
+    Whether buffers can share a prep slot, by dynamic programming over
+    subsets (exponential in their number).
+
+    The circle is cut at the first buffer, tried at the ends of each
+    range shifted by up to k - 1 multiples of T for k buffers, and the
+    earliest end of each subset of the others is kept, placing each
+    buffer as early as possible after the last.
+    """
+    members = numpy.asarray(members, dtype=int)
+    k = len(members)
+    ct = parameters.cycle_time
+    t_prep = parameters.prep_total_duration
+    t_use = numpy.asarray(buffers.relative_use_start_times, dtype=float)
+    z_min, z_max = (
+        bound[members] for bound in hold_time_bounds(parameters, buffers)
+    )
+    if k * t_prep > ct + 1e-9 or (z_min > z_max + 1e-9).any():
+        return False
+    if k < 2:
+        return True
+    start = (z_min - t_use[members]) % ct
+    width = z_max - z_min
+    shifts = t_prep * numpy.arange(1 - k, k)
+    bounds = numpy.concatenate((start, start + width))
+    offsets = numpy.unique((bounds[:, None] + shifts - start[0]).ravel() % ct)
+    offsets = offsets[offsets <= width[0] + 1e-9]
+    first = start[0] + numpy.minimum(offsets, width[0])
+    others = k - 1
+    masks = numpy.arange(1 << others)
+    bits = (masks[:, None] >> numpy.arange(others)) & 1 == 1
+    last = numpy.full((len(masks), len(first)), numpy.inf)
+    last[0] = first
+    for size in range(1, k):
+        layer = masks[bits.sum(axis=1) == size]
+        after = last[layer[:, None] & ~(1 << numpy.arange(others))] + t_prep
+        after[~bits[layer]] = numpy.inf
+        with numpy.errstate(invalid="ignore"):
+            offset = (after - start[1:, None]) % ct
+            position = numpy.where(
+                offset <= width[1:, None] + 1e-9,
+                after,
+                after + ct - offset,
+            )
+        position[~numpy.isfinite(after)] = numpy.inf
+        last[layer] = position.min(axis=1)
+    return bool((last[-1] + t_prep <= first + ct + 1e-9).any())
+
+
+def single_slot_schedulable(parameters, buffers, vessels):
+    """Whether the complete problem has a solution using one slot."""
+    parameters.max_slots = 1
+    problem = BufferPrepProblem(
+        parameters,
+        buffers,
+        vessels,
+        pulp.PULP_CBC_CMD(msg=0),
+        warm_start=False,
+    )
+    return problem.complete() == pulp.LpStatusOptimal
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_schedule_slot_agrees_with_mip(instance, seed):
+    """A schedule is found exactly when the MIP finds one."""
+    parameters, buffers, vessels = random_slot(instance, seed)
+    buffers.set_relative_use_start_times(parameters.cycle_time)
+    members = numpy.arange(buffers.count)
+    hold_times = schedule_slot(parameters, buffers, members)
+    assert (hold_times is not None) == single_slot_schedulable(
+        parameters, buffers, vessels
+    )
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_schedule_slot_agrees_with_subsets(instance, seed):
+    """
+    A schedule is found exactly when one is found by dynamic
+    programming over subsets, including where hold time ranges are
+    wide, and it is valid.
+    """
+    parameters, buffers, vessels = wide_slot(instance, seed)
+    buffers.set_relative_use_start_times(parameters.cycle_time)
+    members = numpy.arange(buffers.count)
+    hold_times = schedule_slot(parameters, buffers, members)
+    assert (hold_times is not None) == subsets_schedulable(
+        parameters, buffers, members
+    )
+    if hold_times is not None:
+        assert_valid(parameters, buffers, vessels, hold_times)
+
+
+def test_schedule_slot_large(instance):
+    """A slot of many buffers, with a schedule, is scheduled."""
+    count = 16
+    parameters, buffers, vessels = instance(
+        [900.0] * count,
+        [(n * 37 % count) * 6.0 + 30.0 for n in range(count)],
+        [10.0] * count,
+        prep_pre_duration=2.0,
+        hold_duration_max=40.0,
+        maximum_prep_utilization=1.0,
+    )
+    buffers.set_relative_use_start_times(parameters.cycle_time)
+    hold_times = schedule_slot(
+        parameters, buffers, numpy.arange(buffers.count)
+    )
+    assert hold_times is not None
+    assert_valid(parameters, buffers, vessels, hold_times)
+
+
+def assert_valid(parameters, buffers, vessels, hold_times):
+    """Assert that hold times for one slot are valid."""
+    pa = parameters
+    t_use = numpy.asarray(buffers.relative_use_start_times)
+    durations = numpy.asarray(buffers.use_durations)
+    violations = validate(
+        parameters,
+        buffers,
+        vessels,
+        numpy.zeros(buffers.count, dtype=int),
+        numpy.zeros(buffers.count, dtype=int),
+        (t_use - hold_times - pa.transfer_duration - pa.prep_pre_duration)
+        % pa.cycle_time,
+        pa.hold_pre_duration
+        + pa.transfer_duration
+        + durations
+        + pa.hold_post_duration
+        + hold_times,
+    )
+    assert violations["valid"]
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_unschedulable_core_minimal(instance, seed):
+    """The core cannot be scheduled, but any smaller part of it can."""
+    parameters, buffers, _ = random_slot(instance, seed)
+    buffers.set_relative_use_start_times(parameters.cycle_time)
+    members = numpy.arange(buffers.count)
+    if schedule_slot(parameters, buffers, members) is not None:
+        return
+    core = unschedulable_core(parameters, buffers, members)
+    assert set(core) <= set(members.tolist())
+    assert schedule_slot(parameters, buffers, core) is None
+    for n in core:
+        rest = [k for k in core if k != n]
+        assert schedule_slot(parameters, buffers, rest) is not None
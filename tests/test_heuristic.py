@@ -0,0 +1,38 @@
+"""
+test_heuristic.py
+
+Tests for untilperfect.heuristic.
+"""
+
+import pulp
+import pytest
+
+from untilperfect.heuristic import greedy_assignment
+from untilperfect.model import BufferPrepProblem
+
+# the second buffer's use leaves less than hold_duration_min to hold it
+EMPTY_WINDOW = ([900.0, 900.0], [10.0, 50.0], [20.0, 80.0])
+
+
+def test_greedy_assignment_empty_hold_window(instance):
+    """No assignment is made for a buffer that cannot be held."""
+    parameters, buffers, vessels = instance(*EMPTY_WINDOW)
+    buffers.set_relative_use_start_times(parameters.cycle_time)
+    assert greedy_assignment(parameters, buffers, vessels) is None
+
+
+def test_heuristic_empty_hold_window(instance):
+    """The heuristic problem type reports the problem infeasible."""
+    problem = BufferPrepProblem(*instance(*EMPTY_WINDOW))
+    assert problem.heuristic() == pulp.LpStatusInfeasible
+
+
+@pytest.mark.parametrize("propagate_bounds", [False, True])
+def test_complete_empty_hold_window(instance, propagate_bounds):
+    """No invalid warm start is passed to the solver."""
+    problem = BufferPrepProblem(
+        *instance(*EMPTY_WINDOW),
+        pulp.PULP_CBC_CMD(msg=0),
+        propagate_bounds=propagate_bounds,
+    )
+    assert problem.complete() == pulp.LpStatusInfeasible
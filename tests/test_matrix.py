@@ -0,0 +1,74 @@
+"""
+test_matrix.py
+
+Tests for untilperfect.matrix, and for models whose constraint blocks
+have no rows.
+"""
+
+import numpy
+import pulp
+import pytest
+
+from untilperfect.matrix import ConstraintBlock
+from untilperfect.model import BufferPrepProblem
+from untilperfect.pulptools import ScipyMilp
+
+SOLVERS = [
+    pytest.param(lambda: pulp.PULP_CBC_CMD(msg=0), id="cbc"),
+    pytest.param(lambda: ScipyMilp(msg=0), id="highs"),
+]
+PROBLEM_TYPES = ["complete", "incremental", "minimized_hold_time"]
+
+
+def test_from_terms_without_rows():
+    """A block of no rows has empty arrays of the right type."""
+    block = ConstraintBlock.from_terms(
+        "empty", [(numpy.empty((0, 3), dtype=int), 1.0)], 1, []
+    )
+    assert block.count == 0
+    assert block.nonzeros == 0
+    assert block.rows.dtype.kind == "i"
+    assert block.columns.dtype.kind == "i"
+    assert block.senses.shape == (0,)
+
+
+def test_from_terms_without_terms():
+    """A block with rows but no terms has no nonzeros."""
+    block = ConstraintBlock.from_terms("bounds", [], -1, [1.0, 2.0])
+    assert block.count == 2
+    assert block.nonzeros == 0
+    numpy.testing.assert_array_equal(block.senses, [-1, -1])
+
+
+def test_stack_with_empty_blocks():
+    """Empty blocks take no rows when stacked."""
+    empty = ConstraintBlock.from_terms("empty", [([], 1.0)], 1, [])
+    block = ConstraintBlock.from_terms("block", [([0, 1], 2.0)], 1, [3, 4])
+    stacked = ConstraintBlock.stack("stacked", [empty, block, empty])
+    numpy.testing.assert_array_equal(stacked.rows, [0, 1])
+    numpy.testing.assert_array_equal(stacked.rhs, [3.0, 4.0])
+    assert ConstraintBlock.stack("none", []).count == 0
+
+
+@pytest.mark.parametrize("solver", SOLVERS)
+@pytest.mark.parametrize("problem_type", PROBLEM_TYPES)
+def test_single_buffer(instance, solver, problem_type):
+    """A single buffer has no pairs to schedule against each other."""
+    problem = BufferPrepProblem(*instance([900.0], [10.0], [20.0]), solver())
+    assert getattr(problem, problem_type)() == pulp.LpStatusOptimal
+    problem.x.evaluate()
+    numpy.testing.assert_array_equal(problem.x.values, [[True]])
+
+
+@pytest.mark.parametrize("solver", SOLVERS)
+@pytest.mark.parametrize("problem_type", PROBLEM_TYPES)
+def test_all_pairs_conflicting(instance, solver, problem_type):
+    """Buffers used at the same time must each have their own slot."""
+    problem = BufferPrepProblem(
+        *instance([900.0] * 3, [10.0] * 3, [20.0] * 3), solver()
+    )
+    assert problem.conflicts[numpy.triu_indices(3, 1)].all()
+    assert not problem.pairs.any()
+    assert getattr(problem, problem_type)() == pulp.LpStatusOptimal
+    problem.x.evaluate()
+    assert problem.x.values.sum(axis=0).max() == 1
@@ -0,0 +1,48 @@
+"""
+test_model.py
+
+Tests for untilperfect.model, comparing the optional formulations of the
+complete problem with the default one.
+"""
+
+import pulp
+import pytest
+
+from untilperfect.benchmark import generate_instance
+from untilperfect.model import BufferPrepProblem
+
+# small feasible instances (buffers, vessels, seed)
+INSTANCES = [(6, 3, 1), (6, 3, 2), (8, 4, 0), (8, 4, 1), (8, 4, 2)]
+
+OPTIONS = (
+    "tight_big_m",
+    "slot_volumes",
+    "aggregate_same_slot",
+    "propagate_bounds",
+)
+
+
+def optimum(instance, **options):
+    """Optimal cost of the complete problem for an instance."""
+    problem = BufferPrepProblem(
+        *generate_instance(*instance), pulp.PULP_CBC_CMD(msg=0), **options
+    )
+    assert problem.complete() == pulp.LpStatusOptimal
+    return pulp.value(problem.problem.objective)
+
+
+@pytest.mark.parametrize("instance", INSTANCES)
+@pytest.mark.parametrize("option", OPTIONS)
+def test_option_keeps_optimum(instance, option):
+    """Each option leaves the optimal cost unchanged."""
+    assert optimum(instance, **{option: True}) == pytest.approx(
+        optimum(instance)
+    )
+
+
+@pytest.mark.parametrize("instance", INSTANCES)
+def test_options_together_keep_optimum(instance):
+    """All options together leave the optimal cost unchanged."""
+    assert optimum(
+        instance, **{option: True for option in OPTIONS}
+    ) == pytest.approx(optimum(instance))
@@ -0,0 +1,45 @@
+"""
+test_presolve.py
+
+Tests for untilperfect.presolve.
+"""
+
+import pulp
+import pytest
+
+from untilperfect.model import BufferPrepProblem
+from untilperfect.presolve import presolve_vessels
+
+
+def test_unprepared_buffers_reported(instance):
+    """Buffers too big for every vessel are reported, not raised."""
+    parameters, buffers, vessels = instance(
+        [900.0, 9000.0], [10.0, 50.0], [20.0, 20.0]
+    )
+    remaining, compatible, report = presolve_vessels(
+        parameters, buffers, vessels
+    )
+    assert report["unprepared"] == ["B1"]
+    assert remaining.count == vessels.count
+    assert not compatible[:, 1].any()
+
+
+@pytest.mark.parametrize("problem_type", ["basic", "complete", "heuristic"])
+def test_unprepared_buffers_infeasible(instance, problem_type):
+    """A buffer that no vessel can prepare makes the problem infeasible."""
+    problem = BufferPrepProblem(
+        *instance([900.0, 9000.0], [10.0, 50.0], [20.0, 20.0]),
+        pulp.PULP_CBC_CMD(msg=0),
+    )
+    assert getattr(problem, problem_type)() == pulp.LpStatusInfeasible
+
+
+def test_crossed_hold_time_bounds_infeasible(instance):
+    """A buffer that cannot be held makes the problem infeasible."""
+    problem = BufferPrepProblem(
+        *instance([900.0, 900.0], [10.0, 50.0], [20.0, 80.0]),
+        pulp.PULP_CBC_CMD(msg=0),
+        propagate_bounds=True,
+        warm_start=False,
+    )
+    assert problem.complete() == pulp.LpStatusInfeasible
@@ -0,0 +1,178 @@
+"""
+test_pulptools.py
+
+Tests for untilperfect.pulptools.
+"""
+
+import numpy
+import pytest
+
+from untilperfect.pulptools import LpVariableArray, cbc_progress
+
+# lines of a CBC log, with the kind of progress each reports and the
+# incumbent, bound and node count after it
+CBC_LOG = [
+    (
+        "Continuous objective value is 622.41 - 0.01 seconds",
+        "bound",
+        (numpy.nan, 622.41, 0),
+    ),
+    (
+        "Cbc0045I MIPStart provided solution with cost 1400.5",
+        "incumbent",
+        (1400.5, 622.41, 0),
+    ),
+    (
+        "Cbc0013I At root node, 99 cuts changed objective from 622.41 to "
+        "815.9755 in 42 passes",
+        "bound",
+        (1400.5, 815.9755, 0),
+    ),
+    (
+        "Cbc0010I After 0 nodes, 1 on tree, 1400.5 best solution, best "
+        "possible 815.9755 (8.09 seconds)",
+        "nodes",
+        (1400.5, 815.9755, 0),
+    ),
+    (
+        "Cbc0004I Integer solution of 1361.52 found after 32551 iterations "
+        "and 23 nodes (15.06 seconds)",
+        "incumbent",
+        (1361.52, 815.9755, 23),
+    ),
+    (
+        "Cbc0012I Integer solution of 912.63 found by Reduced search after "
+        "0 iterations and 30 nodes (16.10 seconds)",
+        "incumbent",
+        (912.63, 815.9755, 30),
+    ),
+    (
+        "Cbc0045I Solution of 912.63 already found by heuristic",
+        None,
+        (912.63, 815.9755, 30),
+    ),
+    (
+        "Cbc0010I After 100 nodes, 12 on tree, 912.63 best solution, best "
+        "possible 850.5 (20.00 seconds)",
+        "nodes",
+        (912.63, 850.5, 100),
+    ),
+    (
+        "Cbc0011I Exiting as integer gap of 12.63 less than 1e-10 or 1.5%",
+        "bound",
+        (912.63, 900.0, 100),
+    ),
+    (
+        "Cbc0005I Partial search - best objective 912.63 (best possible "
+        "900), took 57717 iterations and 120 nodes (21.24 seconds)",
+        None,
+        (912.63, 900.0, 120),
+    ),
+]
+
+
+def new_state():
+    """Progress of a CBC solve before its log is read."""
+    return {
+        "incumbent": numpy.nan,
+        "bound": numpy.nan,
+        "gap": numpy.nan,
+        "nodes": 0,
+    }
+
+
+def test_initial_values_clipped_to_bounds():
+    """Values straying from a bound by a rounding error are accepted."""
+    array = LpVariableArray("z", 3, 18.145008055075525, 20.0, "Continuous")
+    array.set_initial_values([18.145008, 19.0, 20.000001])
+    numpy.testing.assert_array_equal(
+        [v.varValue for v in array.variables],
+        [18.145008055075525, 19.0, 20.0],
+    )
+
+
+def test_initial_values_of_bounded_variables():
+    """Values are clipped to bounds set after the array is built."""
+    array = LpVariableArray("z", 2, 0, None, "Continuous")
+    array.set_bounds([1.5, 0.0], [2.0, 3.0])
+    array.set_initial_values([1.4999999, -1e-9])
+    numpy.testing.assert_array_equal(
+        [v.varValue for v in array.variables], [1.5, 0.0]
+    )
+
+
+def test_initial_values_of_binary_variables_rounded():
+    """Binary initial values are rounded to 0 or 1."""
+    array = LpVariableArray("x", (2, 2), cat="Binary")
+    array.set_initial_values([[0.9999999, 1e-7], [-1e-9, 1.0000001]])
+    numpy.testing.assert_array_equal(
+        [v.varValue for v in array.variables.ravel()], [1, 0, 0, 1]
+    )
+
+
+def test_initial_values_of_sparse_array():
+    """Only variables that have been created are set."""
+    array = LpVariableArray(
+        "v", (3, 3), cat="Binary", index=lambda n, k: n < k
+    )
+    variable = array[0, 2]
+    array.set_initial_values(numpy.full((3, 3), 0.9999999))
+    assert variable.varValue == 1
+    assert len(array.variables) == 1
+
+
+def test_cbc_progress():
+    """
+    Each line of a log reports the kind of progress expected and leaves
+    the incumbent, bound, gap and node count expected.
+    """
+    state = new_state()
+    for line, kind, (incumbent, bound, nodes) in CBC_LOG:
+        assert cbc_progress(line, state) == kind, line
+        numpy.testing.assert_allclose(
+            [state["incumbent"], state["bound"]], [incumbent, bound]
+        )
+        assert state["nodes"] == nodes
+        if numpy.isnan(incumbent):
+            assert numpy.isnan(state["gap"])
+        else:
+            assert state["gap"] == pytest.approx(
+                (incumbent - bound) / incumbent
+            )
+
+
+def test_cbc_progress_without_incumbent():
+    """
+    A best solution of 1e+50 (none yet) is not taken as an incumbent,
+    and the solve finishing with a solution reports it.
+    """
+    state = new_state()
+    line = (
+        "Cbc0010I After 0 nodes, 1 on tree, 1e+50 best solution, best "
+        "possible 815.9755 (8.09 seconds)"
+    )
+    assert cbc_progress(line, state) == "nodes"
+    assert numpy.isnan(state["incumbent"])
+    assert state["bound"] == 815.9755
+    assert numpy.isnan(state["gap"])
+    line = (
+        "Cbc0001I Search completed - best objective 912.6300000000001, "
+        "took 57717 iterations and 86 nodes (21.24 seconds)"
+    )
+    assert cbc_progress(line, state) == "incumbent"
+    assert state["incumbent"] == pytest.approx(912.63)
+    assert state["nodes"] == 86
+
+
+def test_cbc_progress_ignores_other_lines():
+    """Lines reporting no progress leave the state as it was."""
+    state = new_state()
+    for line in (
+        "Cbc0038I Initial state - 12 integers unsatisfied sum - 3.2",
+        "Clp0006I 0  Obj 622.41 Primal inf 1.5 (3)",
+        "",
+    ):
+        assert cbc_progress(line, state) is None
+    assert state["nodes"] == 0
+    assert numpy.isnan(state["incumbent"])
+    assert numpy.isnan(state["bound"])
@@ -0,0 +1,103 @@
+"""
+test_sizing.py
+
+Tests for untilperfect.sizing, against the complete problem as built.
+"""
+
+import itertools
+import re
+
+import pulp
+import pytest
+
+from untilperfect.benchmark import generate_instance
+from untilperfect.model import BufferPrepProblem
+from untilperfect.sizing import admit, exceeded, model_size
+
+OPTIONS = (
+    "presolve",
+    "slot_volumes",
+    "aggregate_same_slot",
+    "tight_big_m",
+    "propagate_bounds",
+    "conflict_cuts",
+    "symmetry_breaking",
+)
+
+
+@pytest.mark.parametrize(
+    "seed, values",
+    enumerate(itertools.product([False, True], repeat=len(OPTIONS))),
+)
+def test_model_size_matches_built_model(seed, values):
+    """Every variable and constraint block has the size estimated."""
+    options = dict(zip(OPTIONS, values))
+    problem = BufferPrepProblem(
+        *generate_instance(8, 4, seed),
+        pulp.PULP_CBC_CMD(msg=0),
+        auto_slots=False,
+        **options
+    )
+    problem.complete(do_solve=False)
+    size = model_size(*generate_instance(8, 4, seed), problem.P, **options)
+    assert size["variables"] == {
+        name: variable.size for name, variable in problem.variables.items()
+    }
+    assert {
+        name: (rows, size["nonzeros"][name])
+        for name, rows in size["constraints"].items()
+    } == {
+        block.name: (block.count, block.nonzeros) for block in problem.blocks
+    }
+
+
+def test_admit_within_budget():
+    """A problem within its budget is admitted, and its size returned."""
+    size = model_size(*generate_instance(12, 4))
+    budget = {"nonzeros": size["totals"]["nonzeros"]}
+    assert admit(*generate_instance(12, 4), budget) == size
+
+
+def test_admit_suggests_max_slots():
+    """
+    A problem over its budget is refused, with a number of slots that
+    fits, but no more.
+    """
+    size = model_size(*generate_instance(12, 4))
+    budget = {"nonzeros": size["totals"]["nonzeros"] - 1}
+    with pytest.raises(ValueError, match=r"try max_slots = \d+") as error:
+        admit(*generate_instance(12, 4), budget)
+    slots = int(re.search(r"max_slots = (\d+)", str(error.value)).group(1))
+    assert slots < size["slots"]
+    assert not exceeded(model_size(*generate_instance(12, 4), slots), budget)
+    assert exceeded(model_size(*generate_instance(12, 4), slots + 1), budget)
+
+
+def test_admit_refuses_when_nothing_fits():
+    """No number of slots is suggested if the fewest slots do not fit."""
+    with pytest.raises(ValueError, match="does not fit") as error:
+        admit(*generate_instance(12, 4), {"variables": 1})
+    assert "max_slots" not in str(error.value)
+
+
+@pytest.mark.parametrize("auto_slots", [False, True])
+def test_model_size_with_slots_chosen_unbuilt(auto_slots):
+    """
+    The number of slots chosen without building the model is the number
+    the model is built with, so that its size is estimated exactly.
+    """
+    unbuilt = BufferPrepProblem(
+        *generate_instance(12, 4, 1), auto_slots=auto_slots, build=False
+    )
+    assert not hasattr(unbuilt, "problem")
+    problem = BufferPrepProblem(
+        *generate_instance(12, 4, 1),
+        pulp.PULP_CBC_CMD(msg=0),
+        auto_slots=auto_slots
+    )
+    problem.complete(do_solve=False)
+    assert unbuilt.P == problem.P == (6 if auto_slots else 12)
+    size = model_size(*generate_instance(12, 4, 1), unbuilt.P)
+    assert size["totals"]["variables"] == sum(
+        variable.size for variable in problem.variables.values()
+    )
@@ -0,0 +1,126 @@
+"""
+test_validation.py
+
+Tests for untilperfect.validation, against the complete problem with
+its assignment and hold times fixed.
+"""
+
+import numpy
+import pulp
+import pytest
+
+from untilperfect.benchmark import generate_instance
+from untilperfect.model import BufferPrepProblem
+from untilperfect.validation import cyclic_overlaps, validate
+
+SEEDS = range(20)
+
+
+def test_cyclic_overlaps():
+    """Intervals overlap around the cycle boundary, but not if touching."""
+    overlaps = cyclic_overlaps([0.0, 5.0, 50.0, 97.0], 5.0, 100.0)
+    expected = numpy.zeros((4, 4), dtype=bool)
+    expected[0, 3] = expected[3, 0] = True
+    numpy.testing.assert_array_equal(overlaps, expected)
+
+
+def schedule(parameters, buffers, hold_times):
+    """Prep start times and total hold durations given hold times."""
+    pa = parameters
+    t_use = numpy.asarray(buffers.relative_use_start_times)
+    starts = (
+        t_use - hold_times - pa.transfer_duration - pa.prep_pre_duration
+    ) % pa.cycle_time
+    durations = (
+        pa.hold_pre_duration
+        + pa.transfer_duration
+        + numpy.asarray(buffers.use_durations)
+        + pa.hold_post_duration
+        + hold_times
+    )
+    return starts, durations
+
+
+def random_solution(seed, change_seed=None):
+    """
+    A heuristic solution to a generated instance, of which one of the
+    slot, vessel or hold time of one buffer may have been changed.
+    """
+    rng = numpy.random.default_rng(
+        seed if change_seed is None else change_seed
+    )
+    problem = BufferPrepProblem(
+        *generate_instance(6, 5, seed), presolve=False, auto_slots=False
+    )
+    solution = problem.find_heuristic_solution()
+    if solution is None:
+        pytest.skip("no heuristic solution")
+    slots = solution["slots"].copy()
+    vessels = solution["vessels"][slots]
+    hold_times = solution["hold_times"].copy()
+    n = rng.integers(problem.N)
+    change = rng.choice(["none", "slot", "vessel", "hold"])
+    if change == "slot":
+        slots[n] = rng.integers(problem.N)
+        members = slots == slots[n]
+        vessels[members] = vessels[numpy.flatnonzero(members)[0]]
+    elif change == "vessel":
+        vessels[slots == slots[n]] = rng.integers(problem.M)
+    elif change == "hold":
+        hold_times[n] += rng.uniform(-10, 10)
+    return problem, slots, vessels, hold_times
+
+
+def feasible_when_fixed(problem, slots, vessels, hold_times):
+    """Whether the complete problem is feasible with everything fixed."""
+    problem.symmetry_breaking = False  # slots may be in any order
+    problem.complete(do_solve=False)
+    x = numpy.zeros((problem.N, problem.P))
+    x[numpy.arange(problem.N), slots] = 1
+    y = numpy.zeros((problem.M, problem.P))
+    y[vessels, slots] = 1
+    problem.x.set_bounds(x, x)
+    problem.y.set_bounds(y, y)
+    # constraints rather than bounds, which would replace those on z
+    for n, hold_time in enumerate(hold_times):
+        problem.problem += problem.z[n] == hold_time
+    status = problem.problem.solve(pulp.PULP_CBC_CMD(msg=0))
+    return status == pulp.LpStatusOptimal
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_validate_agrees_with_mip(seed):
+    """A solution is valid exactly when the model accepts it."""
+    problem, slots, vessels, hold_times = random_solution(seed)
+    violations = validate(
+        problem.parameters,
+        problem.buffers,
+        problem.vessels,
+        slots,
+        vessels,
+        *schedule(problem.parameters, problem.buffers, hold_times),
+    )
+    assert violations["valid"] == feasible_when_fixed(
+        problem, slots, vessels, hold_times
+    )
+
+
+def test_validate_batch():
+    """A batch gives the same result as each solution on its own."""
+    solutions = [random_solution(0, change) for change in SEEDS]
+    problem = solutions[0][0]
+    slots, vessels, hold_times = [
+        numpy.array([solution[j] for solution in solutions]) for j in (1, 2, 3)
+    ]
+    starts, durations = schedule(
+        problem.parameters, problem.buffers, hold_times
+    )
+    arguments = (problem.parameters, problem.buffers, problem.vessels)
+    batch = validate(*arguments, slots, vessels, starts, durations)
+    assert 0 < batch["valid"].sum() < len(solutions)
+    for s in range(len(solutions)):
+        one = validate(
+            *arguments, slots[s], vessels[s], starts[s], durations[s]
+        )
+        for name, violations in one.items():
+            numpy.testing.assert_array_equal(batch[name][s], violations)
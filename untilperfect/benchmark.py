@@ -0,0 +1,376 @@
+"""
+benchmark.py
+
+Functions to compare the build and solve times of alternative problem
+formulations on a set of problem instances, e.g.
+::
+
+    $ python -m untilperfect.benchmark examples/plant1 examples/plant2 \\
+          --compare symmetry_breaking --time-limit 600
+
+Randomly generated instances may be included, given as a number of
+buffers and a number of vessels, e.g.
+::
+
+    $ python -m untilperfect.benchmark --generate 40x30 --generate 80x60 \\
+          --compare slot_volumes --problem-type basic
+
+"""
+
+import argparse
+import os
+import re
+import tempfile
+import time
+
+import numpy
+import pulp
+
+from .model import BufferPrepProblem, Buffers, Parameters, Vessels
+from .pulptools import warm_start_solver
+
+# Named sets of BufferPrepProblem options to compare against each other
+COMPARISONS = {
+    "symmetry_breaking": [
+        {"symmetry_breaking": False},
+        {"symmetry_breaking": True},
+    ],
+    "presolve": [{"presolve": False}, {"presolve": True}],
+    "slot_volumes": [
+        {"presolve": False, "slot_volumes": False},
+        {"presolve": False, "slot_volumes": True},
+        {"presolve": True, "slot_volumes": False},
+        {"presolve": True, "slot_volumes": True},
+    ],
+    "aggregate_same_slot": [
+        {"aggregate_same_slot": False},
+        {"aggregate_same_slot": True},
+    ],
+    "tight_big_m": [{"tight_big_m": False}, {"tight_big_m": True}],
+    "propagate_bounds": [
+        {"propagate_bounds": False},
+        {"propagate_bounds": True},
+    ],
+    "conflict_cuts": [{"conflict_cuts": False}, {"conflict_cuts": True}],
+    "auto_slots": [{"auto_slots": False}, {"auto_slots": True}],
+    "warm_start": [{"warm_start": False}, {"warm_start": True}],
+}
+
+# Parameters of generated instances
+GENERATED_PARAMETERS = {
+    "cycle_time": 96.0,
+    "prep_pre_duration": 12.0,
+    "prep_post_duration": 1.5,
+    "transfer_duration": 2.0,
+    "hold_pre_duration": 8.0,
+    "hold_post_duration": 1.5,
+    "hold_duration_min": 12.0,
+    "hold_duration_max": 60.0,
+    "minimum_fill_ratio": 0.3,
+    "maximum_prep_utilization": 0.8,
+}
+
+
+def load_instance(path):
+    """
+    Read the parameters, buffers and vessels files in a directory.
+
+    Parameters
+    ----------
+    path: str
+        Directory containing 'parameters.ini', 'buffers.csv' and
+        'vessels.csv'.
+
+    Returns
+    -------
+    tuple
+        (Parameters, Buffers, Vessels)
+    """
+    return (
+        Parameters(os.path.join(path, "parameters.ini")),
+        Buffers(os.path.join(path, "buffers.csv")),
+        Vessels(os.path.join(path, "vessels.csv")),
+    )
+
+
+def generate_instance(buffers, vessels, seed=0):
+    """
+    Generate a random problem instance.
+
+    Buffer volumes are log-uniformly distributed over 500 L to 25000 L,
+    with use start times and durations uniformly distributed over the
+    cycle. Vessel volumes are evenly spaced on a log scale to cover all
+    buffers, with costs following the six-tenths rule.
+
+    Parameters
+    ----------
+    buffers: int
+        Number of buffers.
+    vessels: int
+        Number of vessels in the catalogue.
+    seed: int, optional
+        Random seed.
+
+    Returns
+    -------
+    tuple
+        (Parameters, Buffers, Vessels)
+    """
+    rng = numpy.random.default_rng(seed)
+    pa = Parameters(dict(GENERATED_PARAMETERS))
+    ct = pa.cycle_time
+    max_use = (
+        ct
+        - pa.hold_pre_duration
+        - pa.transfer_duration
+        - pa.hold_post_duration
+        - pa.hold_duration_min
+    )
+    buffer_volumes = numpy.exp(
+        rng.uniform(numpy.log(500), numpy.log(25000), buffers)
+    )
+    vessel_volumes = numpy.geomspace(
+        buffer_volumes.min(), buffer_volumes.max() / 0.95, vessels
+    ).round(-1)
+    return (
+        pa,
+        Buffers(
+            {
+                "names": ["Buffer #{}".format(n + 1) for n in range(buffers)],
+                "volumes": buffer_volumes.round(2).tolist(),
+                "use_start_times": rng.uniform(0, ct, buffers)
+                .round(2)
+                .tolist(),
+                "use_durations": rng.uniform(4, max_use, buffers)
+                .round(2)
+                .tolist(),
+            }
+        ),
+        Vessels(
+            {
+                "names": ["{:.0f} L".format(v) for v in vessel_volumes],
+                "volumes": vessel_volumes.tolist(),
+                "costs": (63.1 * (vessel_volumes / 1000) ** 0.6)
+                .round(2)
+                .tolist(),
+            }
+        ),
+    )
+
+
+def first_incumbent_time(log):
+    """
+    Time (s) at which CBC reports its first integer solution in a log,
+    or NaN if none was found.
+    """
+    match = re.search(
+        r"Integer solution of \S+ found .*\(([\d.]+) seconds\)", log
+    )
+    return float(match.group(1)) if match else numpy.nan
+
+
+def run(
+    instance,
+    options=None,
+    problem_type="complete",
+    time_limit=None,
+    root_bound=False,
+):
+    """
+    Build and solve a single problem instance, timing each phase.
+
+    Parameters
+    ----------
+    instance: str or tuple
+        Instance directory (see `load_instance`), or a (name,
+        Parameters, Buffers, Vessels) tuple.
+    options: dict or None, optional
+        Keyword arguments passed to BufferPrepProblem.
+    problem_type: str, optional
+        Either 'basic' or 'complete'.
+    time_limit: float or None, optional
+        Solver time limit in seconds.
+    root_bound: bool, optional
+        If set to True, also solve the LP relaxation, whose objective
+        is the bound at the root node before cuts are added.
+
+    Returns
+    -------
+    dict
+        Instance, options, build and solve times (s), time to the
+        first incumbent (s), status, whether optimality was proven,
+        objective value (NaN if no solution was found) and root bound
+        (NaN if not requested). Build time includes setting up a warm
+        start, where one is used.
+    """
+    options = options or {}
+    if isinstance(instance, str):
+        name = os.path.basename(os.path.normpath(instance))
+        parameters, buffers, vessels = load_instance(instance)
+    else:
+        name, parameters, buffers, vessels = instance
+    log_file, log_path = tempfile.mkstemp(suffix=".log")
+    os.close(log_file)
+    solver = pulp.PULP_CBC_CMD(msg=0, timeLimit=time_limit, logPath=log_path)
+    start = time.perf_counter()
+    problem = BufferPrepProblem(
+        parameters, buffers, vessels, solver, **options
+    )
+    getattr(problem, problem_type)(do_solve=False)
+    if problem.warm_start and problem.set_initial_solution():
+        solver = warm_start_solver(solver)
+    built = time.perf_counter()
+    bound = numpy.nan
+    if root_bound:
+        relaxation = pulp.PULP_CBC_CMD(msg=0, mip=False)
+        if problem.problem.solve(relaxation) == pulp.LpStatusOptimal:
+            bound = pulp.value(problem.problem.objective)
+        built = time.perf_counter()
+    status = problem.problem.solve(solver)
+    solved = time.perf_counter()
+    with open(log_path, encoding="utf-8") as log:
+        first = first_incumbent_time(log.read())
+    os.remove(log_path)
+    solution = getattr(problem.problem, "sol_status", status)
+    if solution in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+        objective = pulp.value(problem.problem.objective)
+    else:  # no integer solution found within the time limit
+        objective = numpy.nan
+    return {
+        "instance": name,
+        "options": options,
+        "nonzeros": sum(block.nonzeros for block in problem.blocks),
+        "build_time": built - start,
+        "solve_time": solved - built,
+        "first_incumbent": first,
+        "status": pulp.LpStatus[status],
+        "optimal": solution == pulp.LpSolutionOptimal,
+        "objective": objective,
+        "root_bound": bound,
+    }
+
+
+def compare(
+    instances,
+    variants,
+    problem_type="complete",
+    time_limit=None,
+    root_bound=False,
+):
+    """
+    Run every variant on every instance and print a summary table.
+
+    Parameters
+    ----------
+    instances: list of str or tuple
+        Instance directories or generated instances; see `run`.
+    variants: list of dict
+        BufferPrepProblem options for each variant.
+    problem_type: str, optional
+    time_limit: float or None, optional
+    root_bound: bool, optional
+
+    Returns
+    -------
+    list of dict
+        One result (see `run`) per instance and variant.
+    """
+    results = []
+    print(
+        "{:<10} {:<44} {:>9} {:>9} {:>9} {:>9} {:>10} {:>10} {:>8}".format(
+            "instance",
+            "options",
+            "nonzeros",
+            "build (s)",
+            "solve (s)",
+            "first (s)",
+            "root bound",
+            "objective",
+            "optimal",
+        )
+    )
+    for instance in instances:
+        for options in variants:
+            result = run(
+                instance, options, problem_type, time_limit, root_bound
+            )
+            results.append(result)
+            print(
+                "{instance:<10} {options!s:<44} {nonzeros:>9} "
+                "{build_time:>9.2f} {solve_time:>9.2f} "
+                "{first_incumbent:>9.2f} {root_bound:>10.2f} "
+                "{objective:>10.2f} {optimal!s:>8}".format(**result)
+            )
+    return results
+
+
+def main():
+    """Provides command line interface to the benchmarks."""
+    parser = argparse.ArgumentParser(
+        prog="untilperfect.benchmark",
+        description="Compares alternative problem formulations.",
+    )
+    parser.add_argument(
+        "paths", nargs="*", help="instance directories to benchmark"
+    )
+    parser.add_argument(
+        "-g",
+        "--generate",
+        action="append",
+        default=[],
+        metavar="NxM",
+        help="also benchmark a random instance of N buffers and M vessels",
+    )
+    parser.add_argument(
+        "-r",
+        "--root-bound",
+        action="store_true",
+        help="also solve the LP relaxation to report the root bound",
+    )
+    parser.add_argument(
+        "--seed",
+        default=0,
+        type=int,
+        help="random seed for generated instances (default: 0)",
+    )
+    parser.add_argument(
+        "-c",
+        "--compare",
+        default="symmetry_breaking",
+        choices=sorted(COMPARISONS),
+        help="formulation options to compare (default: symmetry_breaking)",
+    )
+    parser.add_argument(
+        "-l",
+        "--time-limit",
+        default=None,
+        type=float,
+        help="solver time limit per run in seconds (default: none)",
+    )
+    parser.add_argument(
+        "-t",
+        "--problem-type",
+        default="complete",
+        choices=["basic", "complete"],
+        help="model to solve (default: 'complete')",
+    )
+    args = parser.parse_args()
+    instances = list(args.paths)
+    for size in args.generate:
+        buffers, vessels = map(int, size.lower().split("x"))
+        instances.append(
+            (size, *generate_instance(buffers, vessels, args.seed))
+        )
+    if not instances:
+        parser.error("no instances given")
+    compare(
+        instances,
+        COMPARISONS[args.compare],
+        args.problem_type,
+        args.time_limit,
+        args.root_bound,
+    )
+
+
+if __name__ == "__main__":
+    main()
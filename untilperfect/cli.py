@@ -10,8 +10,9 @@ import shutil
 
 import pulp
 
-from .model import BufferPrepProblem, solve
-
+from .model import BufferPrepProblem, Buffers, Parameters, Vessels, solve
+from .pulptools import ScipyMilp
+from .sizing import exceeded, fitting_slots, format_size, model_size
 
 # TODO: Interactive mode with problem returned
 # TODO: Improve documentation
@@ -19,6 +20,16 @@ from .model import BufferPrepProblem, solve
 # TODO: Function to list installed solvers
 
 
+def print_progress(event):
+    """Shows solver progress on a single line, updated in place."""
+    print(
+        "\r{time:8.1f} s  incumbent: {incumbent:<12.6g}  bound: "
+        "{bound:<12.6g}  gap: {gap:>7.2%}  nodes: {nodes}".format(**event),
+        end="\n" if event["event"] == "finished" else "",
+        flush=True,
+    )
+
+
 def main():
     """Provides command line interface to untilperfect.
 
@@ -34,6 +45,11 @@ def main():
             "Solves the buffer preparation assignment and selection problem."
         ),
     )
+    parser.add_argument(
+        "--aggregate-same-slot",
+        action="store_true",
+        help="indicate buffers sharing a slot with one variable per pair",
+    )
     parser.add_argument(
         "-b",
         "--buffers",
@@ -41,9 +57,90 @@ def main():
         type=str,
         help="buffers filename (default: 'buffers.csv')",
     )
+    parser.add_argument(
+        "--duration-drift",
+        metavar="HOURS",
+        default=0.0,
+        type=float,
+        help=(
+            "standard deviation of use duration drift in robustness "
+            "analysis (default: 0.0)"
+        ),
+    )
+    parser.add_argument(
+        "--estimate",
+        action="store_true",
+        help=(
+            "print the size and estimated memory of the complete model, "
+            "without building it, and exit"
+        ),
+    )
+    parser.add_argument(
+        "--gap-abs",
+        metavar="GAP",
+        default=None,
+        type=float,
+        help="stop once within an absolute gap of the best bound",
+    )
+    parser.add_argument(
+        "--gap-rel",
+        metavar="GAP",
+        default=None,
+        type=float,
+        help="stop once within a relative gap of the best bound",
+    )
+    parser.add_argument(
+        "--max-memory",
+        metavar="MB",
+        default=None,
+        type=float,
+        help=(
+            "refuse to build a complete model estimated to need more "
+            "memory, suggesting a max_slots that fits"
+        ),
+    )
+    parser.add_argument(
+        "--max-nonzeros",
+        metavar="COUNT",
+        default=None,
+        type=int,
+        help="refuse to build a complete model with more nonzeros",
+    )
+    parser.add_argument(
+        "--max-variables",
+        metavar="COUNT",
+        default=None,
+        type=int,
+        help="refuse to build a complete model with more variables",
+    )
     parser.add_argument(
         "-n", "--no-plot", action="store_true", help="do not generate plot"
     )
+    parser.add_argument(
+        "--no-auto-slots",
+        action="store_true",
+        help="allow one prep slot per buffer if max_slots is not set",
+    )
+    parser.add_argument(
+        "--no-conflict-cuts",
+        action="store_true",
+        help="do not add buffer conflict clique cuts",
+    )
+    parser.add_argument(
+        "--no-presolve",
+        action="store_true",
+        help="do not remove unusable or dominated vessels before solving",
+    )
+    parser.add_argument(
+        "--no-symmetry-breaking",
+        action="store_true",
+        help="do not add slot symmetry breaking constraints",
+    )
+    parser.add_argument(
+        "--no-warm-start",
+        action="store_true",
+        help="do not start the solver from a heuristic solution",
+    )
     parser.add_argument(
         "-p",
         "--parameters",
@@ -51,6 +148,81 @@ def main():
         type=str,
         help="parameters filename (default: 'parameters.ini')",
     )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        default=None,
+        type=str,
+        help="write cProfile statistics for the build phase to a file",
+    )
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help=(
+            "show a live line of solver progress (incumbent, bound, gap "
+            "and nodes) instead of the solver log"
+        ),
+    )
+    parser.add_argument(
+        "--propagate-bounds",
+        action="store_true",
+        help="fix hold time bounds and wrap indicators at build time",
+    )
+    parser.add_argument(
+        "--reschedule",
+        action="store_true",
+        help="re-time each slot for each robustness analysis sample",
+    )
+    parser.add_argument(
+        "--robustness",
+        default=0,
+        type=int,
+        metavar="SAMPLES",
+        help=(
+            "analyse robustness of the solution to drift in use start "
+            "times and durations over a number of random samples"
+        ),
+    )
+    parser.add_argument(
+        "--slot-volumes",
+        action="store_true",
+        help="size vessels against a volume variable per prep slot",
+    )
+    parser.add_argument(
+        "--start-drift",
+        metavar="HOURS",
+        default=0.5,
+        type=float,
+        help=(
+            "standard deviation of use start time drift in robustness "
+            "analysis (default: 0.5)"
+        ),
+    )
+    parser.add_argument(
+        "--time-limit",
+        metavar="SECONDS",
+        default=None,
+        type=float,
+        help=(
+            "solver time limit for each model solved, after which the "
+            "best solution found is reported"
+        ),
+    )
+    parser.add_argument(
+        "--timings",
+        metavar="FILE",
+        default=None,
+        type=str,
+        help=(
+            "write wall time, CPU time and peak memory of each phase and "
+            "constraint builder to a JSON file"
+        ),
+    )
+    parser.add_argument(
+        "--tight-big-m",
+        action="store_true",
+        help="use the smallest valid big-M in each prep scheduling row",
+    )
     parser.add_argument(
         "-f",
         "--path",
@@ -67,7 +239,12 @@ def main():
         "--solver",
         default=default_solver,
         type=str,
-        help=("solver to be used (default: '{}')".format(default_solver)),
+        help=(
+            "solver to be used: 'COIN_CMD', 'PULP_CBC_CMD', 'GLPK' or "
+            "'SCIPY_MILP' (in-process HiGHS) (default: '{}')".format(
+                default_solver
+            )
+        ),
     )
     parser.add_argument(
         "-t",
@@ -76,8 +253,9 @@ def main():
         type=str,
         help=(
             "specify model to solve (default: 'complete'), "
-            "other model options are 'basic', 'minimized_hold_time', "
-            "'mimimized_used_volume'"
+            "other model options are 'basic', 'decomposition', "
+            "'fix_and_optimize', 'heuristic', 'incremental', "
+            "'minimized_hold_time', 'mimimized_used_volume'"
         ),
     )
     parser.add_argument(
@@ -99,14 +277,17 @@ def main():
     buffers_file = os.path.join(path, args.buffers)
     vessels_file = os.path.join(path, args.vessels)
 
+    msg = 0 if args.progress else 1
     if not args.solver:  # use pulp's default
         solver = None
     elif args.solver.upper() == "PULP_CBC_CMD":
-        solver = pulp.solvers.PULP_CBC_CMD(msg=1, threads=os.cpu_count())
+        solver = pulp.PULP_CBC_CMD(msg=msg, threads=os.cpu_count())
     elif args.solver.upper() in ["GLPK", "GLPK_CMD"]:
-        solver = pulp.solvers.GLPK(msg=1)
+        solver = pulp.GLPK(msg=msg)
     elif args.solver.upper() in ["COIN", "COIN_CMD"]:
-        solver = pulp.solvers.COIN_CMD(msg=1, threads=os.cpu_count())
+        solver = pulp.COIN_CMD(msg=msg, threads=os.cpu_count())
+    elif args.solver.upper() in ["HIGHS", "SCIPY_MILP"]:
+        solver = ScipyMilp(msg=msg)
     else:
         raise ValueError("{} is an unsupported solver.".format(args.solver))
 
@@ -114,6 +295,14 @@ def main():
         problem_type = BufferPrepProblem.complete
     elif args.problem_type.lower() == "basic":
         problem_type = BufferPrepProblem.basic
+    elif args.problem_type.lower() == "incremental":
+        problem_type = BufferPrepProblem.incremental
+    elif args.problem_type.lower() == "heuristic":
+        problem_type = BufferPrepProblem.heuristic
+    elif args.problem_type.lower() == "decomposition":
+        problem_type = BufferPrepProblem.decomposition
+    elif args.problem_type.lower() == "fix_and_optimize":
+        problem_type = BufferPrepProblem.fix_and_optimize
     elif args.problem_type.lower() == "minimized_hold_time":
         problem_type = BufferPrepProblem.minimized_hold_time
         if args.solver and args.solver.upper() in ["GLPK", "GLPK_CMD"]:
@@ -131,13 +320,59 @@ def main():
     else:
         raise ValueError(
             "'{}' is an invalid problem type.  Valid types are "
-            "'basic', 'complete', 'minimized_hold_time'.".format(
-                args.problem_type
-            )
+            "'basic', 'complete', 'decomposition', 'fix_and_optimize', "
+            "'heuristic', 'incremental', 'minimized_hold_time', "
+            "'minimized_used_volume'.".format(args.problem_type)
+        )
+
+    model_options = {
+        "symmetry_breaking": not args.no_symmetry_breaking,
+        "presolve": not args.no_presolve,
+        "slot_volumes": args.slot_volumes,
+        "aggregate_same_slot": args.aggregate_same_slot,
+        "tight_big_m": args.tight_big_m,
+        "propagate_bounds": args.propagate_bounds,
+        "conflict_cuts": not args.no_conflict_cuts,
+    }
+    size_budget = {
+        "memory": None if args.max_memory is None else args.max_memory * 1e6,
+        "nonzeros": args.max_nonzeros,
+        "variables": args.max_variables,
+    }
+    size_budget = {k: v for k, v in size_budget.items() if v is not None}
+    if args.estimate:
+        data = (
+            Parameters(parameters_file),
+            Buffers(buffers_file),
+            Vessels(vessels_file),
         )
+        # the number of slots the complete model would be built with
+        slots = BufferPrepProblem(
+            *data,
+            auto_slots=not args.no_auto_slots,
+            build=False,
+            **model_options,
+        ).P
+        size = model_size(*data, slots, **model_options)
+        print(format_size(size))
+        if exceeded(size, size_budget):
+            fits = fitting_slots(*data, size_budget, slots, **model_options)
+            if fits is None:
+                print("Exceeds size budget with any number of slots.")
+            else:
+                print("Exceeds size budget; try max_slots = {}.".format(fits))
+        return pulp.LpStatusNotSolved
 
     plot = not args.no_plot
     write = args.write
+    robustness_options = None
+    if args.robustness:
+        robustness_options = {
+            "samples": args.robustness,
+            "start_sd": args.start_drift,
+            "duration_sd": args.duration_drift,
+            "reschedule": args.reschedule,
+        }
     return solve(
         parameters_file,
         buffers_file,
@@ -147,6 +382,17 @@ def main():
         plot,
         write,
         cli=True,
+        robustness_options=robustness_options,
+        timings_file=args.timings,
+        profile_file=args.profile,
+        auto_slots=not args.no_auto_slots,
+        warm_start=not args.no_warm_start,
+        time_limit=args.time_limit,
+        gap_rel=args.gap_rel,
+        gap_abs=args.gap_abs,
+        progress_callback=print_progress if args.progress else None,
+        size_budget=size_budget or None,
+        **model_options,
     )
 
 
@@ -0,0 +1,203 @@
+"""
+decomposition.py
+
+This module contains the scheduling subproblems of a logic-based
+decomposition of a buffer preparation vessel assignment problem: once
+buffers are assigned to prep slots, the buffers in each slot can be
+scheduled (given hold times) independently of every other slot.
+"""
+
+import numpy
+
+from .presolve import hold_time_bounds
+
+# tolerance on times
+EPS = 1e-9
+
+
+def _forbidden_regions(release, latest, duration):
+    """
+    Open ranges of start times in which no job may start, for jobs of
+    equal `duration` with start times in [release, latest], or None if
+    the jobs cannot all be scheduled (Garey, Johnson, Simons and Tarjan,
+    SIAM J. Comput. 10(2), 1981).
+
+    For each release time r, in decreasing order, the jobs released no
+    earlier than r and due by each latest start are scheduled as late as
+    possible, avoiding the regions found so far. If the earliest of them
+    must start before r + duration, no job may start in the preceding
+    `duration`, up to r.
+    """
+    regions = []
+
+    def latest_allowed(time):
+        moved = True
+        while moved:
+            moved = False
+            for low, high in regions:
+                if low + EPS < time < high - EPS:
+                    time, moved = low, True
+        return time
+
+    for r in sorted(set(release), reverse=True):
+        first = numpy.inf
+        for due in sorted(set(due for due in latest if due >= r - EPS)):
+            count = sum(
+                1
+                for low, high in zip(release, latest)
+                if low >= r - EPS and high <= due + EPS
+            )
+            if not count:
+                continue
+            time = latest_allowed(due)
+            for _ in range(count - 1):
+                time = latest_allowed(time - duration)
+            first = min(first, time)
+        if first < r - EPS:
+            return None
+        if first < r + duration - EPS:
+            regions.append((first - duration, r))
+    return regions
+
+
+def _earliest_deadline(release, latest, duration):
+    """
+    Start times in [release, latest] of jobs of equal `duration` on one
+    machine, or None if there are none.
+
+    Each job is started as early as possible, choosing the released job
+    with the earliest latest start, except that no job starts in a
+    forbidden region (see `_forbidden_regions`). With those regions this
+    is exact.
+    """
+    regions = _forbidden_regions(release, latest, duration)
+    if regions is None:
+        return None
+    waiting = set(range(len(release)))
+    starts = [None] * len(release)
+    time = -numpy.inf
+    while waiting:
+        time = max(time, min(release[n] for n in waiting))
+        moved = True
+        while moved:
+            moved = False
+            for low, high in regions:
+                if low + EPS < time < high - EPS:
+                    time, moved = high, True
+        ready = [n for n in waiting if release[n] <= time + EPS]
+        if not ready:
+            continue
+        n = min(ready, key=lambda n: latest[n])
+        if time > latest[n] + EPS:
+            return None
+        starts[n] = time
+        waiting.remove(n)
+        time += duration
+    return starts
+
+
+def schedule_slot(parameters, buffers, members):
+    """
+    Short hold times for buffers sharing a prep slot such that no two
+    of their prep procedures clash, or None if there are none.
+
+    The transfer end times of the buffers must lie at least T =
+    prep_total_duration apart around the cycle, each within the range
+    allowed by its hold time bounds. Some schedule, if any exists, has
+    every buffer either at the start of its range or T after another
+    buffer, so each buffer need only be tried at the starts of the
+    ranges shifted by up to k - 1 multiples of T, for k buffers. The
+    circle is cut at each buffer in turn (narrowest range first), at
+    each such position, leaving a line on which the others are
+    scheduled by earliest deadline with release times (see
+    `_earliest_deadline`). A range that reaches around the cut buffer
+    on both sides is cut to its later part; for some choice of cut
+    buffer, relabelling a schedule shows that this loses nothing. This
+    is exact: None is only returned if no schedule exists. The first
+    schedule found is returned, with each buffer as early in its range
+    as its order allows. Time is polynomial in k.
+
+    Parameters
+    ----------
+    parameters: untilperfect.Parameters
+    buffers: untilperfect.Buffers
+        With relative use start times set.
+    members: array_like of int
+        Indices of the buffers in the slot.
+
+    Returns
+    -------
+    numpy.ndarray or None
+        Hold time of each member.
+    """
+    members = numpy.asarray(members, dtype=int)
+    k = len(members)
+    ct = parameters.cycle_time
+    t_prep = parameters.prep_total_duration
+    t_use = numpy.asarray(buffers.relative_use_start_times, dtype=float)
+    z_min, z_max = (
+        bound[members] for bound in hold_time_bounds(parameters, buffers)
+    )
+    if k * t_prep > ct + EPS or (z_min > z_max + EPS).any():
+        return None
+    if k < 2:
+        return z_min
+    # positions around the cycle increase with hold time (reflecting
+    # transfer end times, which preserves the distances between them)
+    start = (z_min - t_use[members]) % ct
+    width = z_max - z_min
+    shifted = (start[:, None] + t_prep * numpy.arange(k)).ravel()
+    for cut in numpy.argsort(width, kind="stable"):
+        offsets = numpy.unique((shifted - start[cut]) % ct)
+        others = numpy.flatnonzero(numpy.arange(k) != cut)
+        for offset in offsets[offsets <= width[cut] + EPS]:
+            first = start[cut] + offset
+            # each range from where it next starts after the cut, or
+            # from before the cut if it starts too close to end after it
+            low = first + (start[others] - first) % ct
+            low = numpy.where(low > first + ct - t_prep + EPS, low - ct, low)
+            release = numpy.maximum(low, first + t_prep)
+            latest = numpy.minimum(low + width[others], first + ct - t_prep)
+            if (release > latest + EPS).any():
+                continue
+            starts = _earliest_deadline(
+                release.tolist(), latest.tolist(), t_prep
+            )
+            if starts is None:
+                continue
+            positions = numpy.empty(k)
+            positions[cut] = first
+            positions[others] = starts
+            return z_min + numpy.clip(
+                (positions - start + EPS) % ct - EPS, 0, width
+            )
+    return None
+
+
+def unschedulable_core(parameters, buffers, members):
+    """
+    Minimal subset of a slot's buffers that cannot be scheduled.
+
+    Each buffer in turn is dropped from the subset if the remaining
+    buffers still cannot be scheduled (see `schedule_slot`), so no
+    proper subset of the result is unschedulable.
+
+    Parameters
+    ----------
+    parameters: untilperfect.Parameters
+    buffers: untilperfect.Buffers
+    members: array_like of int
+        Indices of buffers that cannot be scheduled in one slot.
+
+    Returns
+    -------
+    list of int
+    """
+    core = [int(n) for n in members]
+    for n in list(core):
+        rest = [k for k in core if k != n]
+        if len(rest) > 1 and (
+            schedule_slot(parameters, buffers, rest) is None
+        ):
+            core = rest
+    return core
@@ -0,0 +1,544 @@
+"""
+heuristic.py
+
+This module contains heuristics that construct feasible solutions to a
+buffer preparation vessel assignment problem without a MIP solver.
+"""
+
+import time
+
+import numpy
+
+from .decomposition import schedule_slot
+from .presolve import compatibility, hold_time_bounds
+
+
+def slot_capacity(parameters):
+    """
+    Maximum number of buffers that may be prepared in one slot, given
+    the maximum prep utilization.
+
+    Parameters
+    ----------
+    parameters: untilperfect.Parameters
+
+    Returns
+    -------
+    int
+    """
+    pa = parameters
+    return int(
+        pa.cycle_time * pa.maximum_prep_utilization / pa.prep_total_duration
+        + 1e-9
+    )
+
+
+def cheapest_vessel(vessels, fits):
+    """
+    Cheapest vessel (and, of those, the smallest) among those flagged
+    by `fits`, or -1 if there is none.
+    """
+    candidates = numpy.flatnonzero(fits)
+    if not candidates.size:
+        return -1
+    costs = numpy.asarray(vessels.costs, dtype=float)[candidates]
+    volumes = numpy.asarray(vessels.volumes, dtype=float)[candidates]
+    return candidates[numpy.lexsort((volumes, costs))[0]]
+
+
+def _hold_time(parameters, t_use, z_min, z_max, others):
+    """
+    Shortest hold time in [z_min, z_max] whose transfer end time lies at
+    least prep_total_duration (around the cycle) from each of `others`,
+    or None if there is no such hold time.
+    """
+    ct = parameters.cycle_time
+    prep_duration = parameters.prep_total_duration
+    # the feasible hold times are intervals ending at one of these
+    candidates = numpy.concatenate(
+        (
+            [z_min],
+            t_use - others - prep_duration,
+            t_use - others + prep_duration,
+        )
+    )
+    candidates = z_min + (candidates - z_min) % ct
+    candidates = numpy.sort(candidates[candidates <= z_max + 1e-9])
+    for z in candidates:
+        d = (others - (t_use - z)) % ct
+        if numpy.all(
+            (d >= prep_duration - 1e-9) & (d <= ct - prep_duration + 1e-9)
+        ):
+            return float(min(z, z_max))
+    return None
+
+
+def greedy_assignment(parameters, buffers, vessels, compatible=None):
+    """
+    Construct a feasible assignment of buffers to prep slots.
+
+    Buffers are placed one at a time, largest volume (then narrowest
+    hold time window) first. Each buffer goes into the slot where it
+    adds least to the cost of the cheapest vessel that can prepare all
+    of the buffers in that slot, provided the slot has spare capacity
+    and a hold time can be found for the buffer such that its prep
+    procedure clashes with no other in the slot; failing that, a new
+    slot is opened. Each buffer is given the shortest such hold time.
+
+    The vessel type limit (`max_types`) is not taken into account.
+
+    Parameters
+    ----------
+    parameters: untilperfect.Parameters
+    buffers: untilperfect.Buffers
+        With relative use start times set.
+    vessels: untilperfect.Vessels
+    compatible: numpy.ndarray or None, optional
+        Vessel compatibility matrix; see `presolve.compatibility`.
+
+    Returns
+    -------
+    dict or None
+        'slots': slot of each buffer; 'hold_times': hold time of each
+        buffer; 'vessels': vessel in each slot, slots being ordered by
+        descending vessel volume; 'cost': total vessel cost. None if
+        some buffer cannot be placed, e.g. if no vessel can prepare it
+        or its hold time bounds leave no hold time.
+    """
+    if compatible is None:
+        compatible = compatibility(
+            buffers, vessels, parameters.minimum_fill_ratio
+        )
+    capacity = slot_capacity(parameters)
+    if capacity < 1:
+        return None
+    costs = numpy.asarray(vessels.costs, dtype=float)
+    t_use = numpy.asarray(buffers.relative_use_start_times, dtype=float)
+    h = numpy.zeros(buffers.count)
+    z_min, z_max = hold_time_bounds(parameters, buffers)
+    order = numpy.lexsort(
+        (z_max - z_min, -numpy.asarray(buffers.volumes, dtype=float))
+    )
+    slots = numpy.full(buffers.count, -1)
+    hold_times = numpy.zeros(buffers.count)
+    fits = []  # vessels able to prepare every buffer in each slot
+    chosen = []  # cheapest such vessel in each slot
+    for n in order:
+        # (cost increase, slot, vessel, hold time); slot -1 if none fits
+        best = (numpy.inf, -1, -1, 0.0)
+        for p, members in enumerate(fits):
+            in_slot = numpy.flatnonzero(slots == p)
+            if in_slot.size >= capacity:
+                continue
+            m = cheapest_vessel(vessels, members & compatible[:, n])
+            if m < 0:
+                continue
+            z = _hold_time(
+                parameters, t_use[n], z_min[n], z_max[n], h[in_slot]
+            )
+            if z is None:
+                continue
+            increase = costs[m] - costs[chosen[p]]
+            if increase < best[0]:
+                best = (increase, p, m, z)
+        if best[1] < 0:
+            m = cheapest_vessel(vessels, compatible[:, n])
+            if m < 0 or z_min[n] > z_max[n]:
+                return None
+            fits.append(numpy.ones(vessels.count, dtype=bool))
+            chosen.append(m)
+            best = (costs[m], len(fits) - 1, m, z_min[n])
+        _, p, m, z = best
+        slots[n] = p
+        fits[p] &= compatible[:, n]
+        chosen[p] = m
+        hold_times[n] = z
+        h[n] = (t_use[n] - z) % parameters.cycle_time
+    # relabel slots by descending vessel volume
+    volumes = numpy.asarray(vessels.volumes, dtype=float)[chosen]
+    relabel = numpy.argsort(-volumes, kind="stable")
+    rank = numpy.argsort(relabel)
+    return {
+        "slots": rank[slots],
+        "hold_times": hold_times,
+        "vessels": numpy.array(chosen)[relabel],
+        "cost": float(costs[chosen].sum()),
+    }
+
+
+class _Assignment:
+    """
+    Mutable assignment of buffers to prep slots, with hold times, used
+    by `local_search`. Slot vessels are the cheapest allowed vessel
+    able to prepare every buffer in a slot.
+    """
+
+    def __init__(self, parameters, buffers, vessels, compatible, solution):
+        self.parameters = parameters
+        self.buffers = buffers
+        self.vessels = vessels
+        self.costs = numpy.asarray(vessels.costs, dtype=float)
+        self.capacity = slot_capacity(parameters)
+        # vessels able to prepare each buffer and allowed vessels, as
+        # bit masks, and the cheapest vessel in each mask seen so far
+        self.masks = [
+            int(sum(1 << int(m) for m in numpy.flatnonzero(column)))
+            for column in compatible.T
+        ]
+        self.allowed = (1 << vessels.count) - 1
+        self.cheapest = {}
+        self.t_use = numpy.asarray(
+            buffers.relative_use_start_times, dtype=float
+        )
+        self.z_min, self.z_max = hold_time_bounds(parameters, buffers)
+        self.z = numpy.array(solution["hold_times"], dtype=float)
+        self.h = (self.t_use - self.z) % parameters.cycle_time
+        self.slots = numpy.array(solution["slots"])
+        self.members = [
+            list(numpy.flatnonzero(self.slots == p))
+            for p in range(len(solution["vessels"]))
+        ] + [[]]
+
+    def vessel(self, members):
+        """Vessel for a slot holding `members`, or -1 if there is none."""
+        if not members:
+            return -1
+        mask = self.allowed
+        for n in members:
+            mask &= self.masks[n]
+        try:
+            return self.cheapest[mask]
+        except KeyError:
+            fits = [(mask >> m) & 1 for m in range(self.vessels.count)]
+            self.cheapest[mask] = cheapest_vessel(self.vessels, fits)
+            return self.cheapest[mask]
+
+    def cost(self, members):
+        """Cost of a slot holding `members` (inf if infeasible)."""
+        if not members:
+            return 0.0
+        m = self.vessel(members)
+        return self.costs[m] if m >= 0 else numpy.inf
+
+    def hold_time(self, n, others, h=None):
+        """Shortest clash-free hold time for buffer n beside `others`."""
+        return _hold_time(
+            self.parameters,
+            self.t_use[n],
+            self.z_min[n],
+            self.z_max[n],
+            (self.h if h is None else h)[others],
+        )
+
+    def schedule(self, n, members):
+        """
+        Hold times allowing buffer n to join a slot holding `members`,
+        as a dict by buffer, or None if there are none. If n cannot be
+        timed around the current hold times of `members`, the whole
+        slot is re-timed (see `decomposition.schedule_slot`).
+        """
+        if len(members) >= self.capacity:
+            return None
+        z = self.hold_time(n, members)
+        if z is not None:
+            return {n: z}
+        z = schedule_slot(self.parameters, self.buffers, members + [n])
+        if z is None:
+            return None
+        return dict(zip(members + [n], z))
+
+    def move(self, n, p, times):
+        """Move buffer n to slot p, setting hold times by buffer."""
+        self.members[self.slots[n]].remove(n)
+        if not self.members[p]:  # keep an empty slot to move into
+            self.members.append([])
+        self.members[p].append(n)
+        self.slots[n] = p
+        for k, z in times.items():
+            self.z[k] = z
+            self.h[k] = (self.t_use[k] - z) % self.parameters.cycle_time
+
+    def save(self):
+        """Copy of the assignment, for `restore`."""
+        return (
+            self.slots.copy(),
+            self.z.copy(),
+            self.h.copy(),
+            [list(members) for members in self.members],
+        )
+
+    def restore(self, saved):
+        """Revert to an assignment saved with `save`."""
+        slots, z, h, members = saved
+        # in place, so that loops over `slots` see the restored values
+        self.slots[:], self.z[:], self.h[:] = slots, z, h
+        self.members = [list(m) for m in members]
+
+    def total_cost(self):
+        """Total vessel cost."""
+        return sum(self.cost(members) for members in self.members)
+
+    def solution(self):
+        """Solution in the form returned by `greedy_assignment`."""
+        used = [p for p, members in enumerate(self.members) if members]
+        chosen = numpy.array([self.vessel(self.members[p]) for p in used])
+        volumes = numpy.asarray(self.vessels.volumes, dtype=float)[chosen]
+        relabel = numpy.argsort(-volumes, kind="stable")
+        rank = numpy.full(len(self.members), -1)
+        rank[numpy.array(used, dtype=int)[relabel]] = numpy.arange(len(used))
+        return {
+            "slots": rank[self.slots],
+            "hold_times": self.z.copy(),
+            "vessels": chosen[relabel],
+            "cost": float(self.costs[chosen].sum()),
+        }
+
+
+def _limit_types(state, max_types):
+    """
+    Restrict the vessels allowed in `state` to at most `max_types`
+    types, dropping first the types whose slots are cheapest to move
+    into other types. Returns False if this is not possible.
+    """
+    while True:
+        used = {state.vessel(members) for members in state.members}
+        used.discard(-1)
+        if len(used) <= max_types:
+            state.allowed = int(sum(1 << int(m) for m in used))
+            return True
+        # (total cost, type to drop); cost is infinite if none can go
+        best = (numpy.inf, -1)
+        for m in used:
+            state.allowed &= ~(1 << int(m))
+            cost = state.total_cost()
+            state.allowed |= 1 << int(m)
+            if cost < best[0]:
+                best = (cost, m)
+        if not numpy.isfinite(best[0]):
+            return False
+        state.allowed &= ~(1 << int(best[1]))
+
+
+def _relocate(state, n, limit=numpy.inf, exclude=()):
+    """
+    Cheapest slot for buffer n other than its own and those in
+    `exclude`, increasing cost by less than `limit`, as (increase,
+    slot, hold times), or None.
+    """
+    best = None
+    candidates = []
+    opened = False  # only one empty slot need be considered
+    for p, members in enumerate(state.members):
+        if p == state.slots[n] or p in exclude or (opened and not members):
+            continue
+        opened |= not members
+        increase = state.cost(members + [n]) - state.cost(members)
+        if increase < limit:
+            candidates.append((increase, p))
+    for increase, p in sorted(candidates):
+        times = state.schedule(n, state.members[p])
+        if times is not None:
+            best = (increase, p, times)
+            break
+    return best
+
+
+def _empty_slots(state):
+    """Move every buffer out of a slot where this reduces cost."""
+    improved = False
+    for p in sorted(
+        range(len(state.members)), key=lambda p: len(state.members[p])
+    ):
+        members = list(state.members[p])
+        if not members:
+            continue
+        saved = state.save()
+        delta = -state.cost(members)
+        for n in members:
+            best = _relocate(state, n, -delta, exclude=(p,))
+            if best is None:
+                delta = numpy.inf
+                break
+            delta += best[0]
+            state.move(n, best[1], best[2])
+        if delta < -1e-9:
+            improved = True
+        else:
+            state.restore(saved)
+    return improved
+
+
+def _move_buffers(state):
+    """Move single buffers to other slots where this reduces cost."""
+    improved = False
+    for n, p in enumerate(state.slots):
+        rest = [k for k in state.members[p] if k != n]
+        saving = state.cost(state.members[p]) - state.cost(rest)
+        if saving <= 1e-9:
+            continue
+        best = _relocate(state, n, saving - 1e-9)
+        if best is not None:
+            state.move(n, best[1], best[2])
+            improved = True
+    return improved
+
+
+def _swap_buffers(state):
+    """
+    Swap buffers between slots where this reduces cost. Only buffers
+    whose removal would make their slot cheaper are considered.
+    """
+    improved = False
+    for n, p in enumerate(state.slots):
+        rest_p = [k for k in state.members[p] if k != n]
+        if state.cost(state.members[p]) - state.cost(rest_p) <= 1e-9:
+            continue
+        for q, members in enumerate(state.members):
+            if q == p or not members:
+                continue
+            before = state.cost(state.members[p]) + state.cost(members)
+            for k in members:
+                rest_q = [j for j in members if j != k]
+                after = state.cost(rest_p + [k]) + state.cost(rest_q + [n])
+                if after >= before - 1e-9:
+                    continue
+                times_n = state.schedule(n, rest_q)
+                if times_n is None:
+                    continue
+                saved = state.save()
+                state.move(n, q, times_n)
+                # n has left p, so k is timed against the rest of p
+                times_k = state.schedule(k, rest_p)
+                if times_k is None:
+                    state.restore(saved)
+                    continue
+                state.move(k, p, times_k)
+                improved = True
+                break
+            if state.slots[n] != p:
+                break
+    return improved
+
+
+def _retime(state):
+    """Give each buffer the shortest hold time clashing with none."""
+    improved = False
+    for n, p in enumerate(state.slots):
+        others = [k for k in state.members[p] if k != n]
+        z = state.hold_time(n, others)
+        if z is not None and z < state.z[n] - 1e-9:
+            state.move(n, state.slots[n], {n: z})
+            improved = True
+    return improved
+
+
+def _descend(state, deadline):
+    """Apply improving moves until there are none (or time runs out)."""
+    moves = (_empty_slots, _move_buffers, _swap_buffers)
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for move in moves:
+            improved |= move(state)
+
+
+def _perturb(state, rng, size=2):
+    """
+    Empty `size` randomly chosen slots, moving each of their buffers to
+    the cheapest other slot that it fits in, even if this costs more.
+    """
+    used = [p for p, members in enumerate(state.members) if members]
+    ruined = rng.choice(used, size=min(size, len(used)), replace=False)
+    for p in ruined:
+        for n in rng.permutation(state.members[p]):
+            best = _relocate(state, n, exclude=set(ruined))
+            if best is not None:
+                state.move(n, best[1], best[2])
+
+
+def local_search(
+    parameters,
+    buffers,
+    vessels,
+    solution,
+    compatible=None,
+    time_limit=None,
+    rounds=20,
+    seed=0,
+):
+    """
+    Improve a feasible assignment of buffers to prep slots.
+
+    Starting from `solution` (e.g. from `greedy_assignment`), the
+    following moves are repeated until none reduces cost: emptying a
+    slot by moving each of its buffers to other slots; moving single
+    buffers between slots (including into a new slot); and swapping
+    buffers between slots. A buffer that cannot be timed around the
+    others in a slot it moves to may have the whole slot re-timed.
+    Vessels are re-sized to suit each slot after every move.
+
+    Then, to escape local optima, a few randomly chosen slots are
+    emptied regardless of cost and the moves repeated, keeping the
+    result if it is no worse, until `rounds` successive attempts fail
+    to reduce cost. Finally, buffers are re-timed to the shortest hold
+    time that clashes with no other buffer in their slot.
+
+    The same rules as the complete problem apply: vessels must be
+    compatible with every buffer in their slot, slot utilization is
+    limited, prep procedures in a slot must not clash and no more than
+    `max_types` vessel types are used.
+
+    Parameters
+    ----------
+    parameters: untilperfect.Parameters
+    buffers: untilperfect.Buffers
+        With relative use start times set.
+    vessels: untilperfect.Vessels
+    solution: dict
+        See `greedy_assignment`.
+    compatible: numpy.ndarray or None, optional
+        Vessel compatibility matrix; see `presolve.compatibility`.
+    time_limit: float or None, optional
+        Time (s) after which no further moves are made.
+    rounds: int, optional
+        Number of successive failed perturbations after which to stop.
+    seed: int, optional
+        Random seed for perturbations.
+
+    Returns
+    -------
+    dict or None
+        Improved solution in the same form as `solution`, or None if no
+        solution using at most `max_types` vessel types was found.
+    """
+    if compatible is None:
+        compatible = compatibility(
+            buffers, vessels, parameters.minimum_fill_ratio
+        )
+    deadline = time.perf_counter() + (
+        numpy.inf if time_limit is None else time_limit
+    )
+    rng = numpy.random.default_rng(seed)
+    state = _Assignment(parameters, buffers, vessels, compatible, solution)
+    if parameters.max_types > 0 and not _limit_types(
+        state, parameters.max_types
+    ):
+        return None
+    _descend(state, deadline)
+    best_cost, best = state.total_cost(), state.save()
+    failures = 0
+    while failures < rounds and time.perf_counter() < deadline:
+        _perturb(state, rng)
+        _descend(state, deadline)
+        cost = state.total_cost()
+        if cost < best_cost - 1e-9:
+            failures = 0
+        else:
+            failures += 1
+        if cost <= best_cost + 1e-9:
+            best_cost, best = cost, state.save()
+        else:
+            state.restore(best)
+    while _retime(state):
+        pass
+    return state.solution()
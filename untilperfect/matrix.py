@@ -0,0 +1,843 @@
+"""
+matrix.py
+
+This module contains tools to build the constraints of the buffer
+preparation vessel assignment problem as blocks of sparse coefficient
+arrays, rather than one pulp expression at a time.
+"""
+
+import numpy
+import pulp
+
+from .presolve import clash_big_m, transfer_time_bounds
+
+
+class ColumnSpace:
+    """
+    Maps the elements of a sequence of LpVariableArrays onto a single
+    range of integer column ids.
+
+    Parameters
+    ----------
+    arrays: iterable of untilperfect.pulptools.LpVariableArray
+    """
+
+    def __init__(self, arrays):
+        self.arrays = list(arrays)
+        self.offsets = {}
+        offset = 0
+        for array in self.arrays:
+            self.offsets[array.name] = offset
+            offset += array.size
+        self.count = offset
+        self._starts = numpy.array(
+            [self.offsets[array.name] for array in self.arrays], dtype=int
+        )
+
+    def __call__(self, array, *index):
+        """
+        Column ids of the indexed elements of a variable array.
+
+        Parameters
+        ----------
+        array: untilperfect.pulptools.LpVariableArray
+        *index: int or array_like of int
+            One index (or array of indices) per dimension of `array`.
+
+        Returns
+        -------
+        numpy.ndarray
+        """
+        return self.offsets[array.name] + array.ordinals(*index)
+
+    def variables(self, columns):
+        """
+        Look up the pulp variables for an array of column ids.
+
+        Parameters
+        ----------
+        columns: numpy.ndarray
+
+        Returns
+        -------
+        numpy.ndarray
+            Object array of pulp.LpVariable, same shape as `columns`.
+        """
+        columns = numpy.asarray(columns, dtype=int)
+        result = numpy.empty(columns.shape, dtype=object)
+        owners = numpy.searchsorted(self._starts, columns, side="right") - 1
+        for i, array in enumerate(self.arrays):
+            mask = owners == i
+            if mask.any():
+                result[mask] = array.by_ordinals(
+                    columns[mask] - self._starts[i]
+                )
+        return result
+
+
+class ConstraintBlock:
+    """
+    A family of linear constraints in coordinate (COO) format.
+
+    Parameters
+    ----------
+    name: str
+        Name of the constraint family.
+    rows: numpy.ndarray
+        Row (local to the block) of each nonzero coefficient.
+    columns: numpy.ndarray
+        Column id of each nonzero coefficient.
+    coefficients: numpy.ndarray
+        Value of each nonzero coefficient.
+    senses: numpy.ndarray
+        Sense of each row (pulp.LpConstraintLE, pulp.LpConstraintEQ or
+        pulp.LpConstraintGE).
+    rhs: numpy.ndarray
+        Right hand side of each row.
+    """
+
+    def __init__(self, name, rows, columns, coefficients, senses, rhs):
+        self.name = name
+        self.rows = numpy.asarray(rows, dtype=int)
+        self.columns = numpy.asarray(columns, dtype=int)
+        self.coefficients = numpy.asarray(coefficients, dtype=float)
+        self.senses = numpy.asarray(senses, dtype=int)
+        self.rhs = numpy.asarray(rhs, dtype=float)
+        self.count = self.rhs.size
+
+    @property
+    def nonzeros(self):
+        """Number of nonzero coefficients in the block."""
+        return self.coefficients.size
+
+    @classmethod
+    def from_terms(cls, name, terms, senses, rhs):
+        """
+        Build a block from a sequence of terms common to every row.
+
+        Parameters
+        ----------
+        name: str
+        terms: list of tuple
+            Each term is a (columns, coefficients) pair. `columns` has
+            shape (R,) or (R, T) for a block of R rows; `coefficients`
+            must broadcast against `columns` reshaped to (R, T).
+        senses: int or array_like of int
+        rhs: array_like of float
+            Right hand side of each row; its length sets R.
+
+        Returns
+        -------
+        ConstraintBlock
+        """
+        rhs = numpy.asarray(rhs, dtype=float).ravel()
+        count = rhs.size
+        senses = numpy.broadcast_to(senses, (count,))
+        if count == 0 or not terms:
+            empty = numpy.empty(0, dtype=int)
+            return cls(name, empty, empty, empty.astype(float), senses, rhs)
+        row_ids = numpy.arange(count)
+        rows, columns, coefficients = [], [], []
+        for term_columns, term_coefficients in terms:
+            term_columns = numpy.reshape(term_columns, (count, -1))
+            term_coefficients = numpy.broadcast_to(
+                numpy.asarray(term_coefficients, dtype=float),
+                term_columns.shape,
+            )
+            rows.append(
+                numpy.broadcast_to(row_ids[:, None], term_columns.shape)
+            )
+            columns.append(term_columns)
+            coefficients.append(term_coefficients)
+        rows = numpy.concatenate(rows, axis=1).ravel()
+        columns = numpy.concatenate(columns, axis=1).ravel()
+        coefficients = numpy.concatenate(coefficients, axis=1).ravel()
+        # pulp drops terms multiplied by zero, so do the same here
+        keep = coefficients != 0
+        return cls(
+            name, rows[keep], columns[keep], coefficients[keep], senses, rhs
+        )
+
+    @classmethod
+    def stack(cls, name, blocks, positions=None):
+        """
+        Combine several blocks into one.
+
+        Parameters
+        ----------
+        name: str
+        blocks: list of ConstraintBlock
+        positions: list of numpy.ndarray or None, optional
+            Row of the combined block taken by each row of each block.
+            By default, blocks are stacked one after the other.
+
+        Returns
+        -------
+        ConstraintBlock
+        """
+        if positions is None:
+            offsets = numpy.cumsum([0] + [block.count for block in blocks])
+            positions = [
+                offset + numpy.arange(block.count)
+                for offset, block in zip(offsets, blocks)
+            ]
+        count = sum(block.count for block in blocks)
+        senses = numpy.empty(count, dtype=int)
+        rhs = numpy.empty(count, dtype=float)
+        # seeded with empty arrays so that an empty list of blocks works
+        rows, columns, coefficients = [[]], [[]], [[]]
+        for block, position in zip(blocks, positions):
+            position = numpy.asarray(position, dtype=int)
+            senses[position] = block.senses
+            rhs[position] = block.rhs
+            rows.append(position[block.rows])
+            columns.append(block.columns)
+            coefficients.append(block.coefficients)
+        return cls(
+            name,
+            numpy.concatenate(rows),
+            numpy.concatenate(columns),
+            numpy.concatenate(coefficients),
+            senses,
+            rhs,
+        )
+
+    def select(self, keep):
+        """
+        Block of a subset of the rows of this block.
+
+        Parameters
+        ----------
+        keep: numpy.ndarray
+            Boolean array flagging each row to keep.
+
+        Returns
+        -------
+        ConstraintBlock
+        """
+        keep = numpy.asarray(keep, dtype=bool)
+        rows = numpy.cumsum(keep) - 1
+        nonzeros = keep[self.rows]
+        return ConstraintBlock(
+            self.name,
+            rows[self.rows[nonzeros]],
+            self.columns[nonzeros],
+            self.coefficients[nonzeros],
+            self.senses[keep],
+            self.rhs[keep],
+        )
+
+    def to_csr(self):
+        """
+        Compressed sparse row form of the block.
+
+        Returns
+        -------
+        tuple of numpy.ndarray
+            (indptr, columns, coefficients), as used by CSR matrices.
+        """
+        order = numpy.argsort(self.rows, kind="stable")
+        indptr = numpy.zeros(self.count + 1, dtype=int)
+        numpy.cumsum(
+            numpy.bincount(self.rows, minlength=self.count), out=indptr[1:]
+        )
+        return indptr, self.columns[order], self.coefficients[order]
+
+    def to_pulp(self, problem, columns):
+        """
+        Add the constraints in this block to a pulp problem.
+
+        Parameters
+        ----------
+        problem: pulp.LpProblem
+        columns: ColumnSpace
+            Column space used to build the block.
+
+        Returns
+        -------
+        list of pulp.LpConstraint
+        """
+        indptr, column_ids, coefficients = self.to_csr()
+        variables = columns.variables(column_ids)
+        coefficients = coefficients.tolist()
+        senses = self.senses.tolist()
+        rhs = self.rhs.tolist()
+        constraints = []
+        for i in range(self.count):
+            start, end = indptr[i], indptr[i + 1]
+            expression = pulp.LpAffineExpression(
+                list(zip(variables[start:end], coefficients[start:end]))
+            )
+            constraint = pulp.LpConstraint(expression, senses[i], rhs=rhs[i])
+            problem.addConstraint(constraint)
+            constraints.append(constraint)
+        return constraints
+
+
+class MatrixBuilder:
+    """
+    Builds each constraint family of a BufferPrepProblem as a
+    ConstraintBlock.
+
+    Row order within each block matches the order in which the
+    equivalent constraints were historically added one at a time, so
+    that the resulting pulp model is unchanged.
+
+    Parameters
+    ----------
+    problem: untilperfect.model.BufferPrepProblem
+    """
+
+    def __init__(self, problem):
+        self.problem = problem
+        self.columns = problem.columns
+
+    def buffers_dedicated_to_slots(self):
+        """Constraint: A given buffer must always be made in the same slot."""
+        pr = self.problem
+        n, p = numpy.meshgrid(
+            numpy.arange(pr.N), numpy.arange(pr.P), indexing="ij"
+        )
+        return ConstraintBlock.from_terms(
+            "buffers_dedicated_to_slots",
+            [(self.columns(pr.x, n, p), 1.0)],
+            pulp.LpConstraintEQ,
+            numpy.ones(pr.N),
+        )
+
+    def max_one_vessel_per_slot(self):
+        """Constraint: A maximum of one vessel instance may inhabit a slot."""
+        pr = self.problem
+        p, m = numpy.meshgrid(
+            numpy.arange(pr.P), numpy.arange(pr.M), indexing="ij"
+        )
+        return ConstraintBlock.from_terms(
+            "max_one_vessel_per_slot",
+            [(self.columns(pr.y, m, p), 1.0)],
+            pulp.LpConstraintLE,
+            numpy.ones(pr.P),
+        )
+
+    def vessels_adequately_sized(self):
+        """Constraint: Prep vessels must'nt be too big nor too small."""
+        pr = self.problem
+        if pr.slot_volumes:
+            return self.vessels_sized_to_slots()
+        if pr.compatible is not None:
+            return self.vessels_compatible()
+        bv = numpy.asarray(pr.buffers.volumes, dtype=float)
+        vv = numpy.asarray(pr.vessels.volumes, dtype=float)
+        max_vol = pr.vessels.max_volume
+        mfr = pr.parameters.minimum_fill_ratio
+        n, p = [index.ravel() for index in numpy.indices((pr.N, pr.P))]
+        x = self.columns(pr.x, n, p)
+        y = self.columns(pr.y, numpy.arange(pr.M)[None, :], p[:, None])
+        too_small = ConstraintBlock.from_terms(
+            "vessels_not_too_small",
+            [(x, bv[n][:, None]), (y, -vv[None, :])],
+            pulp.LpConstraintLE,
+            numpy.zeros(n.size),
+        )
+        too_big = ConstraintBlock.from_terms(
+            "vessels_not_too_big",
+            [(x, -max_vol), (y, -(mfr * vv)[None, :])],
+            pulp.LpConstraintGE,
+            -(bv[n] + max_vol),
+        )
+        rows = 2 * numpy.arange(n.size)
+        return ConstraintBlock.stack(
+            "vessels_adequately_sized", [too_small, too_big], [rows, rows + 1]
+        )
+
+    def define_slot_volumes(self):
+        """Constraint: Slot volume is the volume of the vessel in it."""
+        pr = self.problem
+        p = numpy.arange(pr.P)
+        return ConstraintBlock.from_terms(
+            "define_slot_volumes",
+            [
+                (self.columns(pr.slot_volume, p), 1.0),
+                (
+                    self.columns(
+                        pr.y, numpy.arange(pr.M)[None, :], p[:, None]
+                    ),
+                    -numpy.asarray(pr.vessels.volumes, dtype=float),
+                ),
+            ],
+            pulp.LpConstraintEQ,
+            numpy.zeros(pr.P),
+        )
+
+    def vessels_sized_to_slots(self):
+        """
+        Constraint: Prep vessels must'nt be too big nor too small, sized
+        against the slot volume variables, with two terms per row.
+        """
+        pr = self.problem
+        bv = numpy.asarray(pr.buffers.volumes, dtype=float)
+        max_vol = pr.vessels.max_volume
+        mfr = pr.parameters.minimum_fill_ratio
+        n, p = [index.ravel() for index in numpy.indices((pr.N, pr.P))]
+        x = self.columns(pr.x, n, p)
+        volume = self.columns(pr.slot_volume, p)
+        too_small = ConstraintBlock.from_terms(
+            "vessels_not_too_small",
+            [(x, bv[n][:, None]), (volume, -1.0)],
+            pulp.LpConstraintLE,
+            numpy.zeros(n.size),
+        )
+        too_big = ConstraintBlock.from_terms(
+            "vessels_not_too_big",
+            [(x, -max_vol), (volume, -mfr)],
+            pulp.LpConstraintGE,
+            -(bv[n] + max_vol),
+        )
+        rows = 2 * numpy.arange(n.size)
+        return ConstraintBlock.stack(
+            "vessels_adequately_sized", [too_small, too_big], [rows, rows + 1]
+        )
+
+    def vessels_compatible(self):
+        """
+        Constraint: A buffer may only be prepared in a slot holding a
+        vessel that can prepare it.
+
+        Equivalent to `vessels_adequately_sized` given a compatibility
+        matrix, but without big-M coefficients and with one term per
+        compatible vessel only.
+        """
+        pr = self.problem
+        n, p = [index.ravel() for index in numpy.indices((pr.N, pr.P))]
+        return ConstraintBlock.from_terms(
+            "vessels_compatible",
+            [
+                (self.columns(pr.x, n, p), 1.0),
+                (
+                    self.columns(
+                        pr.y, numpy.arange(pr.M)[None, :], p[:, None]
+                    ),
+                    -pr.compatible.T[n].astype(float),
+                ),
+            ],
+            pulp.LpConstraintLE,
+            numpy.zeros(n.size),
+        )
+
+    def limit_max_utilization(self):
+        """
+        Constraint: Each prep vessel utilization must be below a limit.
+        """
+        pr = self.problem
+        p, n = numpy.meshgrid(
+            numpy.arange(pr.P), numpy.arange(pr.N), indexing="ij"
+        )
+        return ConstraintBlock.from_terms(
+            "limit_max_utilization",
+            [(self.columns(pr.x, n, p), pr.parameters.prep_total_duration)],
+            pulp.LpConstraintLE,
+            numpy.full(
+                pr.P,
+                pr.parameters.cycle_time
+                * pr.parameters.maximum_prep_utilization,
+            ),
+        )
+
+    def limit_vessel_types(self):
+        """Constraint: Limit the number of vessel types (sizes) used."""
+        pr = self.problem
+        m = numpy.arange(pr.M)
+        used = ConstraintBlock.from_terms(
+            "vessel_type_used",
+            [
+                (self.columns(pr.b, m), 1.0),
+                (
+                    self.columns(pr.y, m[:, None], numpy.arange(pr.P)),
+                    -1 / pr.P,
+                ),
+            ],
+            pulp.LpConstraintGE,
+            numpy.zeros(pr.M),
+        )
+        # the type limit is (redundantly) repeated once per vessel
+        limit = ConstraintBlock.from_terms(
+            "vessel_type_limit",
+            [(numpy.tile(self.columns(pr.b, m), (pr.M, 1)), 1.0)],
+            pulp.LpConstraintLE,
+            numpy.full(pr.M, pr.parameters.max_types),
+        )
+        rows = 2 * m
+        return ConstraintBlock.stack(
+            "limit_vessel_types", [used, limit], [rows, rows + 1]
+        )
+
+    def break_slot_symmetry(self):
+        """
+        Constraint: Slots are filled in order, with vessel volume
+        non-increasing with slot index.
+
+        Slots are interchangeable, so any solution can be relabelled to
+        sort its slots by descending vessel volume; empty slots (of zero
+        volume) then come last. Both orderings therefore hold for at
+        least one optimal solution.
+        """
+        pr = self.problem
+        vv = numpy.asarray(pr.vessels.volumes, dtype=float)
+        p = numpy.arange(pr.P - 1)[:, None]
+        m = numpy.arange(pr.M)[None, :]
+        this_slot = self.columns(pr.y, m, p)
+        next_slot = self.columns(pr.y, m, p + 1)
+        filled_in_order = ConstraintBlock.from_terms(
+            "slots_filled_in_order",
+            [(this_slot, 1.0), (next_slot, -1.0)],
+            pulp.LpConstraintGE,
+            numpy.zeros(pr.P - 1),
+        )
+        volume_non_increasing = ConstraintBlock.from_terms(
+            "slot_volume_non_increasing",
+            [(this_slot, vv[None, :]), (next_slot, -vv[None, :])],
+            pulp.LpConstraintGE,
+            numpy.zeros(pr.P - 1),
+        )
+        return ConstraintBlock.stack(
+            "break_slot_symmetry", [filled_in_order, volume_non_increasing]
+        )
+
+    def min_slots_used(self, count):
+        """Constraint: At least `count` prep slots hold a vessel."""
+        pr = self.problem
+        m, p = numpy.indices((pr.M, pr.P))
+        return ConstraintBlock.from_terms(
+            "min_slots_used",
+            [(self.columns(pr.y, m, p).reshape(1, -1), 1.0)],
+            pulp.LpConstraintGE,
+            [count],
+        )
+
+    def conflict_cliques(self):
+        """
+        Constraint: Each slot prepares at most one buffer from each
+        clique of the conflict graph.
+        """
+        pr = self.problem
+        size = max(len(clique) for clique in pr.cliques)
+        # pad cliques to a common size with zero coefficient terms
+        members = numpy.array(
+            [numpy.resize(clique, size) for clique in pr.cliques], dtype=int
+        )
+        present = (
+            numpy.arange(size)
+            < numpy.array([len(clique) for clique in pr.cliques])[:, None]
+        )
+        p = numpy.arange(pr.P)
+        return ConstraintBlock.from_terms(
+            "conflict_cliques",
+            [
+                (
+                    self.columns(pr.x, members[:, None, :], p[None, :, None]),
+                    numpy.repeat(present, pr.P, axis=0).astype(float),
+                )
+            ],
+            pulp.LpConstraintLE,
+            numpy.ones(len(pr.cliques) * pr.P),
+        )
+
+    def slot_no_goods(self, groups):
+        """
+        Constraint: No slot prepares every buffer in any of `groups`
+        (sets of buffers that cannot be scheduled in one slot).
+        """
+        pr = self.problem
+        size = max(len(g) for g in groups)
+        members = numpy.array(
+            [numpy.resize(g, size) for g in groups], dtype=int
+        )
+        counts = numpy.array([len(g) for g in groups])
+        present = numpy.arange(size) < counts[:, None]
+        p = numpy.arange(pr.P)
+        return ConstraintBlock.from_terms(
+            "slot_no_goods",
+            [
+                (
+                    self.columns(pr.x, members[:, None, :], p[None, :, None]),
+                    numpy.repeat(present, pr.P, axis=0).astype(float),
+                )
+            ],
+            pulp.LpConstraintLE,
+            numpy.repeat(counts - 1, pr.P).astype(float),
+        )
+
+    def hold_scheduling(self):
+        """Constraint: Buffer hold procedures mustn't clash."""
+        pr = self.problem
+        pa = pr.parameters
+        return ConstraintBlock.from_terms(
+            "hold_scheduling",
+            [(self.columns(pr.z, numpy.arange(pr.N)), 1.0)],
+            pulp.LpConstraintLE,
+            pa.cycle_time
+            - pa.hold_pre_duration
+            - pa.transfer_duration
+            - pa.hold_post_duration
+            - numpy.asarray(pr.buffers.use_durations, dtype=float),
+        )
+
+    def prep_scheduling(self):
+        """Constraint: Buffer prep procedures mustn't clash."""
+        pr = self.problem
+        # pairs of distinct buffers that may share a slot
+        n, k = numpy.nonzero(pr.pairs)
+        links, same_slot = self._same_slot_links(n, k)
+        wraps = self._wrap_indicators()
+        clashes = self._no_clashes(n, k, same_slot)
+        positions, wrap_rows, clash_rows = self._prep_row_positions(
+            n, len(links)
+        )
+        block = ConstraintBlock.stack(
+            "prep_scheduling", links + wraps + clashes, positions
+        )
+        if pr.wrap_indicators is None:
+            return block
+        return self._drop_decided(block, n, wrap_rows, clash_rows)
+
+    def _drop_decided(self, block, n, wrap_rows, clash_rows):
+        """
+        Drop the prep scheduling rows defining decided wrap indicators,
+        and the no-clash rows that a decided u[n] relaxes.
+        """
+        decided = self.problem.wrap_indicators
+        keep = numpy.ones(block.count, dtype=bool)
+        for j, name in enumerate("qqrrssuu"):
+            keep[wrap_rows + j] &= decided[name] < 0
+        for j, relaxed in enumerate([1, 1, 0, 0]):
+            keep[clash_rows + j] &= decided["u"][n] != relaxed
+        return block.select(keep)
+
+    def _pair_slots(self, n, k):
+        """
+        Each pair of buffers (n, k) repeated for each slot p.
+
+        Returns
+        -------
+        tuple of numpy.ndarray
+            (n, k, rank, p), ordered by pair then slot, where `rank` is
+            the position of each pair among the pairs of buffer n.
+        """
+        pairs_of = numpy.bincount(n, minlength=self.problem.N)
+        rank = numpy.arange(n.size) - (numpy.cumsum(pairs_of) - pairs_of)[n]
+        return tuple(
+            index.ravel()
+            for index in numpy.broadcast_arrays(
+                n[:, None],
+                k[:, None],
+                rank[:, None],
+                numpy.arange(self.problem.P),
+            )
+        )
+
+    def _same_slot_links(self, n, k):
+        """
+        Blocks indicating, for each pair of buffers (n, k), for each
+        slot, if both buffers are prepared in it.
+
+        Returns
+        -------
+        tuple
+            The list of linking blocks, and the columns of the variables
+            indicating that each pair shares a slot: one per pair (`a`),
+            or one per pair per slot (`w`).
+        """
+        pr = self.problem
+        cols = self.columns
+        pn, pk, _, pp = self._pair_slots(n, k)
+        x_n, x_k = cols(pr.x, pn, pp), cols(pr.x, pk, pp)
+        if pr.aggregate_same_slot:
+            # A single indicator per pair, forced to 1 if both buffers
+            # share any slot. Every no-clash row only gets harder to
+            # satisfy as it increases, so no upper link is needed.
+            links = [
+                ConstraintBlock.from_terms(
+                    "same_slot",
+                    [
+                        (x_n, 1.0),
+                        (x_k, 1.0),
+                        (cols(pr.same_slot, pn, pk), -1.0),
+                    ],
+                    pulp.LpConstraintLE,
+                    numpy.ones(pn.size),
+                )
+            ]
+            return links, cols(pr.same_slot, n, k)
+        w = cols(pr.w, pn, pk, pp)
+        links = [
+            ConstraintBlock.from_terms(
+                "same_slot_upper",
+                [(x_n, 1.0), (x_k, 1.0), (w, -1.0)],
+                pulp.LpConstraintLE,
+                numpy.ones(pn.size),
+            ),
+            ConstraintBlock.from_terms(
+                "same_slot_lower",
+                [(x_n, 1.0), (x_k, 1.0), (w, -2.0)],
+                pulp.LpConstraintGE,
+                numpy.zeros(pn.size),
+            ),
+        ]
+        return links, cols(pr.w, n[:, None], k[:, None], numpy.arange(pr.P))
+
+    def _wrap_indicators(self):
+        """
+        Blocks indicating, for each buffer, if relative use start time
+        minus hold time is negative (q), if the lower bound of the free
+        time window is greater than the cycle time (r), if the upper
+        bound of the free time window is less than zero (s) and if the
+        free time window crosses the cycle boundary (u = r or s).
+
+        Returns
+        -------
+        list of ConstraintBlock
+            Eight blocks of one row per buffer.
+        """
+        pr = self.problem
+        ct = pr.parameters.cycle_time
+        t_use = numpy.asarray(pr.buffers.relative_use_start_times, dtype=float)
+        t_prep = pr.parameters.prep_total_duration
+        le, ge = pulp.LpConstraintLE, pulp.LpConstraintGE
+        b = numpy.arange(pr.N)
+        q, r, s, u, z = [
+            self.columns(array, b) for array in (pr.q, pr.r, pr.s, pr.u, pr.z)
+        ]
+        wraps = [
+            ([(q, ct), (z, -1.0)], ge, -t_use),
+            ([(q, ct), (z, -1.0)], le, -t_use + ct),
+            ([(r, ct), (q, -ct), (z, 1.0)], le, t_prep + t_use),
+            ([(r, ct), (q, -ct), (z, 1.0)], ge, t_prep + t_use - ct),
+            ([(q, ct), (s, ct), (z, -1.0)], ge, t_prep - t_use),
+            ([(q, ct), (s, ct), (z, -1.0)], le, t_prep - t_use + ct),
+            ([(r, 1.0), (s, 1.0), (u, -1.0)], ge, numpy.zeros(pr.N)),
+            ([(r, 1.0), (s, 1.0), (u, -2.0)], le, numpy.zeros(pr.N)),
+        ]
+        return [
+            ConstraintBlock.from_terms("wrap_indicators", *args)
+            for args in wraps
+        ]
+
+    def _no_clashes(self, n, k, same_slot):
+        """
+        Blocks ensuring that the prep procedures of each pair of buffers
+        (n, k) don't clash if both are prepared in the same slot, as
+        indicated by the columns `same_slot`.
+
+        Returns
+        -------
+        list of ConstraintBlock
+            Four blocks of one row per pair.
+        """
+        pr = self.problem
+        cols = self.columns
+        ct = pr.parameters.cycle_time
+        t_prep = pr.parameters.prep_total_duration
+        t_use = numpy.asarray(pr.buffers.relative_use_start_times, dtype=float)
+        dt = t_use[n] - t_use[k]
+
+        # Each prep vessel can only do one thing at a time
+        if pr.tight_big_m:
+            big_m = numpy.stack(
+                clash_big_m(
+                    pr.parameters,
+                    *transfer_time_bounds(pr.parameters, pr.buffers)[:2],
+                    n,
+                    k,
+                ),
+                axis=1,
+            )
+        else:
+            big_m = numpy.full((n.size, 4), 2 * ct)
+        common = [
+            (cols(pr.q, k), ct),
+            (cols(pr.q, n), -ct),
+            (cols(pr.z, k), -1.0),
+            (cols(pr.z, n), 1.0),
+        ]
+        u_n, v_nk = cols(pr.u, n), cols(pr.v, n, k)
+        # big_m[:, [j]] scales terms of one or P columns per pair
+        clashes = [
+            (
+                common
+                + [
+                    (u_n, big_m[:, [0]]),
+                    (v_nk, big_m[:, [0]]),
+                    (same_slot, -big_m[:, [0]]),
+                ],
+                pulp.LpConstraintGE,
+                dt + t_prep - big_m[:, 0],
+            ),
+            (
+                common
+                + [
+                    (u_n, -big_m[:, [1]]),
+                    (v_nk, big_m[:, [1]]),
+                    (same_slot, big_m[:, [1]]),
+                ],
+                pulp.LpConstraintLE,
+                dt - t_prep + 2 * big_m[:, 1],
+            ),
+            (
+                common
+                + [
+                    (u_n, -big_m[:, [2]]),
+                    (cols(pr.r, n), ct),
+                    (same_slot, -big_m[:, [2]]),
+                ],
+                pulp.LpConstraintGE,
+                dt + t_prep - 2 * big_m[:, 2],
+            ),
+            (
+                common
+                + [
+                    (u_n, big_m[:, [3]]),
+                    (cols(pr.s, n), -ct),
+                    (same_slot, big_m[:, [3]]),
+                ],
+                pulp.LpConstraintLE,
+                dt - t_prep + 2 * big_m[:, 3],
+            ),
+        ]
+        return [
+            ConstraintBlock.from_terms("no_clash", *args) for args in clashes
+        ]
+
+    def _prep_row_positions(self, n, per_link):
+        """
+        Row order of the prep scheduling constraints: for each buffer,
+        its pair links then its wrap indicators; followed by all of the
+        no-clash rows.
+
+        Parameters
+        ----------
+        n: numpy.ndarray
+            First buffer of each pair.
+        per_link: int
+            Number of linking blocks.
+
+        Returns
+        -------
+        tuple
+            The positions of each block's rows, for `ConstraintBlock.stack`,
+            and the first wrap indicator row of each buffer and no-clash
+            row of each pair.
+        """
+        pn, _, rank, pp = self._pair_slots(n, n)
+        pairs_of = numpy.bincount(n, minlength=self.problem.N)
+        section_sizes = per_link * self.problem.P * pairs_of + 8
+        section_starts = numpy.cumsum(section_sizes) - section_sizes
+        link_rows = section_starts[pn] + per_link * (
+            self.problem.P * rank + pp
+        )
+        wrap_rows = section_starts + section_sizes - 8
+        clash_rows = section_sizes.sum() + 4 * numpy.arange(n.size)
+        positions = (
+            [link_rows + j for j in range(per_link)]
+            + [wrap_rows + j for j in range(8)]
+            + [clash_rows + j for j in range(4)]
+        )
+        return positions, wrap_rows, clash_rows
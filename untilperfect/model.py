@@ -6,14 +6,41 @@ assignment problem along with classes for Parameters, Buffers and
 Vessels. It also contains a function for solving the problem.
 """
 
+import cProfile
+import logging
+import time
+import tracemalloc
 
 import numpy
 import pulp
 
-from .pulptools import LpVariableArray
+from .decomposition import schedule_slot, unschedulable_core
+from .heuristic import greedy_assignment, local_search
+from .matrix import ColumnSpace, MatrixBuilder
+from .presolve import (
+    clique_cover,
+    compatibility,
+    conflict_graph,
+    hold_time_bounds,
+    presolve_vessels,
+    wrap_indicators,
+)
+from .pulptools import (
+    LpVariableArray,
+    limited_solver,
+    relative_gap,
+    solve_with_bound,
+    warm_start_solver,
+)
 from .plots import single_cycle_plot
+from .profiling import PhaseTimer, timed
+from .robustness import robustness
+from .sizing import admit
+from .validation import validate
 from .iotools import column_reader, get_config_section
 
+LOGGER = logging.getLogger(__name__)
+
 # PROJECT TODOs:
 # TODO: Incorporate type hinting to improve documentation
 # TODO: Semantics around model vs model instance vs problem vs ...
@@ -21,8 +48,6 @@ from .iotools import column_reader, get_config_section
 #
 # FILE TODOs:
 # TODO: Improve documentation!!!
-# TODO: Repeater with increasing number of slots may be faster than
-#       P = N
 # TODO: CLI argument to allow interactive run with problem returned for
 #       probing.
 # TODO: Check that everything works properly when called as a module
@@ -80,7 +105,7 @@ class Parameters:
             "maximum_prep_utilization", float, datadict, 1.0, False
         )
         self.max_slots = self._get_parameter_data(
-            "max_slots", int, datadict, 0, False
+            "max_slots", _slot_count, datadict, 0, False
         )
         self.max_types = self._get_parameter_data(
             "max_types", int, datadict, 0, False
@@ -105,6 +130,13 @@ class Parameters:
         return ptype(value)
 
 
+def _slot_count(value):
+    """Parses `max_slots`, which is either an integer or 'auto'."""
+    if str(value).strip().lower() == "auto":
+        return "auto"
+    return int(value)
+
+
 class Data:
     """
     Parent class of 'Buffers' and 'Vessels'. If initialized with a
@@ -198,38 +230,260 @@ class BufferPrepProblem:
     buffers: untilperfect.Buffers
     vessels: untilperfect.Vessels
     solver: None or pulp.LpSolver, optional
+    symmetry_breaking: bool, optional
+        If set to True (default), order the otherwise interchangeable
+        prep slots so that the solver does not explore permutations of
+        slot labels.
+    presolve: bool, optional
+        If set to True (default), remove prep vessels that cannot
+        feature in an optimal solution (see `presolve.presolve_vessels`)
+        and only allow each buffer to be prepared in slots holding a
+        compatible vessel; the full catalogue is kept as `catalogue` and
+        a summary of what was removed as `presolve_report`.
+    slot_volumes: bool, optional
+        If set to True, define a continuous variable `c` (kept as
+        `slot_volume`) for the volume of the vessel in each slot, and
+        size vessels against it rather than against a sum over all
+        vessels in every sizing constraint. Default is False.
+    aggregate_same_slot: bool, optional
+        If set to True, indicate that two buffers are prepared in the
+        same slot with a single continuous variable `a` (kept as
+        `same_slot`) per pair of buffers, rather than with a binary
+        variable `w` per pair of buffers per slot. Default is False.
+    tight_big_m: bool, optional
+        If set to True, use the smallest valid big-M for each no-clash
+        constraint between prep procedures, given the bounds on hold
+        times (see `presolve.clash_big_m`), rather than twice the cycle
+        time throughout. Default is False.
+    propagate_bounds: bool, optional
+        If set to True, bound hold times directly rather than with hold
+        scheduling constraints, fix the wrap indicators (q, r, s and u)
+        that these bounds decide (see `presolve.wrap_indicators`) and
+        leave out the constraints that this makes redundant. Default is
+        False.
+    conflict_cuts: bool, optional
+        If set to True (default), require each clique of the conflict
+        graph (see `presolve.conflict_graph`) to be prepared in distinct
+        slots, at least `min_slots` slots to be used, and leave out the
+        no-clash constraints (and pair variables) of conflicting buffers.
+        The graph is kept as `conflicts` and its clique cover as
+        `cliques` either way.
+    auto_slots: bool, optional
+        If set to True (default), choose the number of prep slots with
+        `slot_upper_bound` unless the `max_slots` parameter is set to a
+        positive number; otherwise allow one slot per buffer.
+    warm_start: bool, optional
+        If set to True (default), pass the heuristic solution (see
+        `set_initial_solution`) to the solver as an initial incumbent.
+    time_limit: float or None, optional
+        Solver time limit (s) for each model solved. A solver stopped
+        by the limit returns the best solution found, which is kept
+        with its bound and gap (see `bound` and `gap`).
+    gap_rel, gap_abs: float or None, optional
+        Relative and absolute gaps between the incumbent and the best
+        bound at which the solver may stop.
+    progress_callback: callable or None, optional
+        Called with each progress event (new incumbent, best bound, gap,
+        elapsed time and node count) while a model is solved; return
+        True to stop the solver with its best solution (see
+        `pulptools.solve_with_bound`).
+    timer: untilperfect.profiling.PhaseTimer or None, optional
+        Records the time spent in each phase of building and solving
+        the problem, and in each constraint builder; a new one is kept
+        as `timer` if not given.
+    size_budget: dict or None, optional
+        Limits on the size of the complete model ('variables',
+        'constraints', 'nonzeros' and 'memory' in bytes), checked once
+        the number of prep slots is chosen and before anything is built
+        (see `sizing.admit`); raises ValueError, suggesting a value of
+        `max_slots` that fits where there is one, if exceeded. The size
+        is kept as `size`.
+    build: bool, optional
+        If set to False, stop once the number of prep slots is chosen
+        (kept as `P`) and the size checked, without defining the model,
+        e.g. to estimate its size (see `sizing.model_size`). Default is
+        True.
     """
 
-    def __init__(self, parameters, buffers, vessels, solver=None):
-        # initialize problem
-        self.problem = pulp.LpProblem(sense=pulp.LpMinimize)
+    # decision variables needed to describe a solution; the remainder
+    # (a, c, q, r, s, u, v, w) are only evaluated on request
+    evaluated_variables = ("b", "x", "y", "z")
+
+    def __init__(
+        self,
+        parameters,
+        buffers,
+        vessels,
+        solver=None,
+        symmetry_breaking=True,
+        presolve=True,
+        slot_volumes=False,
+        aggregate_same_slot=False,
+        tight_big_m=False,
+        propagate_bounds=False,
+        conflict_cuts=True,
+        auto_slots=True,
+        warm_start=True,
+        time_limit=None,
+        gap_rel=None,
+        gap_abs=None,
+        progress_callback=None,
+        timer=None,
+        size_budget=None,
+        build=True,
+    ):
+        self.timer = timer or PhaseTimer()
         self.solver = solver
+        self.symmetry_breaking = symmetry_breaking
+        self.presolve = presolve
+        self.slot_volumes = slot_volumes
+        self.aggregate_same_slot = aggregate_same_slot
+        self.tight_big_m = tight_big_m
+        self.propagate_bounds = propagate_bounds
+        self.conflict_cuts = conflict_cuts
+        self.warm_start = warm_start
+        self.time_limit = time_limit
+        self.gap_rel = gap_rel
+        self.gap_abs = gap_abs
+        self.progress_callback = progress_callback
 
         # acquire data
         self.parameters = parameters
         self.buffers = buffers
-        self.vessels = vessels
+        self.catalogue = vessels
         self.buffers.set_relative_use_start_times(self.parameters.cycle_time)
+        if presolve:
+            with self.timer.phase("presolve"):
+                self.vessels, self.compatible, self.presolve_report = (
+                    presolve_vessels(parameters, buffers, vessels)
+                )
+            if self.presolve_report["unprepared"]:
+                LOGGER.warning(
+                    "No vessel can prepare buffer(s): %s",
+                    ", ".join(self.presolve_report["unprepared"]),
+                )
+        else:
+            self.vessels = vessels
+            self.compatible = None
+            self.presolve_report = None
+        if propagate_bounds:
+            self.wrap_indicators = wrap_indicators(parameters, buffers)
+        else:
+            self.wrap_indicators = None
 
         # define dimensions
         self.M = self.vessels.count
         self.N = self.buffers.count
-        if self.parameters.max_slots > 0:
-            self.P = min(self.parameters.max_slots, self.N)
+
+        # pairs of buffers that can never share a slot
+        with self.timer.phase("conflict_graph"):
+            self.conflicts = conflict_graph(
+                parameters,
+                buffers,
+                compatibility(
+                    buffers, self.vessels, parameters.minimum_fill_ratio
+                ),
+            )
+        self._cliques = None  # clique cover, found when first needed
+        # buffer pairs n < k that are scheduled against each other
+        self.pairs = numpy.triu(numpy.ones((self.N, self.N), dtype=bool), 1)
+        if conflict_cuts:
+            self.pairs &= ~self.conflicts
+        self.slot_selection = None
+        self.heuristic_solution = None
+        if self.parameters.max_slots not in (0, "auto"):
+            max_slots = min(self.parameters.max_slots, self.N)
+        elif auto_slots:
+            max_slots = self.slot_upper_bound()
         else:
-            self.P = self.N
+            max_slots = self.N
+        self.size = None
+        if size_budget:
+            with self.timer.phase("admission"):
+                self.size = admit(
+                    parameters,
+                    buffers,
+                    vessels,
+                    size_budget,
+                    max_slots,
+                    presolve=presolve,
+                    slot_volumes=slot_volumes,
+                    aggregate_same_slot=aggregate_same_slot,
+                    tight_big_m=tight_big_m,
+                    propagate_bounds=propagate_bounds,
+                    conflict_cuts=conflict_cuts,
+                    symmetry_breaking=symmetry_breaking,
+                )
+
+        # record of each model solved, where solved more than once
+        self.iterations = []
+        # incumbent objective over time, where improved iteratively
+        self.progress = []
+        # best bound on the objective of the last model solved, and the
+        # gap to it relative to the objective (NaN if not known)
+        self.bound = numpy.nan
+        self.gap = numpy.nan
+
+        if build:
+            self._initialize(max_slots)
+        else:
+            self.P = max_slots
+
+    @property
+    def cliques(self):
+        """Clique cover of `conflicts` (see `presolve.clique_cover`)."""
+        if self._cliques is None:
+            self._cliques = clique_cover(self.conflicts)
+        return self._cliques
+
+    @property
+    def min_slots(self):
+        """Lower bound on slots used; see `slot_lower_bound`."""
+        return self.slot_lower_bound()
+
+    @timed()
+    def _initialize(self, slots):
+        """
+        Define a new (empty) problem, its decision variables and its
+        objectives for a given number of prep slots.
+        """
+        # initialize problem
+        self.problem = pulp.LpProblem(sense=pulp.LpMinimize)
+        self.P = slots
 
         # define decision variables
-        self.variables = set()
+        self.variables = {}
         self.b = self._new_variable("b", self.M, cat="Binary")
         self.q = self._new_variable("q", self.N, cat="Binary")
         self.r = self._new_variable("r", self.N, cat="Binary")
         self.s = self._new_variable("s", self.N, cat="Binary")
         self.u = self._new_variable("u", self.N, cat="Binary")
-        self.v = self._new_variable("v", (self.N, self.N), cat="Binary")
-        self.w = self._new_variable(
-            "w", (self.N, self.N, self.P), cat="Binary"
+        # v and w (or a) are only defined for buffer pairs n < k, less
+        # any pairs that are known to conflict
+        self.v = self._new_variable(
+            "v",
+            (self.N, self.N),
+            cat="Binary",
+            index=lambda n, k: self.pairs[n, k],
         )
+        if self.aggregate_same_slot:
+            self.same_slot = self._new_variable(
+                "a",
+                (self.N, self.N),
+                0,
+                1,
+                "Continuous",
+                index=lambda n, k: self.pairs[n, k],
+            )
+            self.w = None
+        else:
+            self.same_slot = None
+            self.w = self._new_variable(
+                "w",
+                (self.N, self.N, self.P),
+                cat="Binary",
+                index=lambda n, k, p: self.pairs[n, k],
+            )
         self.x = self._new_variable("x", (self.N, self.P), cat="Binary")
         self.y = self._new_variable("y", (self.M, self.P), cat="Binary")
         self.z = self._new_variable(
@@ -239,6 +493,17 @@ class BufferPrepProblem:
             self.parameters.hold_duration_max,
             "Continuous",
         )
+        if self.slot_volumes:
+            self.slot_volume = self._new_variable(
+                "c", self.P, 0, self.vessels.max_volume, "Continuous"
+            )
+        else:
+            self.slot_volume = None
+
+        # constraints are built as blocks of sparse coefficient arrays
+        self.columns = ColumnSpace(self.variables.values())
+        self.builder = MatrixBuilder(self)
+        self.blocks = []
 
         # initialize results
         # TODO: Are all of these necessary in the class?
@@ -275,162 +540,91 @@ class BufferPrepProblem:
         Define and register a new multidimensional decision variable.
         """
         variable = LpVariableArray(*args, **kwargs)
-        self.variables.add(variable)
+        self.variables[variable.name] = variable
         return variable
 
+    def _add_block(self, block):
+        """Add a block of constraints to the problem."""
+        self.blocks.append(block)
+        block.to_pulp(self.problem, self.columns)
+
+    @timed("builders")
     def _buffers_dedicated_to_slots(self):
         """
         Constraint: A given buffer must always be made in the same slot.
         """
-        for n in range(self.N):
-            self.problem += sum([self.x[n, p] for p in range(self.P)]) == 1
+        self._add_block(self.builder.buffers_dedicated_to_slots())
 
+    @timed("builders")
     def _max_one_vessel_per_slot(self):
         """
         Constraint: A maximum of one vessel instance may inhabit a slot.
         """
-        for p in range(self.P):
-            self.problem += sum([self.y[m, p] for m in range(self.M)]) <= 1
+        self._add_block(self.builder.max_one_vessel_per_slot())
 
+    @timed("builders")
     def _vessels_adequately_sized(self):
         """Constraint: Prep vessels must'nt be too big nor too small."""
-        bv = self.buffers.volumes
-        vv = self.vessels.volumes
-        max_vol = self.vessels.max_volume
-        mfr = self.parameters.minimum_fill_ratio
-        for n in range(self.N):
-            for p in range(self.P):
-                self.problem += bv[n] * self.x[n, p] <= (
-                    sum([vv[m] * self.y[m, p] for m in range(self.M)])
-                )
-                self.problem += bv[n] + max_vol - max_vol * self.x[n, p] >= (
-                    mfr * sum([vv[m] * self.y[m, p] for m in range(self.M)])
-                )
+        if self.slot_volumes:
+            self._add_block(self.builder.define_slot_volumes())
+        self._add_block(self.builder.vessels_adequately_sized())
 
+    @timed("builders")
     def _limit_max_utilization(self):
         """
         Constraint: Each prep vessel utilization must be below a limit.
         """
-        for p in range(self.P):
-            self.problem += (
-                sum([self.x[n, p] for n in range(self.N)])
-                * self.parameters.prep_total_duration
-                <= self.parameters.cycle_time
-                * self.parameters.maximum_prep_utilization
-            )
+        self._add_block(self.builder.limit_max_utilization())
 
+    @timed("builders")
     def _limit_vessel_types(self):
         """Constraint: Limit the number of vessel types (sizes) used."""
         if self.parameters.max_types:
-            for m in range(self.M):
-                self.problem += (
-                    self.b[m]
-                    >= sum(self.y[m, p] for p in range(self.P)) / self.P
-                )
-                self.problem += (
-                    sum([self.b[m] for m in range(self.M)])
-                    <= self.parameters.max_types
-                )
+            self._add_block(self.builder.limit_vessel_types())
+
+    @timed("builders")
+    def _break_slot_symmetry(self):
+        """
+        Constraint: Slots are filled in order, with vessel volume
+        non-increasing with slot index.
+        """
+        if self.symmetry_breaking and self.P > 1:
+            self._add_block(self.builder.break_slot_symmetry())
 
+    @timed("builders")
     def _hold_scheduling(self):
         """Constraint: Buffer hold procedures mustn't clash."""
-        for n in range(self.N):
-            self.problem += self.z[n] <= (
-                self.parameters.cycle_time
-                - self.parameters.hold_pre_duration
-                - self.parameters.transfer_duration
-                - self.parameters.hold_post_duration
-                - self.buffers.use_durations[n]
-            )
+        if self.propagate_bounds:
+            lower, upper = hold_time_bounds(self.parameters, self.buffers)
+            # a solver may reject crossed bounds outright; leave them to
+            # the constraint, so that the problem is reported infeasible
+            crossed = upper < lower
+            self.z.set_bounds(up_bound=numpy.where(crossed, numpy.nan, upper))
+            if crossed.any():
+                self._add_block(self.builder.hold_scheduling().select(crossed))
+        else:
+            self._add_block(self.builder.hold_scheduling())
 
+    @timed("builders")
     def _prep_scheduling(self):
         """Constraint: Buffer prep procedures mustn't clash."""
-        ct = self.parameters.cycle_time
-        t_use = self.buffers.relative_use_start_times
-        t_prep = self.parameters.prep_total_duration
-        for n in range(self.N):
-            # For each pair of distinct buffers, for each slot,
-            # indicate if both buffers are prepared in the given slot
-            for k in range(n + 1, self.N):
-                for p in range(self.P):
-                    self.problem += (
-                        self.x[n, p] + self.x[k, p] - self.w[n, k, p] <= 1
-                    )
-                    self.problem += (
-                        self.x[n, p] + self.x[k, p] >= 2 * self.w[n, k, p]
-                    )
-            # For each buffer, indicate if relative use start time
-            # minus hold time is negative (defining q)
-            self.problem += ct * self.q[n] - self.z[n] >= -t_use[n]
-            self.problem += ct * self.q[n] - self.z[n] <= -t_use[n] + ct
-            # For each buffer, indicate if lower bound of free time
-            # window is greater than the cycle time (defining r)
-            self.problem += (
-                ct * self.r[n] - ct * self.q[n] + self.z[n]
-                <= t_prep + t_use[n]
-            )
-            self.problem += (
-                ct * self.r[n] - ct * self.q[n] + self.z[n]
-                >= t_prep + t_use[n] - ct
-            )
-            # For each buffer, indicate if upper bound of free time
-            # window is less than zero (defining s)
-            self.problem += (
-                ct * self.q[n] + ct * self.s[n] - self.z[n]
-                >= t_prep - t_use[n]
-            )
-            self.problem += (
-                ct * self.q[n] + ct * self.s[n] - self.z[n]
-                <= t_prep - t_use[n] + ct
-            )
-            # For each buffer, indicate if free time window crosses
-            # cycle boundary (u = r or s)
-            self.problem += self.r[n] + self.s[n] - self.u[n] >= 0
-            self.problem += self.r[n] + self.s[n] - 2 * self.u[n] <= 0
-        # Each prep vessel can only do one thing at a time
-        big_m = 2 * ct
-        for n in range(self.N):
-            for k in range(n + 1, self.N):
-                self.problem += (
-                    ct * self.q[k]
-                    - ct * self.q[n]
-                    - self.z[k]
-                    + self.z[n]
-                    + big_m * self.u[n]
-                    + big_m * self.v[n, k]
-                    - big_m * sum([self.w[n, k, p] for p in range(self.P)])
-                    >= t_use[n] - t_use[k] + t_prep - big_m
-                )
-                self.problem += (
-                    ct * self.q[k]
-                    - ct * self.q[n]
-                    - self.z[k]
-                    + self.z[n]
-                    - big_m * self.u[n]
-                    + big_m * self.v[n, k]
-                    + big_m * sum([self.w[n, k, p] for p in range(self.P)])
-                    <= t_use[n] - t_use[k] - t_prep + 2 * big_m
-                )
-                self.problem += (
-                    ct * self.q[k]
-                    - ct * self.q[n]
-                    - self.z[k]
-                    + self.z[n]
-                    - big_m * self.u[n]
-                    + ct * self.s[n]
-                    - big_m * sum([self.w[n, k, p] for p in range(self.P)])
-                    >= t_use[n] - t_use[k] + t_prep - 2 * big_m
-                )
-                self.problem += (
-                    ct * self.q[k]
-                    - ct * self.q[n]
-                    - self.z[k]
-                    + self.z[n]
-                    + big_m * self.u[n]
-                    - ct * self.r[n]
-                    + big_m * sum([self.w[n, k, p] for p in range(self.P)])
-                    <= t_use[n] - t_use[k] - t_prep + 2 * big_m
-                )
+        if self.propagate_bounds:
+            for name, values in self.wrap_indicators.items():
+                fixed = numpy.where(values >= 0, values, numpy.nan)
+                self.variables[name].set_bounds(fixed, fixed)
+        self._add_block(self.builder.prep_scheduling())
+
+    @timed("builders")
+    def _conflict_cuts(self):
+        """
+        Constraint: Conflicting buffers are prepared in distinct slots,
+        so at least `min_slots` slots hold a vessel.
+        """
+        if self.conflict_cuts:
+            if self.cliques:
+                self._add_block(self.builder.conflict_cliques())
+            if self.min_slots > 1:
+                self._add_block(self.builder.min_slots_used(self.min_slots))
 
     def basic(self, do_solve=True):
         """
@@ -457,8 +651,9 @@ class BufferPrepProblem:
         self._vessels_adequately_sized()
         self._limit_max_utilization()
         self._limit_vessel_types()
+        self._break_slot_symmetry()
         if do_solve:
-            return self.problem.solve(self.solver)
+            return self._solve()
 
     def complete(self, do_solve=True):
         """
@@ -482,59 +677,821 @@ class BufferPrepProblem:
         self.basic(do_solve=False)
         self._hold_scheduling()
         self._prep_scheduling()
+        self._conflict_cuts()
         if do_solve:
-            return self.problem.solve(self.solver)
+            return self._solve()
+
+    def _solve(self):
+        """
+        Solve the problem as built, warm started from the heuristic
+        solution if `warm_start` is set.
+        """
+        if self.warm_start and self.set_initial_solution():
+            return self._run_solver(warm_start_solver(self.solver))
+        return self._run_solver()
+
+    @timed(name="solver")
+    def _run_solver(self, solver=None, time_limit=None):
+        """
+        Solve the problem as built within the time and gap limits set,
+        reporting progress to `progress_callback`, and keep the best
+        bound on the objective as `bound` and the gap to it as `gap` (see
+        `pulptools.solve_with_bound`).
+
+        Parameters
+        ----------
+        solver: pulp.LpSolver or None, optional
+            Solver to use in place of `self.solver`.
+        time_limit: float or None, optional
+            Time limit (s) in place of `self.time_limit`.
+
+        Returns
+        -------
+        int
+            Problem status (see pulp.LpStatus).
+        """
+        solver = limited_solver(
+            solver or self.solver,
+            self.time_limit if time_limit is None else time_limit,
+            self.gap_rel,
+            self.gap_abs,
+        )
+        status, self.bound = solve_with_bound(
+            self.problem, solver, self.progress_callback
+        )
+        if self.problem.sol_status in (
+            pulp.LpSolutionOptimal,
+            pulp.LpSolutionIntegerFeasible,
+        ):
+            self.gap = relative_gap(
+                pulp.value(self.problem.objective), self.bound
+            )
+        else:
+            self.gap = numpy.nan
+        return status
+
+    @timed()
+    def find_heuristic_solution(self):
+        """
+        Find a feasible solution to the complete problem without a MIP
+        solver, keeping it as `heuristic_solution`.
+
+        The solution is constructed by `heuristic.greedy_assignment`
+        and improved by `heuristic.local_search`.
 
-    def minimized_hold_time(self):
+        Returns
+        -------
+        dict or None
+            See `heuristic.greedy_assignment`; None if no solution was
+            found.
+        """
+        if self.heuristic_solution is None:
+            compatible = compatibility(
+                self.buffers,
+                self.vessels,
+                self.parameters.minimum_fill_ratio,
+            )
+            solution = greedy_assignment(
+                self.parameters, self.buffers, self.vessels, compatible
+            )
+            if solution is not None:
+                solution = local_search(
+                    self.parameters,
+                    self.buffers,
+                    self.vessels,
+                    solution,
+                    compatible,
+                )
+            self.heuristic_solution = solution
+        return self.heuristic_solution
+
+    @timed()
+    def set_initial_solution(self):
+        """
+        Set the initial value of every decision variable to its value in
+        the solution found by `find_heuristic_solution`, for use as a
+        warm start.
+
+        The solution is feasible for the basic and complete problems,
+        provided that it uses no more than `P` slots.
+
+        Returns
+        -------
+        bool
+            True if initial values were set.
+        """
+        solution = self.find_heuristic_solution()
+        if solution is None:
+            return False
+        chosen = solution["vessels"]
+        used = len(chosen)
+        if used > self.P:
+            return False
+        ct = self.parameters.cycle_time
+        t_prep = self.parameters.prep_total_duration
+        slots = solution["slots"]
+        z = solution["hold_times"]
+        # transfer end times within the cycle and their wrap indicators
+        h = numpy.asarray(self.buffers.relative_use_start_times) - z
+        q = h < 0
+        h = h + ct * q
+        r, s = h > ct - t_prep, h < t_prep
+        x = numpy.zeros((self.N, self.P))
+        x[numpy.arange(self.N), slots] = 1
+        y = numpy.zeros((self.M, self.P))
+        y[chosen, numpy.arange(used)] = 1
+        values = {
+            "b": y.any(axis=1),
+            "q": q,
+            "r": r,
+            "s": s,
+            "u": r | s,
+            # v[n, k] = 1 if buffer k is prepared before buffer n
+            "v": h[None, :] < h[:, None],
+            "a": slots[:, None] == slots[None, :],
+            "w": x[:, None, :] * x[None, :, :],
+            "x": x,
+            "y": y,
+            "z": z,
+            "c": y.T @ numpy.asarray(self.vessels.volumes, dtype=float),
+        }
+        for name, variable in self.variables.items():
+            variable.set_initial_values(values[name])
+        return True
+
+    def slot_lower_bound(self):
+        """
+        Lower bound on the number of prep slots any solution to the
+        complete problem must use.
+
+        Each slot can prepare at most floor(cycle_time *
+        maximum_prep_utilization / prep_total_duration) buffers, and the
+        buffers in each clique of the conflict graph must be prepared in
+        distinct slots.
+
+        Returns
+        -------
+        int
+        """
+        pa = self.parameters
+        per_slot = numpy.floor(
+            pa.cycle_time
+            * pa.maximum_prep_utilization
+            / pa.prep_total_duration
+            + 1e-9
+        )
+        if per_slot < 1:
+            return self.N
+        largest_clique = max(map(len, self.cliques), default=1)
+        return max(1, int(numpy.ceil(self.N / per_slot)), largest_clique)
+
+    def slot_upper_bound(self):
+        """
+        Number of prep slots sufficient for an optimal solution.
+
+        A feasible solution is found with `find_heuristic_solution`,
+        and the optimum costs no more than it. Each slot used by an
+        optimal solution prepares at least one buffer, in a vessel
+        costing at least as much as the cheapest vessel that can prepare
+        that buffer, so an optimal solution using P slots costs at least
+        the sum of the P smallest such costs. Where no feasible
+        heuristic solution is found, one slot per buffer is allowed.
+
+        How the number was chosen is logged and kept as
+        `slot_selection`.
+
+        Returns
+        -------
+        int
+        """
+        solution = self.find_heuristic_solution()
+        report = {"heuristic_slots": None, "heuristic_cost": None}
+        if solution is not None:
+            report["heuristic_slots"] = len(solution["vessels"])
+            report["heuristic_cost"] = solution["cost"]
+        if solution is None:
+            slots, reason = self.N, "no feasible heuristic solution"
+        else:
+            compatible = compatibility(
+                self.buffers,
+                self.vessels,
+                self.parameters.minimum_fill_ratio,
+            )
+            costs = numpy.asarray(self.vessels.costs, dtype=float)
+            cheapest = numpy.where(compatible, costs[:, None], numpy.inf)
+            floor = numpy.cumsum(numpy.sort(cheapest.min(axis=0)))
+            slots = int(numpy.sum(floor <= solution["cost"] + 1e-6))
+            reason = (
+                "heuristic solution with {} slots costs {:.2f}; more than "
+                "{} slots cost more".format(
+                    report["heuristic_slots"], solution["cost"], slots
+                )
+            )
+        report.update(slots=slots, reason=reason)
+        self.slot_selection = report
+        LOGGER.info("Using %d prep slots (%s)", slots, reason)
+        return slots
+
+    def incremental(self, do_solve=True):
+        """
+        Solve complete problem to minimize cost, starting with few prep
+        slots and adding slots until the solution is provably optimal.
+
+        Before solving with P slots, the basic problem (a relaxation of
+        the complete problem) is solved with the maximum number of slots,
+        at least P + 1 of which must be used. This bounds the cost of
+        any solution using more than P slots, so once the optimum for P
+        slots is no greater, adding slots cannot help. Each model is
+        warm started from the previous optimum (which remains feasible
+        with an extra, empty slot). Timings for each model solved are
+        recorded in `iterations`.
+
+        Parameters
+        ----------
+        do_solve: bool, optional
+            Included for consistency with other problem types; the
+            problem is always solved.
+
+        Returns
+        -------
+        int
+            Problem status of the last model solved (see pulp.LpStatus).
+
+        """
+        # pylint: disable=W0613
+        max_slots = self.P
+        self.iterations = []
+        incumbent = None
+        solver = self.solver
+        status = pulp.LpStatusNotSolved
+        for slots in range(min(self.slot_lower_bound(), max_slots), max_slots):
+            bound_status = self._iterate(
+                max_slots, BufferPrepProblem.basic, min_used=slots + 1
+            )
+            if bound_status == pulp.LpStatusOptimal:
+                cost_bound = pulp.value(self.total_cost)
+            else:
+                cost_bound = numpy.inf
+            status = self._iterate(
+                slots, BufferPrepProblem.complete, incumbent, solver
+            )
+            if status != pulp.LpStatusOptimal:
+                continue
+            if pulp.value(self.total_cost) <= cost_bound + 1e-6:
+                return status
+            incumbent = {}
+            for name, variable in self.variables.items():
+                variable.evaluate()
+                incumbent[name] = variable.values
+            solver = warm_start_solver(self.solver)
+        return self._iterate(
+            max_slots, BufferPrepProblem.complete, incumbent, solver
+        )
+
+    def _iterate(
+        self, slots, problem_type, incumbent=None, solver=None, min_used=0
+    ):
+        """
+        Rebuild and solve the problem with a given number of slots,
+        recording timings in `iterations`.
+
+        Parameters
+        ----------
+        slots: int
+        problem_type:
+            Either BufferPrepProblem.basic or BufferPrepProblem.complete.
+        incumbent: dict or None, optional
+            Values of each decision variable (by name) in a previous
+            solution, used as initial values where indices coincide.
+            Otherwise, the complete problem is warm started from the
+            heuristic solution if `warm_start` is set.
+        solver: pulp.LpSolver or None, optional
+            Solver to use in place of `self.solver`.
+        min_used: int, optional
+            Minimum number of slots that must hold a vessel.
+
+        Returns
+        -------
+        int
+            Problem status (see pulp.LpStatus).
+        """
+        start = time.perf_counter()
+        self._initialize(slots)
+        problem_type(self, do_solve=False)
+        if min_used:
+            self._add_block(self.builder.min_slots_used(min_used))
+        if incumbent:
+            for name, variable in self.variables.items():
+                values = numpy.zeros(variable.dimensions)
+                overlap = tuple(
+                    slice(0, min(i, j))
+                    for i, j in zip(variable.dimensions, incumbent[name].shape)
+                )
+                values[overlap] = incumbent[name][overlap]
+                variable.set_initial_values(values)
+        elif (
+            self.warm_start
+            and problem_type is BufferPrepProblem.complete
+            and self.set_initial_solution()
+        ):
+            solver = warm_start_solver(solver or self.solver)
+        built = time.perf_counter()
+        status = self._run_solver(solver)
+        solved = time.perf_counter()
+        self.iterations.append(
+            {
+                "model": problem_type.__name__,
+                "slots": slots,
+                "min_used": min_used,
+                "status": pulp.LpStatus[status],
+                "objective": pulp.value(self.problem.objective),
+                "build_time": built - start,
+                "solve_time": solved - built,
+            }
+        )
+        return status
+
+    def decomposition(self, do_solve=True, max_iterations=100):
+        """
+        Solve complete problem to minimize cost by logic-based
+        decomposition.
+
+        The master problem is the basic problem (with conflict cuts, if
+        set), which assigns buffers and vessels to slots. The buffers in
+        each slot of its optimum are then scheduled separately (see
+        `reschedule`). Where a slot cannot be scheduled, a minimal
+        unschedulable subset of its buffers is found and a no-good cut
+        added to the master problem, barring that subset from every
+        slot, and the master problem is solved again. Once every slot
+        can be scheduled, the solution is optimal for the complete
+        problem. Timings for each master problem solved are recorded in
+        `iterations`.
+
+        Parameters
+        ----------
+        do_solve: bool, optional
+            Included for consistency with other problem types; the
+            problem is always solved.
+        max_iterations: int, optional
+            Maximum number of master problems solved.
+
+        Returns
+        -------
+        int
+            Problem status (see pulp.LpStatus); pulp.LpStatusNotSolved
+            if no schedulable assignment was found within
+            `max_iterations`.
+
+        """
+        # pylint: disable=W0613
+        start = time.perf_counter()
+        self.iterations = []
+        self.basic(do_solve=False)
+        self._conflict_cuts()
+        cores = []
+        for _ in range(max_iterations):
+            built = time.perf_counter()
+            status = self._solve()
+            solved = time.perf_counter()
+            self.iterations.append(
+                {
+                    "model": "master",
+                    "slots": self.P,
+                    "min_used": self.min_slots if self.conflict_cuts else 0,
+                    "cuts": len(cores),
+                    "status": pulp.LpStatus[status],
+                    "objective": pulp.value(self.problem.objective),
+                    "build_time": built - start,
+                    "solve_time": solved - built,
+                }
+            )
+            if status != pulp.LpStatusOptimal:
+                return status
+            start = time.perf_counter()
+            self.x.evaluate()
+            slots = self.x.values.argmax(axis=1)
+            hold_times = self.reschedule(slots)
+            found = [
+                unschedulable_core(
+                    self.parameters,
+                    self.buffers,
+                    numpy.flatnonzero(slots == p),
+                )
+                for p in numpy.unique(slots[numpy.isnan(hold_times)])
+            ]
+            if not found:
+                self.z.set_initial_values(hold_times)
+                return status
+            cores.extend(found)
+            self._add_block(self.builder.slot_no_goods(found))
+        return pulp.LpStatusNotSolved
+
+    def reschedule(self, assignment):
+        """
+        Hold times for a given assignment of buffers to prep slots such
+        that no two prep procedures in a slot clash.
+
+        Each slot is scheduled separately and exactly, without a MIP
+        solver (see `decomposition.schedule_slot`), so this is cheap
+        enough to call many times, e.g. to check a candidate assignment.
+
+        Parameters
+        ----------
+        assignment: array_like of int
+            Prep slot of each buffer.
+
+        Returns
+        -------
+        numpy.ndarray
+            Hold time of each buffer; NaN for the buffers in slots that
+            cannot be scheduled.
+        """
+        assignment = numpy.asarray(assignment)
+        hold_times = numpy.full(self.N, numpy.nan)
+        for p in numpy.unique(assignment):
+            members = numpy.flatnonzero(assignment == p)
+            z = schedule_slot(self.parameters, self.buffers, members)
+            if z is not None:
+                hold_times[members] = z
+        return hold_times
+
+    def heuristic(self, do_solve=True):
+        """
+        Solve complete problem approximately, without a MIP solver.
+
+        A solution is found with `find_heuristic_solution`, subject to
+        the same rules as the complete problem. No model is built: the
+        solution is assigned to the decision variables (for the number
+        of slots it uses), so that it can be evaluated and plotted as
+        for the complete problem. Suited to problems too large for the
+        complete problem to be solved; optimality is not proven.
+
+        Parameters
+        ----------
+        do_solve: bool, optional
+            Included for consistency with other problem types; the
+            problem is always solved.
+
+        Returns
+        -------
+        int
+            pulp.LpStatusNotSolved if a solution was found (as it is not
+            proven optimal), otherwise pulp.LpStatusInfeasible.
+
+        """
+        # pylint: disable=W0613
+        solution = self.find_heuristic_solution()
+        if solution is None:
+            return pulp.LpStatusInfeasible
+        self._initialize(len(solution["vessels"]))
+        self.set_initial_solution()
+        self.problem.sol_status = pulp.LpSolutionIntegerFeasible
+        return pulp.LpStatusNotSolved
+
+    def fix_and_optimize(
+        self,
+        do_solve=True,
+        neighbourhood=2,
+        time_limit=60.0,
+        iteration_time_limit=10.0,
+        stall=10,
+        seed=0,
+    ):
+        """
+        Solve complete problem approximately by large neighbourhood
+        search.
+
+        The complete problem is built once (without symmetry breaking
+        constraints, which would restrict each neighbourhood) and
+        started from the heuristic solution (see `set_initial_solution`),
+        with one more slot than that solution uses. Each iteration then
+        fixes the slot assignments and vessels (`x` and `y`) of the
+        incumbent, except in a few randomly chosen slots and the empty
+        slot, and re-solves over the buffers in those slots, warm
+        started from the incumbent and under a time limit. Only variable
+        bounds change between iterations. After `stall` iterations
+        without improvement, one more slot is freed in each iteration.
+        The incumbent objective over time is recorded in `progress`.
+
+        Parameters
+        ----------
+        do_solve: bool, optional
+            Included for consistency with other problem types; the
+            problem is always solved.
+        neighbourhood: int, optional
+            Number of used slots freed in each iteration, initially.
+        time_limit: float, optional
+            Time (s) after which no further iterations are started.
+        iteration_time_limit: float, optional
+            Solver time limit (s) for each iteration.
+        stall: int, optional
+            Number of iterations without improvement after which the
+            neighbourhood grows.
+        seed: int, optional
+            Random seed for the choice of slots.
+
+        Returns
+        -------
+        int
+            pulp.LpStatusOptimal if an iteration freeing every slot
+            proved the incumbent optimal; pulp.LpStatusNotSolved if a
+            solution was otherwise found; pulp.LpStatusInfeasible if no
+            solution was found.
+
+        """
+        # pylint: disable=W0613,R0912,R0913,R0914,R0915
+        start = time.perf_counter()
+        slots = self.P
+        solution = self.find_heuristic_solution()
+        if solution is not None and len(solution["vessels"]) < self.P - 1:
+            self._initialize(len(solution["vessels"]) + 1)
+        symmetry_breaking, self.symmetry_breaking = self.symmetry_breaking, 0
+        self.complete(do_solve=False)
+        self.symmetry_breaking = symmetry_breaking
+        rng = numpy.random.default_rng(seed)
+        self.progress = []
+        incumbent = None
+        best = numpy.inf
+        if self.set_initial_solution():
+            incumbent = self._variable_values()
+            best = pulp.value(self.total_cost)
+            self.progress.append(
+                {
+                    "time": time.perf_counter() - start,
+                    "slots": [],
+                    "status": "Heuristic Solution",
+                    "objective": best,
+                }
+            )
+        status = pulp.LpStatusNotSolved
+        failures = 0
+        while True:
+            remaining = time_limit - (time.perf_counter() - start)
+            if remaining < 1:
+                break
+            solver = self.solver
+            if incumbent is None:
+                # no start: search the whole problem
+                freed = list(range(self.P))
+                everything = True
+            else:
+                used = numpy.flatnonzero(incumbent["y"].any(axis=0))
+                size = min(neighbourhood + failures // stall, len(used))
+                chosen = sorted(rng.choice(used, size, replace=False))
+                empty = numpy.setdiff1d(numpy.arange(self.P), used)
+                freed = [int(p) for p in chosen + list(empty[:1])]
+                everything = size == len(used)
+                free_x = numpy.zeros((self.N, self.P), dtype=bool)
+                members = incumbent["x"][:, chosen].any(axis=1)
+                free_x[numpy.ix_(members, freed)] = True
+                free_y = numpy.isin(numpy.arange(self.P), freed)[None, :]
+                for variable, free in ((self.x, free_x), (self.y, free_y)):
+                    fixed = incumbent[variable.name].astype(float)
+                    variable.set_bounds(
+                        numpy.where(free, 0, fixed),
+                        numpy.where(free, 1, fixed),
+                    )
+                for name, variable in self.variables.items():
+                    variable.set_initial_values(incumbent[name])
+                solver = warm_start_solver(solver)
+            self._run_solver(solver, min(iteration_time_limit, remaining))
+            found = self.problem.sol_status in (
+                pulp.LpSolutionOptimal,
+                pulp.LpSolutionIntegerFeasible,
+            )
+            if found and pulp.value(self.total_cost) < best - 1e-6:
+                best = pulp.value(self.total_cost)
+                incumbent = self._variable_values()
+                failures = 0
+                self.progress.append(
+                    {
+                        "time": time.perf_counter() - start,
+                        "slots": freed,
+                        "status": pulp.LpSolution[self.problem.sol_status],
+                        "objective": best,
+                    }
+                )
+            else:
+                failures += 1
+            if (
+                everything
+                and self.problem.sol_status == pulp.LpSolutionOptimal
+            ):
+                # the neighbourhood cannot grow; optimal if no slots left
+                if len(freed) == slots:
+                    status = pulp.LpStatusOptimal
+                break
+        self.x.set_bounds(0, 1)
+        self.y.set_bounds(0, 1)
+        if incumbent is None:
+            return pulp.LpStatusInfeasible
+        for name, variable in self.variables.items():
+            variable.set_initial_values(incumbent[name])
+        self.problem.sol_status = (
+            pulp.LpSolutionOptimal
+            if status == pulp.LpStatusOptimal
+            else pulp.LpSolutionIntegerFeasible
+        )
+        # no bound is known unless the incumbent is proven optimal
+        self.bound = best if status == pulp.LpStatusOptimal else numpy.nan
+        self.gap = 0.0 if status == pulp.LpStatusOptimal else numpy.nan
+        return status
+
+    def _variable_values(self):
+        """Current value of every decision variable, by name."""
+        values = {}
+        for name, variable in self.variables.items():
+            variable.evaluate()
+            values[name] = variable.values
+        return values
+
+    def _lexicographic(
+        self, objectives, absolute_tolerance, relative_tolerance, time_limits
+    ):
+        """
+        Solve the problem as built for each of a sequence of objectives
+        in turn, recording timings for each stage in `iterations`.
+
+        After each stage, its objective is bounded by its value in the
+        incumbent plus a tolerance (the greater of `absolute_tolerance`
+        and `relative_tolerance` times its magnitude), rather than fixed,
+        which can make later stages infeasible through rounding. The
+        incumbent remains feasible, so each stage is warm started from
+        the last (and the first from the heuristic solution, if
+        `warm_start` is set). A stage stopped by its time limit bounds
+        later stages by the best solution it found.
+
+        Parameters
+        ----------
+        objectives: list of tuple
+            (name, expression) of each objective, in order of priority.
+        absolute_tolerance, relative_tolerance: float
+        time_limits: float or list of float or None
+            Solver time limit (s) for every stage, or for each stage in
+            turn; None for `time_limit`.
+
+        Returns
+        -------
+        int
+            Problem status of the last stage solved (see pulp.LpStatus).
+        """
+        if time_limits is None or numpy.isscalar(time_limits):
+            time_limits = [time_limits] * len(objectives)
+        self.iterations = []
+        warm = self.warm_start and self.set_initial_solution()
+        status = pulp.LpStatusNotSolved
+        for stage, (name, objective) in enumerate(objectives):
+            start = time.perf_counter()
+            self.problem.setObjective(objective)
+            solver = warm_start_solver(self.solver) if warm else None
+            status = self._run_solver(solver, time_limits[stage])
+            solved = time.perf_counter()
+            self.iterations.append(
+                {
+                    "model": name,
+                    "slots": self.P,
+                    "min_used": self.min_slots if self.conflict_cuts else 0,
+                    "status": pulp.LpSolution[self.problem.sol_status],
+                    "objective": pulp.value(objective),
+                    "build_time": 0.0,
+                    "solve_time": solved - start,
+                }
+            )
+            if self.problem.sol_status not in (
+                pulp.LpSolutionOptimal,
+                pulp.LpSolutionIntegerFeasible,
+            ):
+                return status
+            value = pulp.value(objective)
+            tolerance = max(
+                absolute_tolerance, relative_tolerance * abs(value)
+            )
+            self.problem += (
+                objective <= value + tolerance,
+                "lexicographic_{}".format(stage),
+            )
+            warm = True
+        return status
+
+    def minimized_hold_time(
+        self,
+        do_solve=True,
+        absolute_tolerance=1e-4,
+        relative_tolerance=1e-6,
+        time_limits=None,
+    ):
         """
         Solve complete problem to first minimize vessel cost, then
         minimize hold times subject to the minimum cost.
 
+        Each stage is warm started from the last, and bounds its
+        objective for later stages within a tolerance (see
+        `_lexicographic`). Timings for each stage are recorded in
+        `iterations`.
+
+        Parameters
+        ----------
+        do_solve: bool, optional
+            Included for consistency with other problem types; the
+            problem is always solved.
+        absolute_tolerance, relative_tolerance: float, optional
+            Amount by which the cost may exceed its minimum when hold
+            times are minimized: the greater of the absolute tolerance
+            and the relative tolerance times the minimum cost.
+        time_limits: float or list of float or None, optional
+            Solver time limit (s) for each stage, or for every stage;
+            by default, `time_limit`.
+
         Returns
         -------
         int
-            If `do_solve` is set to True, returns problem status (see
-            pulp.LpStatus).
+            Problem status of the last stage (see pulp.LpStatus).
 
         """
+        # pylint: disable=W0613
         self.complete(do_solve=False)
-        objectives = [self.total_cost, self.total_hold_time]
-        absolute_tols = None  # might need to add these if failing
-        relative_tols = None  # might need to add these if failing
-        status = self.problem.sequentialSolve(
-            objectives, absolute_tols, relative_tols, self.solver
+        objectives = [
+            ("total_cost", self.total_cost),
+            ("total_hold_time", self.total_hold_time),
+        ]
+        return self._lexicographic(
+            objectives, absolute_tolerance, relative_tolerance, time_limits
         )
-        return status[-1]
 
-    def minimized_used_volume(self):
+    def minimized_used_volume(
+        self,
+        do_solve=True,
+        absolute_tolerance=1e-4,
+        relative_tolerance=1e-6,
+        time_limits=None,
+    ):
         """
         Solve complete problem to first minimize vessel cost, then
         minimize used preparation volume, subject to minimum cost,
         finally, minimize hold times, subject to minimal cost and
         minimal used preparation volume.
 
+        Each stage is warm started from the last, and bounds its
+        objective for later stages within a tolerance (see
+        `_lexicographic`). Timings for each stage are recorded in
+        `iterations`.
+
+        Parameters
+        ----------
+        do_solve: bool, optional
+            Included for consistency with other problem types; the
+            problem is always solved.
+        absolute_tolerance, relative_tolerance: float, optional
+            Amount by which each objective may exceed its minimum in
+            later stages: the greater of the absolute tolerance and the
+            relative tolerance times the minimum.
+        time_limits: float or list of float or None, optional
+            Solver time limit (s) for each stage, or for every stage;
+            by default, `time_limit`.
+
         Returns
         -------
         int
-            If `do_solve` is set to True, returns problem status (see
-            pulp.LpStatus).
+            Problem status of the last stage (see pulp.LpStatus).
 
         """
+        # pylint: disable=W0613
         self.complete(do_solve=False)
-        objectives = [self.total_cost, self.used_volume, self.total_hold_time]
-        absolute_tols = None  # might need to add these if failing
-        relative_tols = None  # might need to add these if failing
-        status = self.problem.sequentialSolve(
-            objectives, absolute_tols, relative_tols, self.solver
-        )
-        return status[-1]
-
-    def evaluate(self, problem_type):
-        """Generate some useful data from a solved problem."""
-        if self.problem.status != 1:
-            raise ValueError("No optimum solution found.")
-        for variable in self.variables:
-            variable.evaluate()
+        objectives = [
+            ("total_cost", self.total_cost),
+            ("used_volume", self.used_volume),
+            ("total_hold_time", self.total_hold_time),
+        ]
+        return self._lexicographic(
+            objectives, absolute_tolerance, relative_tolerance, time_limits
+        )
+
+    def evaluate(self, problem_type, variables=None):
+        """
+        Generate some useful data from a solved problem.
+
+        The solution need not be proven optimal: the best solution found
+        within a time or gap limit is evaluated all the same.
+
+        Parameters
+        ----------
+        problem_type:
+            Type of problem that was solved.
+        variables: iterable of str or None, optional
+            Names of the decision variables to read back from the
+            solver. Defaults to `evaluated_variables`; pass
+            `self.variables` to evaluate every variable.
+
+        """
+        if self.problem.sol_status not in (
+            pulp.LpSolutionOptimal,
+            pulp.LpSolutionIntegerFeasible,
+        ):
+            raise ValueError("No solution found.")
+        if variables is None:
+            variables = self.evaluated_variables
+        for name in variables:
+            self.variables[name].evaluate()
         # TODO: If these are just needed for e.g. plotting, might not bother
         # calculating all of them here???
         # TODO: Optimize 4 lines below - can this be done more easily?
@@ -576,6 +1533,83 @@ class BufferPrepProblem:
                 self.N, self.parameters.transfer_duration
             )
 
+    def validate(self):
+        """
+        Check the evaluated solution against the rules of the complete
+        problem, independently of the model (see
+        `validation.validate`). Scheduling rules are not checked for the
+        basic problem.
+
+        Returns
+        -------
+        dict
+            Violations of each rule; 'valid' is True if there are none.
+        """
+        return validate(
+            self.parameters,
+            self.buffers,
+            self.vessels,
+            self.prep_slots,
+            self.prep_vessels,
+            self.prep_start_times,
+            self.hold_total_durations,
+        )
+
+    def robustness(
+        self,
+        samples=1000,
+        start_sd=0.5,
+        duration_sd=0.0,
+        reschedule=False,
+        seed=0,
+        processes=None,
+    ):
+        """
+        Monte Carlo analysis of the robustness of the evaluated design
+        to drift in buffer use start times and durations (see
+        `robustness.robustness`).
+
+        Parameters
+        ----------
+        samples: int, optional
+        start_sd, duration_sd: float, optional
+            Standard deviation of the drift in use start times and in
+            use durations.
+        reschedule: bool, optional
+            Re-time each slot for each sample, rather than keeping the
+            prep schedule.
+        seed: int, optional
+            Random seed.
+        processes: int or None, optional
+            Number of worker processes when re-timing.
+
+        Returns
+        -------
+        dict
+            See `robustness.robustness`.
+
+        Raises
+        ------
+        ValueError
+            If there is no evaluated schedule (e.g. for the basic
+            problem).
+        """
+        # pylint: disable=R0913
+        if self.prep_start_times is None:
+            raise ValueError("No evaluated schedule to analyse.")
+        return robustness(
+            self.parameters,
+            self.buffers,
+            self.prep_slots,
+            self.prep_start_times,
+            samples,
+            start_sd,
+            duration_sd,
+            reschedule,
+            seed,
+            processes,
+        )
+
     def write(self, filename="untilperfect.lp"):
         """Write problem to file in .LP format.
 
@@ -617,6 +1651,10 @@ def solve(
     plot=True,
     write=True,
     cli=False,
+    robustness_options=None,
+    timings_file=None,
+    profile_file=None,
+    **options,
 ):
     """
     Solve BufferPrepProblem.
@@ -641,6 +1679,22 @@ def solve(
     cli : bool, optional
         Set to True to return problem status, returns problem object
         otherwise.
+    robustness_options : dict or None, optional
+        If given, analyse the robustness of the solution, passing these
+        keyword arguments to BufferPrepProblem.robustness, e.g.
+        `samples`.
+    timings_file : str or None, optional
+        If given, write the wall time, CPU time and peak memory of each
+        phase of the solve, and of each constraint builder, to this file
+        as JSON (see `profiling.PhaseTimer`). Memory is traced with
+        tracemalloc, which slows building down.
+    profile_file : str or None, optional
+        If given, profile the build phase (everything up to evaluation,
+        less time spent in the solver) with cProfile and write the
+        statistics to this file (see pstats).
+    **options
+        Further keyword arguments are passed to BufferPrepProblem, e.g.
+        `symmetry_breaking`.
 
     Returns
     -------
@@ -649,27 +1703,117 @@ def solve(
         `cli=False`, returns pulp.LpProblem instance.
 
     """
-    parameters = Parameters(parameters_file)
-    buffers = Buffers(buffers_file)
-    vessels = Vessels(vessels_file)
-    problem = BufferPrepProblem(parameters, buffers, vessels, solver)
-    status = problem_type(problem)
-    problem.evaluate(problem_type)
+    timer = PhaseTimer()
+    trace_memory = timings_file and not tracemalloc.is_tracing()
+    if trace_memory:
+        tracemalloc.start()
+    with timer.phase("load"):
+        parameters = Parameters(parameters_file)
+        buffers = Buffers(buffers_file)
+        vessels = Vessels(vessels_file)
+    if profile_file:
+        timer.profiler = cProfile.Profile()
+        timer.unprofiled.add("solver")
+    with timer.phase("setup"):
+        problem = BufferPrepProblem(
+            parameters, buffers, vessels, solver, timer=timer, **options
+        )
+    with timer.phase("model"):
+        status = problem_type(problem)
+    if profile_file:
+        timer.profiler.dump_stats(profile_file)
+        timer.profiler = None
+    with timer.phase("evaluate"):
+        problem.evaluate(problem_type)
     if plot and problem_type is not BufferPrepProblem.basic:
-        problem.plot()
-    if write:
-        problem.write()
+        with timer.phase("plot"):
+            problem.plot()
+    if write and problem_type is not BufferPrepProblem.heuristic:
+        with timer.phase("write"):
+            problem.write()
     counts = dict(enumerate(problem.y.values.sum(axis=1)))
     print("\nPreparation Vessels Required:")
     for index, count in counts.items():
         if count > 0:
             print("{}x\t{}".format(int(count), problem.vessels.names[index]))
+    if problem.presolve_report:
+        report = problem.presolve_report
+        print("\nPresolve:")
+        print("Vessels kept: {}/{}".format(*report["vessels"][::-1]))
+        for name in report["unusable"]:
+            print("{}\tremoved, cannot prepare any buffer".format(name))
+        for name, other in report["dominated"].items():
+            print("{}\tremoved, dominated by {}".format(name, other))
+        print(
+            "Incompatible vessel/buffer pairs: {}".format(
+                report["incompatible"]
+            )
+        )
+    if problem.slot_selection:
+        print("\nPrep Slots:")
+        print(
+            "{slots} slots allowed ({reason})".format(**problem.slot_selection)
+        )
+    if problem.progress:
+        print("\nProgress:")
+        for step in problem.progress:
+            print(
+                "{time:.2f} s\tslots {slots}\t{status}"
+                "\tobjective: {objective}".format(**step)
+            )
+    if problem.iterations:
+        print("\nModels Solved:")
+        for iteration in problem.iterations:
+            print(
+                "{model}\t{slots} slots ({min_used} used)\t{status}"
+                "\tobjective: {objective}"
+                "\tbuild: {build_time:.2f} s\tsolve: {solve_time:.2f} s".format(
+                    **iteration
+                )
+            )
+    with timer.phase("validate"):
+        violations = problem.validate()
+    print("\nValidation:")
+    if violations["valid"]:
+        print("All rules satisfied")
+    for rule, violated in violations.items():
+        if rule == "clashes" and violated.any():
+            print("clashes\t{} pair(s) of buffers".format(violated.sum() // 2))
+        elif rule != "valid" and violated.any():
+            print("{}\t{} violation(s)".format(rule, violated.sum()))
+    if robustness_options is not None:
+        with timer.phase("robustness"):
+            analysis = problem.robustness(**robustness_options)
+        print("\nRobustness ({} samples):".format(len(analysis["feasible"])))
+        print("Feasible: {:.1%}".format(analysis["probability"]))
+        print("slot\tvessel\tfeasible\tslack mean\tslack 5%\tslack min")
+        for i, p in enumerate(analysis["slots"]):
+            slack = analysis["slack"][:, i]
+            vessel = problem.prep_vessels[problem.prep_slots == p][0]
+            print(
+                "{}\t{}\t{:.1%}\t{:.2f}\t{:.2f}\t{:.2f}".format(
+                    p,
+                    problem.vessels.names[vessel],
+                    analysis["slot_probability"][i],
+                    numpy.nanmean(slack),
+                    numpy.nanpercentile(slack, 5),
+                    numpy.nanmin(slack),
+                )
+            )
+    print("\nSolution: {}".format(pulp.LpSolution[problem.problem.sol_status]))
+    if not numpy.isnan(problem.bound):
+        print("Best bound on objective: {}".format(problem.bound))
+        print("Gap: {:.2%}".format(problem.gap))
     print("\nTotal cost: {}".format(pulp.value(problem.total_cost)))
     if problem_type is not BufferPrepProblem.basic:
         print(
             "Total hold time: {}".format(pulp.value(problem.total_hold_time))
         )
     print("Total used volume: {}\n".format(pulp.value(problem.used_volume)))
+    if timings_file:
+        if trace_memory:
+            tracemalloc.stop()
+        timer.write(timings_file)
     if cli:
         return status
     else:
@@ -152,9 +152,9 @@ def single_cycle_plot(problem, filename=None):
     ax.set_xlabel("time (h)")
     ax.set_ylabel("Vessels")
     ax.set_yticks(
-        [n + 2 for n in range(N)]  ###
-        + [i + 2 for i in range(N + 1, N + nslots + 2)]
-    )  ###
+        [n + 2 for n in range(N)]
+        + [i + 2 for i in range(N + 1, N + nslots + 1)]
+    )
     ax.set_xticks([8 * t for t in range(int(ct / 8) + 1)])
     prep_labels = []
     for i in sorted_prep_names:
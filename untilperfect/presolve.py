@@ -0,0 +1,361 @@
+"""
+presolve.py
+
+This module contains functions to reduce the size of a buffer
+preparation vessel assignment problem before it is built, by removing
+prep vessels that cannot feature in an optimal solution.
+"""
+
+import numpy
+
+
+def compatibility(buffers, vessels, minimum_fill_ratio=0.0):
+    """
+    Which vessels can prepare which buffers.
+
+    A vessel can prepare a buffer if it is large enough to hold it and
+    if the buffer fills at least `minimum_fill_ratio` of it.
+
+    Parameters
+    ----------
+    buffers: untilperfect.Buffers
+    vessels: untilperfect.Vessels
+    minimum_fill_ratio: float, optional
+
+    Returns
+    -------
+    numpy.ndarray
+        Boolean array of shape (M, N); element [m, n] is True if vessel
+        m can prepare buffer n.
+    """
+    bv = numpy.asarray(buffers.volumes, dtype=float)
+    vv = numpy.asarray(vessels.volumes, dtype=float)
+    return (vv[:, None] >= bv[None, :]) & (
+        minimum_fill_ratio * vv[:, None] <= bv[None, :]
+    )
+
+
+def dominating_vessels(vessels, compatible):
+    """
+    Find the vessels dominated by another vessel.
+
+    Vessel i dominates vessel m if it can prepare every buffer that m
+    can, and it is either cheaper than m or costs the same and is no
+    larger. Replacing m with i in any solution then neither increases
+    cost nor used volume, nor the number of vessel types. Of identical
+    vessels, the first listed is kept.
+
+    Parameters
+    ----------
+    vessels: untilperfect.Vessels
+    compatible: numpy.ndarray
+        See `compatibility`.
+
+    Returns
+    -------
+    numpy.ndarray
+        Index of a dominating vessel for each vessel, or -1 where a
+        vessel is not dominated.
+    """
+    costs = numpy.asarray(vessels.costs, dtype=float)
+    vv = numpy.asarray(vessels.volumes, dtype=float)
+    # covers[i, m]: vessel i can prepare every buffer that m can
+    covers = ~(compatible[None, :, :] & ~compatible[:, None, :]).any(axis=2)
+    cheaper = costs[:, None] < costs[None, :]
+    same_cost = costs[:, None] == costs[None, :]
+    smaller = vv[:, None] < vv[None, :]
+    same_volume = vv[:, None] == vv[None, :]
+    identical = covers & covers.T & same_cost & same_volume
+    dominates = covers & (
+        cheaper
+        | (same_cost & smaller)
+        | (same_cost & same_volume & ~identical)
+    )
+    # of identical vessels, the lowest index dominates the rest
+    dominates |= identical & numpy.tri(len(costs), k=-1, dtype=bool).T
+    numpy.fill_diagonal(dominates, False)
+    return numpy.where(dominates.any(axis=0), dominates.argmax(axis=0), -1)
+
+
+def presolve_vessels(parameters, buffers, vessels):
+    """
+    Remove prep vessels that cannot feature in an optimal solution.
+
+    Vessels that cannot prepare any buffer are removed, as are vessels
+    dominated by another vessel (see `dominating_vessels`). If any
+    buffer cannot be prepared in any vessel, the problem is infeasible:
+    no vessel is removed, and the buffers are listed in the report so
+    that the infeasibility can be reported by the solver status.
+
+    Parameters
+    ----------
+    parameters: untilperfect.Parameters
+    buffers: untilperfect.Buffers
+    vessels: untilperfect.Vessels
+
+    Returns
+    -------
+    tuple
+        (Vessels, compatibility, report) where Vessels holds the
+        remaining vessels, compatibility is as returned by
+        `compatibility` for the remaining vessels and report is a dict
+        describing what was removed, and which buffers no vessel can
+        prepare ('unprepared').
+    """
+    compatible = compatibility(buffers, vessels, parameters.minimum_fill_ratio)
+    unprepared = ~compatible.any(axis=0)
+    if unprepared.any():
+        unusable = numpy.zeros(vessels.count, dtype=bool)
+        dominating = numpy.full(vessels.count, -1)
+    else:
+        unusable = ~compatible.any(axis=1)
+        dominating = dominating_vessels(vessels, compatible)
+    dominating[unusable] = -1
+    keep = ~unusable & (dominating < 0)
+    # a dominating vessel may itself be dominated; report the survivor
+    for m in numpy.flatnonzero(dominating >= 0):
+        while not keep[dominating[m]]:
+            dominating[m] = dominating[dominating[m]]
+    kept = numpy.flatnonzero(keep)
+    remaining = type(vessels)(
+        {
+            "names": [vessels.names[m] for m in kept],
+            "volumes": [vessels.volumes[m] for m in kept],
+            "costs": [vessels.costs[m] for m in kept],
+        }
+    )
+    report = {
+        "unusable": [vessels.names[m] for m in numpy.flatnonzero(unusable)],
+        "dominated": {
+            vessels.names[m]: vessels.names[dominating[m]]
+            for m in numpy.flatnonzero(dominating >= 0)
+        },
+        "vessels": (vessels.count, remaining.count),
+        "incompatible": int((~compatible[kept]).sum()),
+        "unprepared": [
+            buffers.names[n] for n in numpy.flatnonzero(unprepared)
+        ],
+    }
+    return remaining, compatible[kept], report
+
+
+def hold_time_bounds(parameters, buffers):
+    """
+    Bounds on the hold time of each buffer.
+
+    Hold times are bounded by `hold_duration_min` and
+    `hold_duration_max`, and by the time left in the cycle once the
+    other hold procedures are accounted for.
+
+    Parameters
+    ----------
+    parameters: untilperfect.Parameters
+    buffers: untilperfect.Buffers
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        (lower, upper) bound for each buffer.
+    """
+    pa = parameters
+    limit = (
+        pa.cycle_time
+        - pa.hold_pre_duration
+        - pa.transfer_duration
+        - pa.hold_post_duration
+        - numpy.asarray(buffers.use_durations, dtype=float)
+    )
+    lower = numpy.full(buffers.count, pa.hold_duration_min)
+    return lower, numpy.minimum(pa.hold_duration_max, limit)
+
+
+def transfer_time_bounds(parameters, buffers):
+    """
+    Bounds on the time within the cycle at which each buffer transfer
+    ends, i.e. on h = t_use - z + cycle_time * q, which lies within
+    [0, cycle_time].
+
+    Where the range of t_use - z allowed by the hold time bounds spans a
+    cycle boundary, h may lie either side of it, so its bounds are
+    [0, cycle_time] and q is undecided.
+
+    Parameters
+    ----------
+    parameters: untilperfect.Parameters
+    buffers: untilperfect.Buffers
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        (lower, upper, q) for each buffer, where q is the value of the
+        q decision variable, or -1 where undecided.
+    """
+    ct = parameters.cycle_time
+    t_use = numpy.asarray(buffers.relative_use_start_times, dtype=float)
+    z_min, z_max = hold_time_bounds(parameters, buffers)
+    earliest, latest = t_use - z_max, t_use - z_min
+    q = numpy.where(earliest > 0, 0, numpy.where(latest < 0, 1, -1))
+    lower = numpy.where(q < 0, 0.0, earliest + ct * q)
+    upper = numpy.where(q < 0, ct, latest + ct * q)
+    return lower, upper, q
+
+
+def clash_big_m(parameters, lower, upper, n, k):
+    """
+    Smallest valid big-M for each of the four no-clash constraints
+    between buffers n and k (see `MatrixBuilder.prep_scheduling`).
+
+    Each constraint bounds h[k] - h[n] (plus a multiple of r[n] or s[n])
+    when active. Its big-M need only be large enough to relax it over
+    the range of transfer end times h allowed by their bounds, allowing
+    for r[n] = 0 only where h[n] <= cycle_time - T and s[n] = 0 only
+    where h[n] >= T, for T = prep_total_duration.
+
+    Parameters
+    ----------
+    parameters: untilperfect.Parameters
+    lower, upper: numpy.ndarray
+        Transfer end time bounds; see `transfer_time_bounds`.
+    n, k: numpy.ndarray
+        Indices of the buffers in each pair.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (4, pairs).
+    """
+    ct = parameters.cycle_time
+    t_prep = parameters.prep_total_duration
+    # largest h[n] - cycle_time * r[n] and smallest h[n] + ct * s[n]
+    shifted_upper = numpy.where(
+        lower <= ct - t_prep, numpy.minimum(upper, ct - t_prep), upper - ct
+    )
+    shifted_lower = numpy.where(
+        upper >= t_prep, numpy.maximum(lower, t_prep), lower + ct
+    )
+    big_m = numpy.array(
+        [
+            t_prep - lower[k] + upper[n],
+            upper[k] - lower[n] + t_prep,
+            t_prep - lower[k] + shifted_upper[n],
+            upper[k] - shifted_lower[n] + t_prep,
+        ]
+    )
+    return numpy.maximum(big_m, 0)
+
+
+def wrap_indicators(parameters, buffers):
+    """
+    Values of the wrap indicator decision variables q, r, s and u of
+    each buffer (see `MatrixBuilder.prep_scheduling`) that are decided
+    by the bounds on its transfer end time h.
+
+    s[n] = 1 if h[n] < T, r[n] = 1 if h[n] > cycle_time - T and u[n] =
+    r[n] or s[n], for T = prep_total_duration. Indicators are only
+    decided where the bounds on h lie strictly to one side of these
+    thresholds.
+
+    Parameters
+    ----------
+    parameters: untilperfect.Parameters
+    buffers: untilperfect.Buffers
+
+    Returns
+    -------
+    dict
+        Array for each of 'q', 'r', 's' and 'u' of the value of each
+        indicator, or -1 where undecided.
+    """
+    ct = parameters.cycle_time
+    t_prep = parameters.prep_total_duration
+    lower, upper, q = transfer_time_bounds(parameters, buffers)
+    r = numpy.where(
+        lower > ct - t_prep, 1, numpy.where(upper < ct - t_prep, 0, -1)
+    )
+    s = numpy.where(upper < t_prep, 1, numpy.where(lower > t_prep, 0, -1))
+    u = numpy.where(
+        (r == 1) | (s == 1), 1, numpy.where((r == 0) & (s == 0), 0, -1)
+    )
+    return {"q": q, "r": r, "s": s, "u": u}
+
+
+def conflict_graph(parameters, buffers, compatible=None):
+    """
+    Which pairs of buffers can never be prepared in the same slot.
+
+    Two buffers conflict if their prep procedures overlap for every
+    pair of hold times allowed by their bounds; i.e. if their transfer
+    end times can never be at least T = prep_total_duration apart
+    (around the cycle). Where a slot cannot hold two prep procedures,
+    every pair conflicts. Optionally, buffers that no vessel can
+    prepare both of also conflict.
+
+    Parameters
+    ----------
+    parameters: untilperfect.Parameters
+    buffers: untilperfect.Buffers
+    compatible: numpy.ndarray or None, optional
+        Vessel compatibility matrix; see `compatibility`.
+
+    Returns
+    -------
+    numpy.ndarray
+        Symmetric boolean array of shape (N, N).
+    """
+    ct = parameters.cycle_time
+    t_prep = parameters.prep_total_duration
+    t_use = numpy.asarray(buffers.relative_use_start_times, dtype=float)
+    z_min, z_max = hold_time_bounds(parameters, buffers)
+    earliest, width = t_use - z_max, z_max - z_min
+    # h[k] - h[n] ranges over an arc starting at `start` (mod ct)
+    start = (earliest[None, :] - earliest[:, None] - width[:, None]) % ct
+    end = start + width[:, None] + width[None, :]
+    if ct * parameters.maximum_prep_utilization < 2 * t_prep:
+        conflicts = numpy.ones((buffers.count, buffers.count), dtype=bool)
+    else:
+        conflicts = ~(
+            ((start <= ct - t_prep) & (end >= t_prep)) | (end >= ct + t_prep)
+        )
+    if compatible is not None:
+        shared = compatible.astype(int)
+        conflicts |= (shared.T @ shared) == 0
+    numpy.fill_diagonal(conflicts, False)
+    return conflicts
+
+
+def clique_cover(conflicts):
+    """
+    Greedily cover the edges of a conflict graph with cliques.
+
+    Starting from the uncovered edge whose endpoints have the most
+    uncovered edges, each clique is grown by adding the buffer that
+    conflicts with every member and covers most uncovered edges.
+
+    Parameters
+    ----------
+    conflicts: numpy.ndarray
+        See `conflict_graph`.
+
+    Returns
+    -------
+    list of numpy.ndarray
+        Buffer indices of each clique, largest first.
+    """
+    uncovered = conflicts.copy()
+    cliques = []
+    while uncovered.any():
+        degree = uncovered.sum(axis=1)
+        n = degree.argmax()
+        k = numpy.flatnonzero(uncovered[n])[degree[uncovered[n]].argmax()]
+        members = [n, k]
+        candidates = conflicts[n] & conflicts[k]
+        while candidates.any():
+            gain = uncovered[:, members].sum(axis=1) * len(conflicts)
+            score = numpy.where(candidates, gain + degree, -1)
+            member = score.argmax()
+            members.append(member)
+            candidates &= conflicts[member]
+        members = numpy.array(sorted(members))
+        uncovered[numpy.ix_(members, members)] = False
+        cliques.append(members)
+    return sorted(cliques, key=len, reverse=True)
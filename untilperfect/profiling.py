@@ -0,0 +1,167 @@
+"""
+profiling.py
+
+This module contains tools to record where the time (and memory) goes
+when a buffer preparation vessel assignment problem is built and
+solved.
+"""
+
+import functools
+import json
+import time
+import tracemalloc
+
+
+class PhaseTimer:
+    """
+    Records the wall time, CPU time and peak memory of named phases.
+
+    Phases may be nested, and a phase entered more than once accumulates
+    its times over every call. Peak memory is the most memory traced by
+    tracemalloc at any point during a phase, and is only recorded if
+    tracemalloc is tracing (which slows Python code down).
+
+    Attributes
+    ----------
+    groups: dict
+        Statistics of each phase, by group and phase name: 'calls',
+        'wall' (s), 'cpu' (s) and 'peak_memory' (bytes, or None).
+    profiler: cProfile.Profile or None
+        If set, enabled in every phase except those in `unprofiled`
+        (and disabled otherwise) while phases run.
+    unprofiled: set of str
+        Names of phases not to profile.
+    active: list
+        Phases running, outermost first.
+    """
+
+    def __init__(self):
+        self.groups = {}
+        self.profiler = None
+        self.unprofiled = set()
+        self.active = []
+
+    def phase(self, name, group="phases"):
+        """
+        Context manager timing a phase.
+
+        Parameters
+        ----------
+        name: str
+        group: str, optional
+            Group in which the phase is reported.
+        """
+        return _Phase(self, name, group)
+
+    def report(self):
+        """
+        Statistics of each phase, by group (see `groups`), along with
+        the time spent in solvers and the remaining build time.
+
+        Returns
+        -------
+        dict
+        """
+        report = {group: dict(phases) for group, phases in self.groups.items()}
+        phases = self.groups.get("phases", {})
+        solver = phases.get("solver", {}).get("wall", 0.0)
+        report["summary"] = {
+            "build": sum(
+                phases[name]["wall"]
+                for name in ("setup", "model")
+                if name in phases
+            )
+            - solver,
+            "solve": solver,
+        }
+        return report
+
+    def write(self, filename):
+        """
+        Write the report (see `report`) to a JSON file.
+
+        Parameters
+        ----------
+        filename: str
+        """
+        with open(filename, "w", encoding="utf-8") as file:
+            json.dump(self.report(), file, indent=2)
+
+
+class _Phase:
+    """A phase of a PhaseTimer, timed on entry and exit."""
+
+    def __init__(self, timer, name, group):
+        self.timer = timer
+        self.name = name
+        self.group = group
+        self.peak = None
+        self._start = None
+
+    def __enter__(self):
+        timer = self.timer
+        if tracemalloc.is_tracing():
+            # pass the peak so far on to enclosing phases, then restart
+            peak = tracemalloc.get_traced_memory()[1]
+            for phase in timer.active:
+                phase.peak = max(phase.peak or 0, peak)
+            tracemalloc.reset_peak()
+        if timer.profiler is not None:
+            if self.name in timer.unprofiled:
+                timer.profiler.disable()
+            else:
+                timer.profiler.enable()
+        timer.active.append(self)
+        self._start = (time.perf_counter(), time.process_time())
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.perf_counter() - self._start[0]
+        cpu = time.process_time() - self._start[1]
+        timer = self.timer
+        timer.active.pop()
+        if tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1]
+            for phase in timer.active + [self]:
+                phase.peak = max(phase.peak or 0, peak)
+        if timer.profiler is not None:
+            # resume the enclosing phase's profiling state
+            outer = timer.active[-1].name if timer.active else None
+            if outer is None or outer in timer.unprofiled:
+                timer.profiler.disable()
+            else:
+                timer.profiler.enable()
+        stats = timer.groups.setdefault(self.group, {}).setdefault(
+            self.name,
+            {"calls": 0, "wall": 0.0, "cpu": 0.0, "peak_memory": None},
+        )
+        stats["calls"] += 1
+        stats["wall"] += wall
+        stats["cpu"] += cpu
+        if self.peak is not None:
+            stats["peak_memory"] = max(stats["peak_memory"] or 0, self.peak)
+        return False
+
+
+def timed(group="phases", name=None):
+    """
+    Decorator timing each call of a method as a phase of its object's
+    `timer` (a PhaseTimer).
+
+    Parameters
+    ----------
+    group: str, optional
+        Group in which the phase is reported.
+    name: str or None, optional
+        Name of the phase; by default, the name of the method.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.timer.phase(name or method.__name__, group):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
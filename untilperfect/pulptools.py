@@ -2,34 +2,115 @@
 pulptools.py
 
 This module contains a class to handle multidimensional variables
-in pulp.
+in pulp, along with helpers for pulp solvers and an in-process solver.
 """
 
+import copy
+import os
+import re
+import signal
+import tempfile
+import threading
+import time
+
+try:
+    import pty
+except ImportError:  # not available on Windows
+    pty = None
+
 import numpy
 import pulp
 
 
 class LpVariableArray:
-    """Multidimensional decision variable array."""
+    """
+    Multidimensional decision variable array.
+
+    By default, a variable is created for every element of the array.
+    If `index` is given, the array is sparse: only the elements selected
+    by `index` exist, and each variable is only created when it is first
+    accessed.
+
+    Parameters
+    ----------
+    name: str
+    dimensions: int or tuple of int
+    low_bound: float or None, optional
+    up_bound: float or None, optional
+    cat: str or None, optional
+    e: optional
+    index: callable or iterable or None, optional
+        Either a predicate, called (as with numpy.fromfunction) with one
+        array of indices per dimension and returning a boolean array,
+        e.g. ``lambda n, k: n < k``; or an explicit collection of index
+        tuples.
+    """
 
     def __init__(
-        self, name, dimensions, low_bound=None, up_bound=None, cat=None, e=None
+        self,
+        name,
+        dimensions,
+        low_bound=None,
+        up_bound=None,
+        cat=None,
+        e=None,
+        index=None,
     ):
         self.name = name
         try:
             iter(dimensions)
-            self.dimensions = dimensions
+            self.dimensions = tuple(dimensions)
         except TypeError:
             self.dimensions = (dimensions,)
         self.low_bound = low_bound
         self.up_bound = up_bound
         self.cat = cat
         self.e = e
-        self.variables = self._build_variables_array()
+        self.sparse = index is not None
+        if self.sparse:
+            self.mask = self._build_mask(index)
+            self._positions = numpy.flatnonzero(self.mask)
+            self._ranks = numpy.cumsum(self.mask.ravel()) - 1
+            self.variables = {}
+            self.size = self._positions.size
+        else:
+            self.mask = None
+            self.variables = self._build_variables_array()
+            self.size = self.variables.size
         self.values = None
 
     def __getitem__(self, index):
-        return self.variables[index]
+        if not self.sparse:
+            return self.variables[index]
+        if not isinstance(index, tuple):
+            index = (index,)
+        index = tuple(int(i) for i in index)
+        try:
+            return self.variables[index]
+        except KeyError:
+            if not self.mask[index]:
+                raise IndexError(
+                    "{} has no element {}".format(self.name, index)
+                ) from None
+            variable = self._define_variable(*index)
+            self.variables[index] = variable
+            return variable
+
+    @property
+    def created(self):
+        """Number of pulp variables instantiated so far."""
+        return len(self.variables) if self.sparse else self.size
+
+    def _build_mask(self, index):
+        """Builds a boolean array flagging the elements that exist."""
+        if callable(index):
+            mask = numpy.fromfunction(index, self.dimensions, dtype="int")
+            return numpy.broadcast_to(mask, self.dimensions).astype(bool)
+        mask = numpy.zeros(self.dimensions, dtype=bool)
+        indices = [i if isinstance(i, tuple) else (i,) for i in index]
+        if indices:
+            mask[tuple(zip(*indices))] = True
+        return mask
 
     def _define_variable(self, *index):
         """Defines an individual decision variable."""
@@ -43,8 +124,604 @@ class LpVariableArray:
         vfunc = numpy.vectorize(self._define_variable)
         return numpy.fromfunction(vfunc, self.dimensions, dtype="int")
 
+    def ordinals(self, *index):
+        """
+        Position of each indexed variable in the flattened array.
+
+        In sparse mode, only existing elements are counted, so ordinals
+        run over the range [0, size) in row-major order.
+
+        Parameters
+        ----------
+        *index: int or array_like of int
+            One index (or array of indices) per dimension; arrays are
+            broadcast against each other.
+
+        Returns
+        -------
+        numpy.ndarray
+            Integer ordinals in the range [0, size).
+        """
+        flat = numpy.ravel_multi_index(
+            numpy.broadcast_arrays(*index), self.dimensions
+        )
+        if not self.sparse:
+            return flat
+        if not self.mask.ravel()[flat].all():
+            raise IndexError("{} has no such element".format(self.name))
+        return self._ranks[flat]
+
+    def by_ordinals(self, ordinals):
+        """Returns an object array of the variables at given ordinals."""
+        if not self.sparse:
+            return self.variables.ravel()[ordinals]
+        indices = numpy.unravel_index(
+            self._positions[ordinals], self.dimensions
+        )
+        result = numpy.empty(len(ordinals), dtype=object)
+        result[:] = [self[index] for index in zip(*indices)]
+        return result
+
+    def set_bounds(self, low_bound=None, up_bound=None):
+        """
+        Change the bounds of individual variables.
+
+        Parameters
+        ----------
+        low_bound, up_bound: array_like or None, optional
+            New bounds, broadcast to `dimensions`; elements that are NaN
+            leave the corresponding bound unchanged. In sparse mode,
+            only variables that exist are changed (and created).
+        """
+        low = numpy.full(self.dimensions, numpy.nan)
+        up = numpy.full(self.dimensions, numpy.nan)
+        if low_bound is not None:
+            low[...] = low_bound
+        if up_bound is not None:
+            up[...] = up_bound
+        changed = ~(numpy.isnan(low) & numpy.isnan(up))
+        if self.sparse:
+            changed &= self.mask
+        for index in zip(*numpy.nonzero(changed)):
+            variable = self[index]
+            if not numpy.isnan(low[index]):
+                variable.lowBound = float(low[index])
+            if not numpy.isnan(up[index]):
+                variable.upBound = float(up[index])
+
+    def set_initial_values(self, values):
+        """
+        Set the initial value of each variable, e.g. for a warm start.
+
+        Values are clipped to the bounds of each variable, and rounded
+        for integer variables, so that values computed in floating point
+        (which may stray from a bound by a rounding error) are accepted
+        by pulp.
+
+        Parameters
+        ----------
+        values: numpy.ndarray
+            Array of shape `dimensions`. In sparse mode, only variables
+            that have been created are set.
+        """
+        values = numpy.asarray(values, dtype=float)
+        if self.sparse:
+            variables = list(self.variables.values())
+            values = numpy.array(
+                [values[index] for index in self.variables], dtype=float
+            )
+        else:
+            variables = self.variables.ravel().tolist()
+            values = values.ravel()
+        # a bound of None is unbounded
+        low = [
+            -numpy.inf if v.lowBound is None else v.lowBound for v in variables
+        ]
+        up = [numpy.inf if v.upBound is None else v.upBound for v in variables]
+        values = numpy.clip(values, low, up)
+        if self.cat in (pulp.LpBinary, pulp.LpInteger):
+            values = numpy.round(values)
+        for variable, value in zip(variables, values.tolist()):
+            variable.setInitialValue(value)
+
     def evaluate(self):
-        """Evaluates decision variable values."""
-        # pylint: disable=W0108
-        vfunc = numpy.vectorize(lambda i: pulp.value(i))
-        self.values = vfunc(self.variables)
+        """
+        Evaluates decision variable values.
+
+        All values are read in a single pass into a typed array: bool
+        for binary variables and float64 otherwise, with NaN (or False)
+        where a variable has no value. In sparse mode, elements that do
+        not exist (or were never used) evaluate to zero.
+        """
+        if self.sparse:
+            values = numpy.zeros(self.dimensions)
+            if self.variables:
+                indices = tuple(numpy.array(list(self.variables)).T)
+                values[indices] = numpy.array(
+                    [v.varValue for v in self.variables.values()],
+                    dtype=float,
+                )
+        else:
+            values = numpy.array(
+                [v.varValue for v in self.variables.ravel()], dtype=float
+            ).reshape(self.dimensions)
+        if self.cat == pulp.LpBinary:
+            values = values > 0.5
+        self.values = values
+
+
+def warm_start_solver(solver):
+    """
+    Copy of a pulp solver with warm starting enabled, so that the
+    initial values of variables are passed to the solver.
+
+    Parameters
+    ----------
+    solver: pulp.LpSolver or None
+        If None, pulp's default solver is used.
+
+    Returns
+    -------
+    pulp.LpSolver
+        A warm starting copy of `solver`; or `solver` itself if it has
+        no warm start option.
+    """
+    solver = solver or pulp.LpSolverDefault
+    if not hasattr(solver, "optionsDict"):
+        return solver
+    solver = copy.copy(solver)
+    solver.optionsDict = dict(solver.optionsDict, warmStart=True)
+    return solver
+
+
+def limited_solver(solver, time_limit=None, gap_rel=None, gap_abs=None):
+    """
+    Copy of a pulp solver with time and gap limits.
+
+    Parameters
+    ----------
+    solver: pulp.LpSolver or None
+        If None, pulp's default solver is used.
+    time_limit: float or None, optional
+        Time limit in seconds.
+    gap_rel, gap_abs: float or None, optional
+        Relative and absolute gap between the incumbent and the best
+        bound at which the solver may stop.
+
+    Returns
+    -------
+    pulp.LpSolver
+        Limits that are None are left as set on `solver`.
+    """
+    solver = copy.copy(solver or pulp.LpSolverDefault)
+    if time_limit is not None:
+        solver.timeLimit = time_limit
+    limits = {"gapRel": gap_rel, "gapAbs": gap_abs}
+    solver.optionsDict = dict(
+        solver.optionsDict,
+        **{name: value for name, value in limits.items() if value is not None}
+    )
+    return solver
+
+
+# patterns of CBC log messages that report progress
+CBC_PROGRESS = {
+    "incumbent": re.compile(
+        r"Cbc00(?:04|12)I Integer solution of (?P<incumbent>\S+) found"
+        r".* and (?P<nodes>\d+) nodes"
+    ),
+    "start": re.compile(
+        r"Cbc0045I MIPStart provided solution with cost (?P<incumbent>\S+)"
+    ),
+    "root": re.compile(
+        r"(?:Continuous objective value is (?P<bound>\S+)"
+        r"|Cbc0013I At root node, .* to (?P<cut_bound>\S+) in)"
+    ),
+    "nodes": re.compile(
+        r"Cbc0010I After (?P<nodes>\d+) nodes, \d+ on tree, "
+        r"(?P<incumbent>\S+) best solution, best possible (?P<bound>\S+)"
+    ),
+    "gap": re.compile(r"Cbc0011I Exiting as integer gap of (?P<gap>\S+)"),
+    "finished": re.compile(
+        r"Cbc000[15]I .* best objective (?P<incumbent>[^ ,]+)"
+        r"(?:, | \(best possible (?P<bound>\S+)\), )"
+        r"took \d+ iterations and (?P<nodes>\d+) nodes"
+    ),
+}
+
+
+def cbc_progress(line, state):
+    """
+    Update the progress of a CBC solve from a line of its log.
+
+    Parameters
+    ----------
+    line: str
+    state: dict
+        Progress so far, as 'incumbent' and 'bound' (NaN if not yet
+        known), 'gap' (see `relative_gap`) and 'nodes'; updated in
+        place.
+
+    Returns
+    -------
+    str or None
+        Kind of progress reported ('incumbent' for a better solution,
+        'bound' or 'nodes'), or None if the line reports none.
+    """
+    for kind, pattern in CBC_PROGRESS.items():
+        match = pattern.search(line)
+        if match:
+            break
+    else:
+        return None
+    values = {
+        name: float(value)
+        for name, value in match.groupdict().items()
+        if value is not None
+    }
+    if "cut_bound" in values:
+        values["bound"] = values.pop("cut_bound")
+    if "gap" in values:  # absolute gap to the incumbent
+        values["bound"] = state["incumbent"] - values.pop("gap")
+    if values.get("incumbent", 0) >= 1e50:  # no solution yet
+        del values["incumbent"]
+    if "nodes" in values:
+        state["nodes"] = int(values.pop("nodes"))
+    improved = values.get("incumbent", numpy.inf) < state["incumbent"] or (
+        numpy.isnan(state["incumbent"]) and "incumbent" in values
+    )
+    state.update(values)
+    state["gap"] = relative_gap(state["incumbent"], state["bound"])
+    if improved:
+        return "incumbent"
+    if kind in ("root", "gap"):
+        return "bound"
+    return "nodes" if kind == "nodes" else None
+
+
+def _child_processes(command):
+    """
+    Ids of the child processes of this process running a command, where
+    /proc is available (otherwise none are found).
+    """
+    children = []
+    if not os.path.isdir("/proc"):
+        return children
+    for pid in os.listdir("/proc"):
+        try:
+            with open(
+                os.path.join("/proc", pid, "stat"), encoding="utf-8"
+            ) as stat:
+                # the parent id follows the (parenthesized) command name
+                parent = int(stat.read().rsplit(")", 1)[1].split()[1])
+            with open(os.path.join("/proc", pid, "cmdline"), "rb") as line:
+                program = line.read().split(b"\0")[0].decode()
+        except (OSError, ValueError, IndexError):
+            continue
+        if parent == os.getpid() and os.path.samefile(program, command):
+            children.append(int(pid))
+    return children
+
+
+def _follow_cbc_log(descriptor, command, start, callback, echo, lines):
+    """
+    Read a CBC log from a pseudo-terminal until it is closed, keeping
+    each line in `lines` and passing progress events to `callback`;
+    interrupt CBC (so that it stops with its best solution) once the
+    callback returns True.
+    """
+    state = {
+        "incumbent": numpy.nan,
+        "bound": numpy.nan,
+        "gap": numpy.nan,
+        "nodes": 0,
+    }
+    stopping = False
+    pending = b""
+    while True:
+        try:
+            data = os.read(descriptor, 4096)
+        except OSError:  # closed
+            break
+        if not data:
+            break
+        *complete, pending = (pending + data).split(b"\n")
+        for line in complete:
+            line = line.decode(errors="replace").rstrip("\r")
+            lines.append(line)
+            if echo:
+                print(line)
+            kind = cbc_progress(line, state)
+            if kind is None or stopping:
+                continue
+            event = dict(state, event=kind, time=time.perf_counter() - start)
+            if callback(event):
+                stopping = True
+                for pid in _child_processes(command):
+                    os.kill(pid, signal.SIGINT)
+
+
+def solve_with_bound(problem, solver=None, callback=None):
+    """
+    Solve a pulp problem, also reading the best bound on its objective
+    from the solver.
+
+    CBC (pulp.COIN_CMD and its subclasses) reports the bound in its log,
+    which is read from `logPath` if set, or else written to a temporary
+    file (and then shown, if the solver log is on); ScipyMilp keeps it
+    as `bound`. Otherwise, the bound is only known if the solution is
+    optimal (which, for a solver stopped by a gap limit, may only be to
+    within that gap).
+
+    Given a `callback`, progress is reported as the solve goes: each
+    event is a dict of 'event' (the kind of progress: 'incumbent',
+    'bound', 'nodes' or, once solved, 'finished'), 'time' (s since the
+    solve started), 'incumbent', 'bound', 'gap' and 'nodes'. Where the
+    callback returns True, the solver is asked to stop and return its
+    best solution. While CBC runs, its log is read through a
+    pseudo-terminal (so that it is written line by line) and the
+    callback is called from another thread; where pseudo-terminals or
+    /proc are not available (or `logPath` is set), and for other
+    solvers, only the 'finished' event is reported and the solve cannot
+    be stopped early.
+
+    Parameters
+    ----------
+    problem: pulp.LpProblem
+    solver: pulp.LpSolver or None, optional
+        If None, pulp's default solver is used.
+    callback: callable or None, optional
+        Called with each progress event.
+
+    Returns
+    -------
+    tuple
+        (status, bound): problem status (see pulp.LpStatus) and best
+        bound on the objective, or NaN if not known.
+    """
+    # pylint: disable=R0912,R0914
+    solver = solver or pulp.LpSolverDefault
+    start = time.perf_counter()
+    bound = numpy.nan
+    nodes = 0
+    if isinstance(solver, pulp.COIN_CMD):
+        log_path = solver.optionsDict.get("logPath")
+        logged = copy.copy(solver)
+        logged.msg = False
+        if log_path:
+            status = problem.solve(solver)
+            with open(log_path, encoding="utf-8") as log:
+                lines = log.read().splitlines()
+        elif callback is not None and pty is not None:
+            lines = []
+            reader, writer = pty.openpty()
+            logged.optionsDict = dict(
+                solver.optionsDict, logPath=os.ttyname(writer)
+            )
+            follower = threading.Thread(
+                target=_follow_cbc_log,
+                args=(
+                    reader,
+                    solver.path,
+                    start,
+                    callback,
+                    solver.msg,
+                    lines,
+                ),
+                daemon=True,
+            )
+            follower.start()
+            try:
+                status = problem.solve(logged)
+            finally:
+                os.close(writer)
+                follower.join()
+                os.close(reader)
+        else:
+            log_file, log_path = tempfile.mkstemp(suffix=".log")
+            os.close(log_file)
+            logged.optionsDict = dict(solver.optionsDict, logPath=log_path)
+            try:
+                status = problem.solve(logged)
+            finally:
+                with open(log_path, encoding="utf-8") as log:
+                    lines = log.read().splitlines()
+                os.remove(log_path)
+            if solver.msg:
+                print("\n".join(lines))
+        state = {
+            "incumbent": numpy.nan,
+            "bound": numpy.nan,
+            "gap": numpy.nan,
+            "nodes": 0,
+        }
+        for line in lines:
+            cbc_progress(line, state)
+            match = re.match(r"Lower bound:\s+(\S+)", line)
+            if match:
+                bound = float(match.group(1))
+        nodes = state["nodes"]
+    elif isinstance(solver, ScipyMilp):
+        solver = copy.copy(solver)
+        status = problem.solve(solver)
+        bound = solver.bound
+    else:
+        status = problem.solve(solver)
+    solved = problem.sol_status in (
+        pulp.LpSolutionOptimal,
+        pulp.LpSolutionIntegerFeasible,
+    )
+    if problem.sol_status == pulp.LpSolutionOptimal and numpy.isnan(bound):
+        bound = pulp.value(problem.objective)
+    if callback is not None:
+        incumbent = pulp.value(problem.objective) if solved else numpy.nan
+        callback(
+            {
+                "event": "finished",
+                "time": time.perf_counter() - start,
+                "incumbent": incumbent,
+                "bound": bound,
+                "gap": relative_gap(incumbent, bound),
+                "nodes": nodes,
+            }
+        )
+    return status, bound
+
+
+def relative_gap(objective, bound):
+    """
+    Gap between an objective value and a bound, relative to the
+    objective value; NaN if either is unknown.
+    """
+    if objective is None or numpy.isnan(objective) or numpy.isnan(bound):
+        return numpy.nan
+    return abs(objective - bound) / max(abs(objective), 1e-9)
+
+
+class ScipyMilp(pulp.LpSolver):
+    """
+    In-process pulp solver using scipy.optimize.milp (HiGHS).
+
+    The problem is passed to the solver as a sparse constraint matrix
+    and the solution read back as arrays, with no files written and no
+    subprocess started. Initial values (warm starts) are ignored. As
+    for pulp's CBC solvers, a solution found within the time limit but
+    not proven optimal gives status pulp.LpStatusOptimal with solution
+    status pulp.LpSolutionIntegerFeasible.
+
+    Parameters
+    ----------
+    mip: bool, optional
+        If False, integer variables are relaxed.
+    msg: bool, optional
+        Show the solver log.
+    timeLimit: float or None, optional
+        Time limit in seconds.
+    gapRel: float or None, optional
+        Relative MIP gap at which to stop. An absolute gap (gapAbs) is
+        not supported by scipy.optimize.milp and is ignored.
+    presolve: bool, optional
+    """
+
+    name = "SCIPY_MILP"
+
+    def __init__(
+        self, mip=True, msg=True, timeLimit=None, gapRel=None, presolve=True
+    ):
+        # best bound on the objective found by the last solve
+        self.bound = numpy.nan
+        super().__init__(
+            mip=mip,
+            msg=msg,
+            timeLimit=timeLimit,
+            gapRel=gapRel,
+            presolve=presolve,
+        )
+
+    def available(self):
+        """True if scipy.optimize.milp can be imported."""
+        try:
+            from scipy.optimize import milp  # pylint: disable=C0415,W0611
+        except ImportError:
+            return False
+        return True
+
+    def actualSolve(self, lp, **kwargs):
+        """
+        Solve a pulp problem, assigning variable values and status.
+
+        Parameters
+        ----------
+        lp: pulp.LpProblem
+
+        Returns
+        -------
+        int
+            Problem status (see pulp.LpStatus).
+        """
+        # pylint: disable=C0103,C0415,R0914,W0613
+        from scipy.optimize import Bounds, LinearConstraint, milp
+        from scipy.sparse import csr_matrix
+
+        variables = lp.variables()
+        columns = {id(v): i for i, v in enumerate(variables)}
+        objective = numpy.zeros(len(variables))
+        for variable, coefficient in lp.objective.items():
+            objective[columns[id(variable)]] = coefficient
+        indptr, indices, data, lower, upper = [0], [], [], [], []
+        for constraint in lp.constraints.values():
+            indices.extend([columns[id(v)] for v in constraint.keys()])
+            data.extend(constraint.values())
+            indptr.append(len(indices))
+            rhs = -constraint.constant
+            lower.append(
+                -numpy.inf if constraint.sense == pulp.LpConstraintLE else rhs
+            )
+            upper.append(
+                numpy.inf if constraint.sense == pulp.LpConstraintGE else rhs
+            )
+        # missing bounds become NaN, then infinite
+        low = numpy.array([v.lowBound for v in variables], dtype=float)
+        up = numpy.array([v.upBound for v in variables], dtype=float)
+        integrality = numpy.array(
+            [v.cat == pulp.LpInteger for v in variables], dtype=int
+        )
+        if not self.mip:
+            integrality[:] = 0
+        options = {"disp": bool(self.msg)}
+        if self.timeLimit is not None:
+            options["time_limit"] = float(self.timeLimit)
+        if self.optionsDict.get("gapRel") is not None:
+            options["mip_rel_gap"] = float(self.optionsDict["gapRel"])
+        options["presolve"] = bool(self.optionsDict.get("presolve", True))
+        constraints = []
+        if lp.constraints:
+            constraints.append(
+                LinearConstraint(
+                    csr_matrix(
+                        (data, indices, indptr),
+                        shape=(len(lower), len(variables)),
+                    ),
+                    lower,
+                    upper,
+                )
+            )
+        result = milp(
+            objective * lp.sense,
+            integrality=integrality,
+            bounds=Bounds(
+                numpy.nan_to_num(low, nan=-numpy.inf),
+                numpy.nan_to_num(up, nan=numpy.inf),
+            ),
+            constraints=constraints,
+            options=options,
+        )
+        bound = getattr(result, "mip_dual_bound", None)
+        if bound is None and result.status == 0:
+            bound = result.fun
+        self.bound = numpy.nan if bound is None else bound * lp.sense
+        if result.x is not None:
+            values = numpy.where(
+                integrality == 1, numpy.round(result.x), result.x
+            )
+            for variable, value in zip(variables, values.tolist()):
+                variable.varValue = value
+        if result.status == 0:
+            status, sol_status = pulp.LpStatusOptimal, pulp.LpSolutionOptimal
+        elif result.x is not None:
+            status = pulp.LpStatusOptimal
+            sol_status = pulp.LpSolutionIntegerFeasible
+        elif result.status == 1:
+            status = pulp.LpStatusNotSolved
+            sol_status = pulp.LpSolutionNoSolutionFound
+        elif result.status == 2:
+            status = pulp.LpStatusInfeasible
+            sol_status = pulp.LpSolutionInfeasible
+        elif result.status == 3:
+            status = pulp.LpStatusUnbounded
+            sol_status = pulp.LpSolutionUnbounded
+        else:
+            status = pulp.LpStatusUndefined
+            sol_status = pulp.LpSolutionNoSolutionFound
+        lp.assignStatus(status, sol_status)
+        return status
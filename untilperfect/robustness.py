@@ -0,0 +1,235 @@
+"""
+robustness.py
+
+This module contains a Monte Carlo analysis of how robust a solved
+buffer preparation design is to drift in buffer use start times and
+durations, keeping its assignment of buffers to prep slots.
+"""
+
+import multiprocessing
+import os
+
+import numpy
+
+from .decomposition import schedule_slot
+from .presolve import hold_time_bounds
+
+
+def perturbed_buffers(
+    buffers, cycle_time, samples, start_sd=0.0, duration_sd=0.0, seed=0
+):
+    """
+    Buffers with normally distributed drift in their use start times
+    and use durations.
+
+    Parameters
+    ----------
+    buffers: untilperfect.Buffers
+    cycle_time: float
+    samples: int
+    start_sd, duration_sd: float, optional
+        Standard deviation of the drift in use start times and in use
+        durations.
+    seed: int, optional
+        Random seed.
+
+    Returns
+    -------
+    untilperfect.Buffers
+        Buffers whose use start times and durations (and relative use
+        start times) are arrays of shape (samples, N). Use durations are
+        no less than zero.
+    """
+    rng = numpy.random.default_rng(seed)
+    shape = (samples, buffers.count)
+    starts = numpy.asarray(buffers.absolute_use_start_times, dtype=float)
+    durations = numpy.asarray(buffers.use_durations, dtype=float)
+    sampled = type(buffers)(
+        {
+            "names": buffers.names,
+            "volumes": buffers.volumes,
+            "use_start_times": starts + rng.normal(0, start_sd, shape),
+            "use_durations": numpy.maximum(
+                durations + rng.normal(0, duration_sd, shape), 0
+            ),
+        }
+    )
+    sampled.relative_use_start_times = (
+        sampled.absolute_use_start_times % cycle_time
+    )
+    return sampled
+
+
+def hold_slack(parameters, buffers, prep_start_times):
+    """
+    Hold times that keep a prep schedule, and their slack.
+
+    Where prep procedures start at fixed times, each buffer's hold time
+    takes up any drift in its use start time.
+
+    Parameters
+    ----------
+    parameters: untilperfect.Parameters
+    buffers: untilperfect.Buffers
+        With relative use start times set, as arrays of shape (..., N).
+    prep_start_times: numpy.ndarray
+        Start time of each buffer's prep procedure within the cycle.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        (hold times, slack) for each buffer, where slack is the distance
+        from the hold time to its nearest bound (negative if out of
+        bounds).
+    """
+    pa = parameters
+    t_use = numpy.asarray(buffers.relative_use_start_times, dtype=float)
+    z_min, z_max = hold_time_bounds(pa, buffers)
+    transfer_end = (
+        numpy.asarray(prep_start_times, dtype=float)
+        + pa.prep_pre_duration
+        + pa.transfer_duration
+    )
+    # hold times within half a cycle of the middle of their bounds
+    low = (z_min + z_max - pa.cycle_time) / 2
+    hold_times = low + (t_use - transfer_end - low) % pa.cycle_time
+    return hold_times, numpy.minimum(hold_times - z_min, z_max - hold_times)
+
+
+def _prep_slack(parameters, t_use, hold_times, prep_slots):
+    """
+    Least idle time between the prep procedure of each buffer and any
+    other in its slot.
+    """
+    ct = parameters.cycle_time
+    h = (t_use - hold_times) % ct
+    gap = (h[None, :] - h[:, None]) % ct
+    gap[prep_slots[:, None] != prep_slots[None, :]] = ct
+    numpy.fill_diagonal(gap, ct)
+    return gap.min(axis=1) - parameters.prep_total_duration
+
+
+def _reschedule_samples(arguments):
+    """
+    Re-time the buffers in each slot of a design for each of a batch of
+    samples (see `robustness`), returning the least idle time in each
+    slot of each sample, or NaN where a slot cannot be scheduled.
+    """
+    parameters, buffers, starts, durations, prep_slots, slots = arguments
+    slack = numpy.full((len(starts), len(slots)), numpy.nan)
+    for i, (start, duration) in enumerate(zip(starts, durations)):
+        sample = type(buffers)(
+            {
+                "names": buffers.names,
+                "volumes": buffers.volumes,
+                "use_start_times": start,
+                "use_durations": duration,
+            }
+        )
+        sample.set_relative_use_start_times(parameters.cycle_time)
+        hold_times = numpy.full(sample.count, numpy.nan)
+        for p in slots:
+            members = numpy.flatnonzero(prep_slots == p)
+            z = schedule_slot(parameters, sample, members)
+            if z is not None:
+                hold_times[members] = z
+        idle = _prep_slack(
+            parameters,
+            numpy.asarray(sample.relative_use_start_times),
+            hold_times,
+            prep_slots,
+        )
+        slack[i] = [max(idle[prep_slots == p].min(), 0) for p in slots]
+    return slack
+
+
+def robustness(
+    parameters,
+    buffers,
+    prep_slots,
+    prep_start_times,
+    samples=1000,
+    start_sd=0.5,
+    duration_sd=0.0,
+    reschedule=False,
+    seed=0,
+    processes=None,
+):
+    """
+    Monte Carlo analysis of the robustness of a design to drift in use
+    start times and durations.
+
+    The assignment of buffers to prep slots is kept for every sample.
+    By default, so is the prep schedule, and a sample is feasible where
+    every hold time, taking up the drift, stays within its bounds; all
+    samples are checked at once, as arrays. With `reschedule`, each
+    slot is instead re-timed for each sample (see
+    `decomposition.schedule_slot`), with samples split between
+    `processes` worker processes. No MIP is solved.
+
+    Parameters
+    ----------
+    parameters: untilperfect.Parameters
+    buffers: untilperfect.Buffers
+    prep_slots: array_like of int
+        Prep slot of each buffer.
+    prep_start_times: array_like of float
+        Start time of each buffer's prep procedure within the cycle.
+    samples: int, optional
+    start_sd, duration_sd: float, optional
+        Standard deviation of the drift in use start times and in use
+        durations (see `perturbed_buffers`).
+    reschedule: bool, optional
+        Re-time each slot for each sample, rather than keeping the prep
+        schedule.
+    seed: int, optional
+        Random seed.
+    processes: int or None, optional
+        Number of worker processes when re-timing; defaults to the
+        number of CPUs.
+
+    Returns
+    -------
+    dict
+        'slots': the slots of the design; 'slack': array of shape
+        (samples, slots) of the least hold time slack (or, with
+        `reschedule`, the least idle time between prep procedures) in
+        each slot, negative or NaN where infeasible; 'feasible': whether
+        each sample is feasible in every slot; 'probability' and
+        'slot_probability': fraction of samples feasible overall and in
+        each slot.
+    """
+    prep_slots = numpy.asarray(prep_slots)
+    slots = numpy.unique(prep_slots)
+    sampled = perturbed_buffers(
+        buffers, parameters.cycle_time, samples, start_sd, duration_sd, seed
+    )
+    if reschedule:
+        processes = processes or os.cpu_count() or 1
+        batches = [
+            (parameters, buffers, starts, durations, prep_slots, slots)
+            for starts, durations in zip(
+                numpy.array_split(sampled.absolute_use_start_times, processes),
+                numpy.array_split(sampled.use_durations, processes),
+            )
+        ]
+        if processes > 1:
+            with multiprocessing.Pool(processes) as pool:
+                slack = numpy.vstack(pool.map(_reschedule_samples, batches))
+        else:
+            slack = _reschedule_samples(batches[0])
+    else:
+        _, buffer_slack = hold_slack(parameters, sampled, prep_start_times)
+        slack = numpy.stack(
+            [buffer_slack[:, prep_slots == p].min(axis=1) for p in slots],
+            axis=1,
+        )
+    slot_feasible = numpy.nan_to_num(slack, nan=-numpy.inf) >= -1e-9
+    feasible = slot_feasible.all(axis=1)
+    return {
+        "slots": slots,
+        "slack": slack,
+        "feasible": feasible,
+        "probability": feasible.mean(),
+        "slot_probability": slot_feasible.mean(axis=0),
+    }
@@ -0,0 +1,428 @@
+"""
+sizing.py
+
+This module contains an estimate of the size of the complete buffer
+preparation vessel assignment problem (its variables, constraints,
+nonzero coefficients and memory), found from its data alone, and a
+check of that size against a budget before the problem is built.
+"""
+
+import numpy
+
+from .heuristic import slot_capacity
+from .presolve import (
+    clash_big_m,
+    clique_cover,
+    compatibility,
+    conflict_graph,
+    hold_time_bounds,
+    presolve_vessels,
+    transfer_time_bounds,
+    wrap_indicators,
+)
+
+# memory used by the built pulp model, in bytes per variable, per
+# constraint and per nonzero coefficient (fitted to builds of generated
+# problems of 15 to 60 buffers, measured with tracemalloc, to within 5%)
+BYTES_PER_VARIABLE = 260
+BYTES_PER_CONSTRAINT = 600
+BYTES_PER_NONZERO = 130
+
+# quantities that a size budget may limit
+BUDGET_KEYS = ("variables", "constraints", "nonzeros", "memory")
+
+
+def _context(
+    parameters,
+    buffers,
+    vessels,
+    presolve=True,
+    slot_volumes=False,
+    aggregate_same_slot=False,
+    tight_big_m=False,
+    propagate_bounds=False,
+    conflict_cuts=True,
+    symmetry_breaking=True,
+):
+    """
+    Everything the size of the complete problem depends on, other than
+    the number of prep slots.
+    """
+    pa = parameters
+    buffers.set_relative_use_start_times(pa.cycle_time)
+    if presolve:
+        vessels, compatible, _ = presolve_vessels(pa, buffers, vessels)
+    else:
+        compatible = None
+    conflicts = conflict_graph(
+        pa, buffers, compatibility(buffers, vessels, pa.minimum_fill_ratio)
+    )
+    N = buffers.count
+    pairs = numpy.triu(numpy.ones((N, N), dtype=bool), 1)
+    if conflict_cuts:
+        pairs &= ~conflicts
+        cliques = clique_cover(conflicts)
+        per_slot = slot_capacity(pa)
+        if per_slot < 1:
+            min_slots = N
+        else:
+            largest_clique = max(map(len, cliques), default=1)
+            min_slots = max(1, int(numpy.ceil(N / per_slot)), largest_clique)
+    else:
+        cliques, min_slots = [], 1
+    n, k = numpy.nonzero(pairs)
+    if tight_big_m:
+        lower, upper, _ = transfer_time_bounds(pa, buffers)
+        big_m = numpy.array(clash_big_m(pa, lower, upper, n, k))
+    else:
+        big_m = numpy.full((4, n.size), 2 * pa.cycle_time)
+    if propagate_bounds:
+        wraps = wrap_indicators(pa, buffers)
+        z_min, z_max = hold_time_bounds(pa, buffers)
+        crossed = int((z_max < z_min).sum())
+    else:
+        wraps, crossed = None, 0
+    return {
+        "parameters": pa,
+        "buffers": buffers,
+        "vessels": vessels,
+        "compatible": compatible,
+        "slot_volumes": slot_volumes,
+        "aggregate_same_slot": aggregate_same_slot,
+        "symmetry_breaking": symmetry_breaking,
+        "pairs": (n, k),
+        "big_m": big_m,
+        "wraps": wraps,
+        "crossed": crossed,
+        "cliques": cliques,
+        "min_slots": min_slots,
+    }
+
+
+def _size(context, slots):
+    """
+    Size of the complete problem with `slots` prep slots; see
+    `model_size`.
+    """
+    pa = context["parameters"]
+    M, N, P = context["vessels"].count, context["buffers"].count, slots
+    n, _ = context["pairs"]
+    pair_count = n.size
+    bv = numpy.asarray(context["buffers"].volumes, dtype=float)
+    vv = numpy.asarray(context["vessels"].volumes, dtype=float)
+    mfr = pa.minimum_fill_ratio
+    nonzero_vv = int(numpy.count_nonzero(vv))
+
+    variables = {"b": M, "q": N, "r": N, "s": N, "u": N, "v": pair_count}
+    if context["aggregate_same_slot"]:
+        variables["a"] = pair_count
+    else:
+        variables["w"] = pair_count * P
+    variables.update(x=N * P, y=M * P, z=N)
+    if context["slot_volumes"]:
+        variables["c"] = P
+    continuous = ("a", "c", "z")
+    binaries = sum(
+        v for name, v in variables.items() if name not in continuous
+    )
+
+    # rows and nonzeros of each block, as built by MatrixBuilder
+    blocks = {
+        "buffers_dedicated_to_slots": (N, N * P),
+        "max_one_vessel_per_slot": (P, M * P),
+    }
+    if context["slot_volumes"]:
+        blocks["define_slot_volumes"] = (P, P + nonzero_vv * P)
+        blocks["vessels_adequately_sized"] = (
+            2 * N * P,
+            (int(numpy.count_nonzero(bv)) + N * (2 + bool(mfr))) * P,
+        )
+    elif context["compatible"] is not None:
+        blocks["vessels_compatible"] = (
+            N * P,
+            (N + int(context["compatible"].sum())) * P,
+        )
+    else:
+        blocks["vessels_adequately_sized"] = (
+            2 * N * P,
+            (
+                int(numpy.count_nonzero(bv))
+                + N * (1 + nonzero_vv + int(numpy.count_nonzero(mfr * vv)))
+            )
+            * P,
+        )
+    blocks["limit_max_utilization"] = (P, N * P)
+    if pa.max_types:
+        blocks["limit_vessel_types"] = (2 * M, M * (1 + P) + M * M)
+    if context["symmetry_breaking"] and P > 1:
+        blocks["break_slot_symmetry"] = (
+            2 * (P - 1),
+            (2 * M + 2 * nonzero_vv) * (P - 1),
+        )
+    if context["wraps"] is None:
+        blocks["hold_scheduling"] = (N, N)
+    elif context["crossed"]:
+        # hold time bounds that cross are left to the constraint
+        blocks["hold_scheduling"] = (context["crossed"], context["crossed"])
+
+    # prep scheduling: pair links, wrap indicators and no-clash rows
+    if context["aggregate_same_slot"]:
+        links, same_slot = pair_count * P, 1
+    else:
+        links, same_slot = 2 * pair_count * P, P
+    wrap_rows = numpy.full(8, N)
+    wrap_terms = numpy.array([2, 2, 3, 3, 3, 3, 3, 3])
+    kept = numpy.ones((4, pair_count), dtype=bool)
+    if context["wraps"] is not None:
+        # rows defining decided wrap indicators are dropped, as are the
+        # no-clash rows that a decided u[n] relaxes
+        wraps = context["wraps"]
+        wrap_rows = numpy.array(
+            [numpy.sum(wraps[name] < 0) for name in "qqrrssuu"]
+        )
+        u = wraps["u"][n]
+        kept = numpy.array([u != relaxed for relaxed in [1, 1, 0, 0]])
+    # no-clash rows have four common terms, r or s in the last two, and
+    # u, v (first two only) and the same slot indicator(s) weighted by
+    # the row's big-M
+    weighted = numpy.array([2, 2, 1, 1])[:, None] + same_slot
+    clash_terms = (4 + numpy.array([0, 0, 1, 1])[:, None]) * kept + (
+        weighted * (context["big_m"] != 0) * kept
+    )
+    blocks["prep_scheduling"] = (
+        links + int(wrap_rows.sum() + kept.sum()),
+        3 * links + int((wrap_rows * wrap_terms).sum() + clash_terms.sum()),
+    )
+
+    cliques = context["cliques"]
+    if cliques:
+        blocks["conflict_cliques"] = (
+            len(cliques) * P,
+            sum(len(clique) for clique in cliques) * P,
+        )
+    if context["min_slots"] > 1:
+        blocks["min_slots_used"] = (1, M * P)
+
+    totals = {
+        "variables": sum(variables.values()),
+        "constraints": sum(rows for rows, _ in blocks.values()),
+        "nonzeros": sum(nonzeros for _, nonzeros in blocks.values()),
+    }
+    totals["memory"] = (
+        BYTES_PER_VARIABLE * totals["variables"]
+        + BYTES_PER_CONSTRAINT * totals["constraints"]
+        + BYTES_PER_NONZERO * totals["nonzeros"]
+    )
+    return {
+        "slots": P,
+        "min_slots": context["min_slots"],
+        "variables": variables,
+        "binaries": binaries,
+        "constraints": {name: rows for name, (rows, _) in blocks.items()},
+        "nonzeros": {name: count for name, (_, count) in blocks.items()},
+        "totals": totals,
+    }
+
+
+def model_size(parameters, buffers, vessels, slots=None, **options):
+    """
+    Size of the complete problem, found without building it.
+
+    Counts match those of the model BufferPrepProblem would build with
+    the same options (see `BufferPrepProblem.blocks`); memory is an
+    estimate. The work done is that of presolve and the conflict graph,
+    at most quadratic in the number of buffers.
+
+    Parameters
+    ----------
+    parameters: untilperfect.Parameters
+    buffers: untilperfect.Buffers
+    vessels: untilperfect.Vessels
+    slots: int or None, optional
+        Number of prep slots. By default, `max_slots` if set, or one
+        slot per buffer otherwise (an upper bound on the slots
+        BufferPrepProblem chooses with `auto_slots`).
+    **options
+        Options of BufferPrepProblem that change the model:
+        `presolve`, `slot_volumes`, `aggregate_same_slot`,
+        `tight_big_m`, `propagate_bounds`, `conflict_cuts` and
+        `symmetry_breaking`.
+
+    Returns
+    -------
+    dict
+        'slots'; 'min_slots' (see `BufferPrepProblem.slot_lower_bound`,
+        or 1 without conflict cuts); 'variables' (count of each
+        variable array); 'binaries'; 'constraints' and 'nonzeros' (rows
+        and nonzero coefficients of each constraint block); 'totals'
+        (variables, constraints, nonzeros and memory in bytes).
+    """
+    context = _context(parameters, buffers, vessels, **options)
+    return _size(context, _default_slots(parameters, buffers, slots))
+
+
+def _default_slots(parameters, buffers, slots):
+    """Number of prep slots to size the problem for."""
+    if slots is not None:
+        return slots
+    if parameters.max_slots not in (0, "auto"):
+        return min(parameters.max_slots, buffers.count)
+    return buffers.count
+
+
+def exceeded(size, budget):
+    """
+    Quantities of a problem size that exceed a budget.
+
+    Parameters
+    ----------
+    size: dict
+        See `model_size`.
+    budget: dict
+        Limit on any of 'variables', 'constraints', 'nonzeros' and
+        'memory' (bytes); None or missing for no limit.
+
+    Returns
+    -------
+    dict
+        (size, limit) of each quantity over its limit.
+    """
+    unknown = set(budget) - set(BUDGET_KEYS)
+    if unknown:
+        raise ValueError(
+            "Unknown size budget key(s): {}".format(", ".join(sorted(unknown)))
+        )
+    totals = size["totals"]
+    return {
+        key: (totals[key], limit)
+        for key, limit in budget.items()
+        if limit is not None and totals[key] > limit
+    }
+
+
+def fitting_slots(parameters, buffers, vessels, budget, slots=None, **options):
+    """
+    Largest number of prep slots with which the complete problem fits
+    a budget.
+
+    Size grows with the number of slots, so this is found by bisection
+    between `min_slots` and `slots`.
+
+    Parameters
+    ----------
+    parameters: untilperfect.Parameters
+    buffers: untilperfect.Buffers
+    vessels: untilperfect.Vessels
+    budget: dict
+        See `exceeded`.
+    slots: int or None, optional
+        Most slots to consider; see `model_size`.
+    **options
+        See `model_size`.
+
+    Returns
+    -------
+    int or None
+        None if the problem does not fit with `min_slots` slots, as
+        fewer slots than that make it infeasible.
+    """
+    context = _context(parameters, buffers, vessels, **options)
+    low = context["min_slots"]
+    high = _default_slots(parameters, buffers, slots)
+    if low > high or exceeded(_size(context, low), budget):
+        return None
+    while low < high:
+        middle = (low + high + 1) // 2
+        if exceeded(_size(context, middle), budget):
+            high = middle - 1
+        else:
+            low = middle
+    return low
+
+
+def admit(parameters, buffers, vessels, budget, slots=None, **options):
+    """
+    Check that the complete problem fits a budget before it is built.
+
+    Parameters
+    ----------
+    parameters: untilperfect.Parameters
+    buffers: untilperfect.Buffers
+    vessels: untilperfect.Vessels
+    budget: dict
+        See `exceeded`.
+    slots: int or None, optional
+        See `model_size`.
+    **options
+        See `model_size`.
+
+    Returns
+    -------
+    dict
+        The size of the problem (see `model_size`).
+
+    Raises
+    ------
+    ValueError
+        If the problem exceeds the budget; the message suggests a value
+        of `max_slots` with which it fits, if there is one.
+    """
+    size = model_size(parameters, buffers, vessels, slots, **options)
+    over = exceeded(size, budget)
+    if not over:
+        return size
+    message = "Problem with {} prep slots exceeds its size budget ({})".format(
+        size["slots"],
+        ", ".join(
+            "{}: {} > {}".format(key, value, limit)
+            for key, (value, limit) in over.items()
+        ),
+    )
+    fits = fitting_slots(
+        parameters, buffers, vessels, budget, size["slots"], **options
+    )
+    if fits is None:
+        message += "; it does not fit with as few as {} slots.".format(
+            size["min_slots"]
+        )
+    else:
+        message += "; try max_slots = {}.".format(fits)
+    raise ValueError(message)
+
+
+def format_size(size):
+    """
+    Describe a problem size (see `model_size`) as text.
+
+    Parameters
+    ----------
+    size: dict
+
+    Returns
+    -------
+    str
+    """
+    totals = size["totals"]
+    lines = [
+        "Prep slots: {} (at least {})".format(
+            size["slots"], size["min_slots"]
+        ),
+        "Variables: {} ({} binary)".format(
+            totals["variables"], size["binaries"]
+        ),
+    ]
+    lines += [
+        "  {}: {}".format(name, count)
+        for name, count in size["variables"].items()
+    ]
+    lines.append(
+        "Constraints: {}, nonzeros: {}".format(
+            totals["constraints"], totals["nonzeros"]
+        )
+    )
+    lines += [
+        "  {}: {} rows, {} nonzeros".format(name, rows, size["nonzeros"][name])
+        for name, rows in size["constraints"].items()
+    ]
+    lines.append("Estimated memory: {:.1f} MB".format(totals["memory"] / 1e6))
+    return "\n".join(lines)
@@ -0,0 +1,159 @@
+"""
+validation.py
+
+This module contains an independent check that solutions to a buffer
+preparation vessel assignment problem satisfy its rules. Solutions may
+be checked one at a time or as a batch, in one vectorized pass.
+"""
+
+import numpy
+
+from .presolve import compatibility, hold_time_bounds
+
+
+def cyclic_overlaps(start_times, durations, cycle_time, tolerance=1e-6):
+    """
+    Which pairs of cyclic intervals overlap.
+
+    Intervals start at `start_times` and repeat every `cycle_time`;
+    those that merely touch do not overlap.
+
+    Parameters
+    ----------
+    start_times: numpy.ndarray
+        Array of shape (..., N).
+    durations: numpy.ndarray
+        Array broadcastable to `start_times`.
+    cycle_time: float
+    tolerance: float, optional
+
+    Returns
+    -------
+    numpy.ndarray
+        Symmetric boolean array of shape (..., N, N), False on the
+        diagonal.
+    """
+    start_times = numpy.asarray(start_times, dtype=float)
+    durations = numpy.broadcast_to(durations, start_times.shape)
+    # time from the start of each interval i to the start of each j
+    gap = (start_times[..., None, :] - start_times[..., :, None]) % cycle_time
+    overlaps = gap < durations[..., :, None] - tolerance
+    overlaps |= numpy.swapaxes(overlaps, -1, -2)
+    n = start_times.shape[-1]
+    overlaps[..., numpy.arange(n), numpy.arange(n)] = False
+    return overlaps
+
+
+def validate(
+    parameters,
+    buffers,
+    vessels,
+    prep_slots,
+    prep_vessels,
+    prep_start_times=None,
+    hold_total_durations=None,
+    tolerance=1e-6,
+):
+    """
+    Check solutions against the rules of the complete problem.
+
+    Inputs may describe one solution (arrays of shape (N,)) or a batch
+    of S solutions (arrays of shape (S, N)), which are checked at once.
+    Scheduling rules are only checked if `prep_start_times` and
+    `hold_total_durations` are given.
+
+    Parameters
+    ----------
+    parameters: untilperfect.Parameters
+    buffers: untilperfect.Buffers
+        With relative use start times set.
+    vessels: untilperfect.Vessels
+    prep_slots: array_like of int
+        Prep slot of each buffer.
+    prep_vessels: array_like of int
+        Vessel preparing each buffer (index into `vessels`).
+    prep_start_times: array_like of float or None, optional
+        Start time of each buffer's prep procedure within the cycle.
+    hold_total_durations: array_like of float or None, optional
+        Total duration of each buffer's hold procedure.
+    tolerance: float, optional
+
+    Returns
+    -------
+    dict
+        Violations of each rule, with a leading batch axis if a batch
+        was given:
+
+        - 'sizing': (N,) vessel cannot prepare the buffer (too small,
+          or filled below `minimum_fill_ratio`).
+        - 'vessels': (N,) a buffer in the same slot is prepared in
+          another vessel.
+        - 'utilization': (N,) the buffer's slot is over-utilized.
+        - 'types': () more vessel types used than `max_types`.
+        - 'hold': (N,) hold time out of bounds.
+        - 'timing': (N,) prep does not end in time for the hold
+          procedure.
+        - 'clashes': (N, N) prep procedures overlap in the same slot.
+        - 'valid': () no rule is violated.
+    """
+    pa = parameters
+    slots = numpy.asarray(prep_slots, dtype=int)
+    batch = slots.ndim > 1
+    slots = numpy.atleast_2d(slots)
+    chosen = numpy.broadcast_to(
+        numpy.asarray(prep_vessels, dtype=int), slots.shape
+    )
+    n = numpy.arange(slots.shape[1])
+    same_slot = slots[:, :, None] == slots[:, None, :]
+    violations = {}
+    compatible = compatibility(buffers, vessels, pa.minimum_fill_ratio)
+    violations["sizing"] = ~compatible[chosen, n]
+    violations["vessels"] = (
+        same_slot & (chosen[:, :, None] != chosen[:, None, :])
+    ).any(axis=2)
+    capacity = pa.cycle_time * pa.maximum_prep_utilization
+    violations["utilization"] = (
+        same_slot.sum(axis=2) * pa.prep_total_duration > capacity + tolerance
+    )
+    used = numpy.zeros((len(slots), vessels.count), dtype=bool)
+    used[numpy.arange(len(slots))[:, None], chosen] = True
+    violations["types"] = (used.sum(axis=1) > pa.max_types) & bool(
+        pa.max_types
+    )
+    if prep_start_times is not None and hold_total_durations is not None:
+        t_use = numpy.asarray(buffers.relative_use_start_times, dtype=float)
+        z_min, z_max = hold_time_bounds(pa, buffers)
+        hold_times = numpy.atleast_2d(hold_total_durations) - (
+            pa.hold_pre_duration
+            + pa.transfer_duration
+            + numpy.asarray(buffers.use_durations, dtype=float)
+            + pa.hold_post_duration
+        )
+        violations["hold"] = (hold_times < z_min - tolerance) | (
+            hold_times > z_max + tolerance
+        )
+        starts = numpy.atleast_2d(prep_start_times).astype(float)
+        expected = (
+            t_use - hold_times - pa.transfer_duration - pa.prep_pre_duration
+        )
+        drift = (starts - expected) % pa.cycle_time
+        violations["timing"] = numpy.minimum(drift, pa.cycle_time - drift) > (
+            tolerance
+        )
+        violations["clashes"] = same_slot & cyclic_overlaps(
+            starts, pa.prep_total_duration, pa.cycle_time, tolerance
+        )
+    else:
+        violations["hold"] = numpy.zeros(slots.shape, dtype=bool)
+        violations["timing"] = numpy.zeros(slots.shape, dtype=bool)
+        violations["clashes"] = numpy.zeros(same_slot.shape, dtype=bool)
+    violations["valid"] = ~numpy.any(
+        [
+            violation.reshape(len(slots), -1).any(axis=1)
+            for violation in violations.values()
+        ],
+        axis=0,
+    )
+    if not batch:
+        violations = {name: v[0] for name, v in violations.items()}
+    return violations